@@ -0,0 +1,220 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import multiprocessing
+from argparse import ArgumentParser
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+from modules.parameters.options import TICK_RATE, level_when_game_started
+
+
+# Columns of an action: move is -1 (left), 0 or 1 (right), aim is relative
+# to the player's eyes and slot is a weapon slot, -1 keeps the current one
+MOVE, JUMP, ATTACK, AIM_X, AIM_Y, SLOT = range(6)
+ACTION_SIZE = 6
+
+
+class SharedArrays:
+    """NumPy arrays of all environments in one block of shared memory.\n
+    Every array has a row per environment, a worker writes only rows of
+    its environments"""
+
+    def __init__(self, fields: dict[str, tuple], envs: int,
+                 name: str = None) -> None:
+        self.fields = fields
+        self.envs = envs
+        sizes = [envs * int(np.prod(shape)) * np.dtype(dtype).itemsize
+                 for dtype, shape in fields.values()]
+        self.memory = SharedMemory(name, create=name is None,
+                                   size=max(sum(sizes), 1))
+        self.arrays: dict[str, np.ndarray] = {}
+        offset = 0
+        for (field, (dtype, shape)), size in zip(fields.items(), sizes):
+            self.arrays[field] = np.ndarray((envs, *shape), dtype,
+                                            self.memory.buf, offset)
+            offset += size
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.arrays[field]
+
+    def close(self, unlink: bool = False) -> None:
+        self.arrays.clear()
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+def get_fields(trigger_codes: tuple[str]) -> dict[str, tuple]:
+    return {
+        "actions": (np.float64, (ACTION_SIZE,)),
+        "positions": (np.float64, (2,)),
+        "speeds": (np.float64, (2,)),
+        "health": (np.int64, ()),
+        "triggers": (np.bool_, (len(trigger_codes),)),  # Player is in a region
+        "levels": (np.int64, ()),  # Levels changed since the reset
+        "dead": (np.bool_, ()),
+    }
+
+
+def work(connection, memory_name: str, envs: int, indices: list[int],
+         level_name: str, trigger_codes: tuple[str], dt: float) -> None:
+    """Worker process of some environments, a session for each. Sessions
+    have states of their own, so a worker steps its environments one after
+    another"""
+
+    import pygame
+    from modules.session import Session
+    pygame.init()
+    arrays = SharedArrays(get_fields(trigger_codes), envs, memory_name)
+    sessions: dict[int, Session] = {}
+
+    def observe(index: int) -> None:
+        session = sessions[index]
+        player, registry = session.players[0], session.state.registry
+        arrays["positions"][index] = player.x, player.y
+        arrays["speeds"][index] = (registry.speed_x[player.index],
+                                   registry.speed_y[player.index])
+        arrays["health"][index] = player.get_health()
+        codes = {region.code for region in
+                 session.world.triggers.inside.get(player.id, ())}
+        arrays["triggers"][index] = [code in codes for code in trigger_codes]
+        arrays["levels"][index] = session.levels
+        arrays["dead"][index] = player.get_health() <= 0
+
+    def step(index: int, ticks: int) -> None:
+        move, jump, attack, aim_x, aim_y, slot = arrays["actions"][index].tolist()
+        keyboard_keys = set()
+        if move < 0:
+            keyboard_keys.add(pygame.K_a)
+        elif move > 0:
+            keyboard_keys.add(pygame.K_d)
+        if jump:
+            keyboard_keys.add(pygame.K_w)
+        if 0 <= slot < 5:
+            keyboard_keys.add(pygame.K_1 + int(slot))
+        mouse_buttons = {pygame.BUTTON_LEFT} if attack else set()
+        for tick in range(ticks):
+            sessions[index].tick([(keyboard_keys, mouse_buttons, (aim_x, aim_y))], dt)
+
+    while True:
+        command, argument = connection.recv()
+        if command == "close":
+            break
+        for index in indices:
+            if command == "reset":
+                sessions[index] = Session(level_name)
+                sessions[index].add_player()
+            elif command == "step":
+                step(index, argument)
+            observe(index)
+        connection.send(True)
+    sessions.clear()
+    arrays.close()
+    connection.send(True)
+
+
+class VectorRunner:
+    """Many independent games stepped in lockstep by a pool of worker
+    processes, every worker steps a share of them.\n
+    Actions are written to an `(envs, ACTION_SIZE)` array and observations
+    are read from arrays of `observe`, all of them live in shared memory, so
+    only short commands go through pipes"""
+
+    def __init__(self, envs: int, level_name: str = level_when_game_started,
+                 trigger_codes: tuple[str] = ("CL",),
+                 dt: float = 1000 / TICK_RATE, workers: int = None) -> None:
+        self.envs = envs
+        self.trigger_codes = tuple(trigger_codes)
+        self.arrays = SharedArrays(get_fields(self.trigger_codes), envs)
+        # Spawned workers don't inherit pygame or the loader thread
+        context = multiprocessing.get_context("spawn")
+        self.connections = []
+        self.workers = []
+        workers = min(workers or os.cpu_count(), envs)
+        for indices in np.array_split(np.arange(envs), workers):
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(
+                target=work, daemon=True,
+                args=(worker_connection, self.arrays.memory.name, envs,
+                      indices.tolist(), level_name, self.trigger_codes, dt))
+            worker.start()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+    def send(self, command: str, argument=None) -> None:
+        """Run a command in all workers and wait for them"""
+
+        for connection in self.connections:
+            connection.send((command, argument))
+        for connection in self.connections:
+            connection.recv()
+
+    def observe(self) -> dict[str, np.ndarray]:
+        """Copies of observation arrays, a row per environment"""
+
+        return {field: self.arrays[field].copy()
+                for field in ("positions", "speeds", "health", "triggers",
+                              "levels", "dead")}
+
+    def reset(self) -> dict[str, np.ndarray]:
+        """Start the level in all environments"""
+
+        self.send("reset")
+        return self.observe()
+
+    def step(self, actions: np.ndarray, ticks: int = 1) -> dict[str, np.ndarray]:
+        """Repeat actions `(envs, ACTION_SIZE)` for a number of ticks"""
+
+        self.arrays["actions"][:] = actions
+        self.send("step", ticks)
+        return self.observe()
+
+    def close(self) -> None:
+        self.send("close")
+        for worker in self.workers:
+            worker.join()
+        self.arrays.close(unlink=True)
+
+    def __enter__(self) -> "VectorRunner":
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Simulate many games on all cores")
+    parser.add_argument("--level", default=level_when_game_started)
+    parser.add_argument("--envs", type=int, default=os.cpu_count())
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes the environments are split among")
+    parser.add_argument("--steps", type=int, default=600)
+    parser.add_argument("--ticks", type=int, default=1,
+                        help="ticks an action is repeated for")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    rng = np.random.default_rng(arguments.seed)
+    with VectorRunner(arguments.envs, arguments.level,
+                      workers=arguments.workers) as runner:
+        runner.reset()
+        start = perf_counter()
+        for step in range(arguments.steps):
+            actions = np.zeros((arguments.envs, ACTION_SIZE))
+            actions[:, MOVE] = rng.integers(-1, 2, arguments.envs)
+            actions[:, JUMP] = rng.random(arguments.envs) < 0.1
+            actions[:, SLOT] = -1
+            observations = runner.step(actions, arguments.ticks)
+        elapsed = perf_counter() - start
+
+    ticks = arguments.envs * arguments.steps * arguments.ticks
+    print(f"{arguments.envs} envs in {len(runner.workers)} workers, "
+          f"{ticks} ticks in {elapsed:.2f} s "
+          f"({ticks / elapsed:.0f} ticks/s)")
+    print("Health:", observations["health"].tolist())
+
+
+if __name__ == "__main__":
+    main()
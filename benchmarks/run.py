@@ -0,0 +1,235 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import random
+import shutil
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from json import dump as json_dump, load as json_load
+from math import tau
+from time import perf_counter
+
+pygame.init()
+pygame.display.set_mode((1, 1))
+
+from modules import entities, game, level
+from modules.interface import MiniMap
+from modules.parameters.options import TILESIZE, screen_res
+from modules.profiler import profiler
+from modules.state import State
+
+
+BASELINE_PATH = "benchmarks/baseline.json"
+
+scenarios = {}
+generated_levels: list[str] = []  # Folders of levels written by this run
+
+
+def scenario(name: str, ticks: int):
+    """Register a scenario. It is called with benchmark options and returns
+    a tick function and the amount of work done per tick"""
+
+    def register(function):
+        scenarios[name] = function, ticks
+        return function
+    return register
+
+
+def generate_level(width: int, height: int, seed: int = 0) -> str:
+    """Write a random level to a temporary folder and return its name"""
+
+    rng = random.Random(seed)
+    path = tempfile.mkdtemp(prefix="bench_level_")
+    generated_levels.append(path)
+    codes = ("pu", "gr", "ye", "wh")
+    with open(path + "/terrain.map", "w") as data:
+        data.write("\n".join(" ".join(
+            rng.choice(codes) if row in (0, height - 1) or col in (0, width - 1)
+            or row >= height - 4 or rng.random() < 0.02 else "0"
+            for col in range(width)) for row in range(height)))
+    for name in ("entities", "triggers"):
+        rows = [["0"] * width for _ in range(height)]
+        if name == "entities":
+            rows[height - 6][2] = "SP"
+        with open(path + "/" + name + ".map", "w") as data:
+            data.write("\n".join(" ".join(row) for row in rows))
+    with open(path + "/info.json", "w") as data:
+        json_dump({"prev": "", "next": ""}, data)
+    return os.path.relpath(path, "maps")
+
+
+def make_player(world: level.World) -> entities.Player:
+    return entities.Player(coords=world.spawn, max_health=100, max_speed=0.7,
+                           acceleration=0.01, weight=1, jump_strength=1.5)
+
+
+@scenario("fighters", ticks=200)
+def bench_fighters(options):
+    world = level.World(generate_level(400, 60))
+    world.start(State())
+    player = make_player(world)
+    surface = pygame.Surface(screen_res)
+    world.update(surface, 0, player)
+    for fighter in range(options.fighters):
+        entities.fighters.append(entities.TestFighter(
+            (TILESIZE * 4 + fighter * 50 % (TILESIZE * 390), TILESIZE * 40)))
+
+    def tick():
+        world.update(surface, 16, player)
+        player.update(world.matrix_terrain, world.camera, 16)
+        world.camera.render()
+    return tick, options.fighters
+
+
+@scenario("bullets", ticks=200)
+def bench_bullets(options):
+    world = level.World(generate_level(400, 60))
+    world.start(State())
+    player = make_player(world)
+    surface = pygame.Surface(screen_res)
+    world.update(surface, 0, player)
+    rng = random.Random(1)
+    pool = world.state.bullets
+
+    def tick():
+        while len(pool) < options.bullets:
+            pool.spawn((rng.uniform(TILESIZE, screen_res[0]),
+                        rng.uniform(TILESIZE, screen_res[1] - TILESIZE * 8)),
+                       rng.uniform(0.5, 2), rng.uniform(0, tau), 0.1, 10)
+        world.update(surface, 16, player)
+        world.camera.render()
+    return tick, options.bullets
+
+
+@scenario("terrain_scroll", ticks=200)
+def bench_terrain(options):
+    world = level.World(generate_level(options.size, options.size // 4))
+    surface = pygame.Surface(screen_res)
+    world.camera.surface = surface
+
+    class Target:
+        eyes = 0, 0
+    target = Target()
+    step = [0]
+
+    def tick():
+        step[0] += 1
+        target.eyes = (step[0] * 37 % (options.size * TILESIZE),
+                       step[0] * 11 % (options.size // 4 * TILESIZE))
+        world.camera.follow(target)
+        world.draw_terrain()
+        world.camera.render()
+    return tick, 1
+
+
+@scenario("minimap", ticks=5)
+def bench_minimap(options):
+    world = level.Level(generate_level(options.size, options.size // 4))
+
+    def tick():
+        MiniMap(world.matrix_terrain, (85, 0), 15, 150)
+    return tick, options.size * options.size // 4
+
+
+@scenario("menus", ticks=200)
+def bench_menus(options):
+    game.init()
+    surface = pygame.Surface(screen_res)
+
+    def tick():
+        for menu in game.menus.values():
+            menu.update(surface)
+    return tick, len(game.menus)
+
+
+@scenario("level_load", ticks=5)
+def bench_level_load(options):
+    name = generate_level(options.size, options.size // 4)
+
+    def tick():
+        level.Level(name)
+    return tick, options.size * options.size // 4
+
+
+@scenario("level_save", ticks=5)
+def bench_level_save(options):
+    editor = level.EditLevel(generate_level(options.size, options.size // 4))
+
+    def tick():
+        editor.save_changes()
+    return tick, options.size * options.size // 4
+
+
+def measure(name: str, options) -> dict:
+    """Run a scenario, returns ms per tick, throughput and peak memory"""
+
+    function, ticks = scenarios[name]
+    tracemalloc.start()
+    tick, work = function(options)
+    tick()  # Warm up caches
+    times = []
+    for _ in range(ticks):
+        start = perf_counter()
+        tick()
+        times.append(perf_counter() - start)
+        profiler.next_frame()
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times.sort()
+    mean = sum(times) / len(times)
+    return {"ms": mean * 1000, "p95_ms": times[int(len(times) * 0.95)] * 1000,
+            "throughput": work / mean, "memory_mb": memory / 2 ** 20}
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Measure per-tick costs of game subsystems")
+    parser.add_argument("scenarios", nargs="*", default=list(scenarios),
+                        help=f"any of: {', '.join(scenarios)}")
+    parser.add_argument("--fighters", type=int, default=100)
+    parser.add_argument("--bullets", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=1000,
+                        help="width of generated maps in tiles")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true",
+                        help="store results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="slowdown against the baseline to flag, 0.2 = 20%%")
+    options = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as data:
+            baseline = json_load(data)
+
+    results, regressions = {}, []
+    print(f"{'scenario':<16}{'ms/tick':>10}{'p95 ms':>10}"
+          f"{'throughput/s':>15}{'memory MB':>11}  baseline")
+    try:
+        for name in options.scenarios:
+            result = results[name] = measure(name, options)
+            note = ""
+            if name in baseline:
+                change = result["ms"] / baseline[name]["ms"] - 1
+                note = f"{change:+.0%}"
+                if change > options.threshold:
+                    note += " REGRESSION"
+                    regressions.append(name)
+            print(f"{name:<16}{result['ms']:>10.3f}{result['p95_ms']:>10.3f}"
+                  f"{result['throughput']:>15.0f}{result['memory_mb']:>11.2f}  {note}")
+    finally:
+        for path in generated_levels:
+            shutil.rmtree(path, ignore_errors=True)
+        generated_levels.clear()
+
+    if options.save:
+        with open(options.baseline, "w") as data:
+            json_dump(baseline | results, data, indent=4)
+    if regressions:
+        raise SystemExit(f"Regressions: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
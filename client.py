@@ -0,0 +1,212 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import asyncio
+import pygame
+import struct
+import numpy as np
+from argparse import ArgumentParser
+from collections import deque
+from math import hypot
+from modules import entities, level, net
+from modules.camera import Camera
+from modules.session import control, new_player
+from modules.parameters.options import TICK_RATE, TILESIZE
+from modules.timestep import FixedTimestep
+
+
+class BotClient(asyncio.DatagramProtocol):
+    """Client of a server which plays with random input.\n
+    Its player is predicted: input is applied locally right away, and when a
+    state comes the player is put where the server has it and inputs the
+    server hasn't applied yet are applied again.\n
+    `load_level` gives the terrain and a camera of a level by name. When
+    states come with a new level number the client joins again and is
+    welcomed to the new level"""
+
+    def __init__(self, load_level, rng: np.random.Generator) -> None:
+        self.load_level = load_level
+        self.terrain = None
+        self.camera: Camera = None
+        self.level = 0  # Level number of the session
+        self.full = False  # The server refused to join
+        self.rng = rng
+        self.transport: asyncio.DatagramTransport = None
+        self.player: entities.Player = None
+        self.number = 0  # Last sent input
+        self.pending = deque()  # Sent inputs which weren't applied yet
+        self.states: dict[int, dict] = {}  # Received entities by tick
+        self.acked_tick = 0
+        self.entities: dict[int, tuple] = {}
+        self.bullets: list[tuple[int, int]] = []
+        self.input = set(), (0, 0)
+        self.corrections: list[float] = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self.transport = transport
+        self.send(bytes((net.JOIN,)))
+
+    def send(self, data: bytes) -> None:
+        self.bytes_out += len(data)
+        self.transport.sendto(data)
+
+    def datagram_received(self, data: bytes, address: tuple) -> None:
+        self.bytes_in += len(data)
+        if not data:
+            return
+        if data[0] == net.WELCOME:
+            self.on_welcome(data)
+        elif data[0] == net.STATE and self.player is not None:
+            self.on_state(data)
+        elif data[0] == net.FULL:
+            self.full = True
+
+    def on_welcome(self, data: bytes) -> None:
+        try:
+            player_id, tick, level, spawn, level_name = net.decode_welcome(data)
+        except (struct.error, UnicodeDecodeError):  # Broken packet
+            return
+        if self.player is not None and level == self.level:  # Joined already
+            return
+        self.level = level
+        self.terrain, self.camera = self.load_level(level_name)
+        if self.player is None:
+            self.player = new_player(spawn)
+        else:
+            self.player.x, self.player.y = spawn
+            self.player.snap()
+        self.pending.clear()
+
+    def on_state(self, data: bytes) -> None:
+        try:
+            tick, base_tick, input_number, level, own, current, bullets =\
+                net.decode_state(data, self.states)
+        except KeyError:  # Base is gone, a newer state will come
+            return
+        except (IndexError, struct.error):  # Broken packet
+            return
+        if tick <= self.acked_tick:  # Came late
+            return
+        self.states[tick] = current
+        self.acked_tick = tick
+        for old_tick in [old_tick for old_tick in self.states if old_tick < base_tick]:
+            del self.states[old_tick]
+        self.entities, self.bullets = current, bullets
+        if level != self.level:  # The level changed, the player is elsewhere
+            self.send(bytes((net.JOIN,)))
+            return
+
+        predicted = self.player.x, self.player.y
+        registry, index = entities.registry, self.player.index
+        x, y, registry.speed_x[index], registry.speed_y[index], health = own
+        self.player.x, self.player.y = x, y
+        registry.health[index] = health
+        while self.pending and self.pending[0][0] <= input_number:
+            self.pending.popleft()
+        for number, keyboard_keys, aim in self.pending:
+            self.predict(keyboard_keys, aim)
+        self.player.snap()
+        self.corrections.append(hypot(self.player.x - predicted[0],
+                                      self.player.y - predicted[1]))
+
+    def predict(self, keyboard_keys: set, aim: tuple[int, int]) -> None:
+        """Tick of the own player, attacks are left to the server"""
+
+        eyes = self.player.eyes
+        dt = 1000 / TICK_RATE
+        control(self.player, keyboard_keys, set(),
+                     (eyes[0] + aim[0], eyes[1] + aim[1]), dt)
+        self.player.update(self.terrain, self.camera, dt)
+
+    def step(self) -> None:
+        """Send the input of a tick and predict it"""
+
+        if self.player is None:
+            return
+        if self.rng.random() < 0.05:
+            keyboard_keys = {(pygame.K_a, pygame.K_d)[self.rng.integers(2)]}
+            if self.rng.random() < 0.3:
+                keyboard_keys.add(pygame.K_w)
+            self.input = keyboard_keys, tuple(self.rng.integers(-200, 200, 2).tolist())
+        keyboard_keys, aim = self.input
+        self.number += 1
+        self.pending.append((self.number, keyboard_keys, aim))
+        self.send(net.encode_input(self.number, self.acked_tick, keyboard_keys,
+                                   {pygame.BUTTON_LEFT}, aim))
+        self.predict(keyboard_keys, aim)
+
+    def leave(self) -> None:
+        self.send(bytes((net.LEAVE,)))
+        self.transport.close()
+
+
+async def run(host: str, port: int, clients: int, seconds: float,
+              seed: int = 0, sessions: int = 1) -> list[BotClient]:
+    """Connect bots to a server and play for some time. Bots are spread
+    over `sessions` sessions on ports from `port` up. They share terrains
+    of levels and a camera without a surface for each"""
+
+    pygame.init()
+    levels = {}
+
+    def load_level(level_name: str) -> tuple:
+        if level_name not in levels:
+            terrain = level.Level(level_name).matrix_terrain
+            levels[level_name] = terrain, Camera(
+                (terrain.width * TILESIZE, terrain.height * TILESIZE))
+        return levels[level_name]
+
+    loop = asyncio.get_running_loop()
+    bots = []
+    for index in range(clients):
+        transport, bot = await loop.create_datagram_endpoint(
+            lambda: BotClient(load_level, np.random.default_rng(seed + index)),
+            remote_addr=(host, port + index % sessions))
+        bots.append(bot)
+
+    timestep = FixedTimestep()
+    start = last = loop.time()
+    while loop.time() - start < seconds:
+        now = loop.time()
+        for tick in range(timestep.advance((now - last) * 1000)):
+            for bot in bots:
+                bot.step()
+        last = now
+        await asyncio.sleep(max(timestep.step - timestep.accumulator, 0) / 1000)
+    for bot in bots:
+        bot.leave()
+    return bots
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Load test a server with bots")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sessions", type=int, default=1,
+                        help="sessions of the server, on ports from --port up")
+    arguments = parser.parse_args()
+
+    bots = asyncio.run(run(arguments.host, arguments.port, arguments.clients,
+                           arguments.seconds, arguments.seed, arguments.sessions))
+    joined = [bot for bot in bots if bot.player is not None]
+    corrections = [error for bot in joined for error in bot.corrections]
+    print(f"{len(joined)}/{len(bots)} clients joined, "
+          f"{sum(bot.full for bot in bots)} refused, "
+          f"{sum(len(bot.corrections) for bot in joined)} states, "
+          f"{max([bot.level for bot in joined] or [0])} level changes")
+    if corrections:
+        print(f"Correction: mean {np.mean(corrections):.3f} px, "
+              f"max {np.max(corrections):.3f} px")
+    print(f"Per client: {np.mean([bot.bytes_in for bot in bots]) / arguments.seconds / 1024:.2f} KB/s in, "
+          f"{np.mean([bot.bytes_out for bot in bots]) / arguments.seconds / 1024:.2f} KB/s out, "
+          f"{np.mean([len(bot.entities) for bot in joined] or [0]):.1f} entities seen")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from argparse import ArgumentParser
+from json import load as json_load
+from time import perf_counter
+from modules import game
+from modules.profiler import profiler
+from modules.replay import Recording
+from modules.snapshot import Snapshot
+from modules.parameters.options import \
+    TICK_RATE, level_when_game_started, screen_res
+
+
+class ScriptedInput:
+    """Input played from a list of segments, like\n
+    `{"frames": 120, "keys": ["d", "w"], "buttons": [1], "mouse": [640, 360]}`\n
+    Keys are pygame key names, buttons are mouse button numbers.
+    There is no input after the last segment"""
+
+    def __init__(self, segments: list[dict] = ()) -> None:
+        self.segments = [(
+            segment["frames"],
+            tuple(segment.get("keys", ())),
+            set(segment.get("buttons", ())),
+            tuple(segment.get("mouse", (0, 0)))
+        ) for segment in segments]
+        # Key names are resolved on the first frame of a segment, pygame
+        # has to be initialized for that
+        self.keys: list[set] = [None] * len(self.segments)
+        self.segment = 0
+        self.frames_left = self.segments[0][0] if self.segments else 0
+
+    @classmethod
+    def load(cls, path: str) -> "ScriptedInput":
+        with open(path) as script:
+            return cls(json_load(script))
+
+    def next(self) -> tuple[set, set, tuple]:
+        """Input of the next frame: keyboard keys, mouse buttons, mouse pos"""
+
+        while self.frames_left == 0:
+            self.segment += 1
+            if self.segment >= len(self.segments):
+                return set(), set(), (0, 0)
+            self.frames_left = self.segments[self.segment][0]
+        self.frames_left -= 1
+        frames, key_names, mouse_buttons, mouse_pos = self.segments[self.segment]
+        if self.keys[self.segment] is None:
+            self.keys[self.segment] = {pygame.key.key_code(key) for key in key_names}
+        return self.keys[self.segment], mouse_buttons, mouse_pos
+
+
+def run(level_name: str, frames: int, dt: float = 1000 / TICK_RATE,
+        script: ScriptedInput = None, render: bool = False) -> dict:
+    """Simulate a level at a fixed `dt` as fast as possible.\n
+    Rendering is skipped unless `render` is set, then frames are drawn on an
+    off-screen surface"""
+
+    pygame.init()
+    script = script if script is not None else ScriptedInput()
+    surface = pygame.Surface(screen_res) if render else None
+    game.start_level(level_name)
+
+    start = perf_counter()
+    for frame in range(frames):
+        keyboard_keys, mouse_buttons, mouse_pos = script.next()
+        game.simulate(surface, keyboard_keys, mouse_buttons, mouse_pos, dt)
+        profiler.next_frame()
+    elapsed = perf_counter() - start
+
+    return {"frames": frames, "simulated": frames * dt / 1000,
+            "elapsed": elapsed, "speedup": frames * dt / 1000 / elapsed,
+            "player": (game.player.x, game.player.y, game.player.get_health())}
+
+
+def replay(recording: Recording, verify: bool = True) -> dict:
+    """Feed recorded frames through the game as fast as possible. Frames
+    are simulated in fixed ticks like in the game, without drawing.\n
+    With `verify` checksums of the state are compared to recorded ones,
+    the first frame which doesn't match is returned as `mismatch`"""
+
+    pygame.init()
+    game.start_level(recording.level_name)
+    if recording.snapshot:
+        game.load_snapshot(Snapshot.from_bytes(recording.snapshot))
+
+    frames = checks = 0
+    mismatch = None
+    start = perf_counter()
+    for keyboard_keys, mouse_buttons, mouse_pos, dt, checksum in recording:
+        game.advance(keyboard_keys, mouse_buttons, mouse_pos, dt)
+        frames += 1
+        if verify and checksum is not None:
+            checks += 1
+            if game.get_checksum() != checksum:
+                mismatch = frames
+                break
+    elapsed = perf_counter() - start
+
+    return {"frames": frames, "checks": checks, "mismatch": mismatch,
+            "elapsed": elapsed,
+            "player": (game.player.x, game.player.y, game.player.get_health())}
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Run the game simulation without a display")
+    parser.add_argument("--level", default=level_when_game_started)
+    parser.add_argument("--frames", type=int, default=3600)
+    parser.add_argument("--dt", type=float, default=1000 / TICK_RATE,
+                        help="fixed time step in milliseconds")
+    parser.add_argument("--script", help="JSON file with scripted input")
+    parser.add_argument("--render", action="store_true",
+                        help="draw frames on an off-screen surface")
+    parser.add_argument("--trace", help="write a Chrome trace of the last frames")
+    parser.add_argument("--replay", help="replay a recording and verify it")
+    arguments = parser.parse_args()
+    profiler.enabled = bool(arguments.trace)
+
+    if arguments.replay:
+        stats = replay(Recording.load(arguments.replay))
+        print(f"{stats['frames']} frames replayed in {stats['elapsed']:.2f} s, "
+              f"{stats['checks']} checksums", "match" if stats["mismatch"] is None
+              else f"differ from frame {stats['mismatch']}")
+        print("Player x, y, health:", *stats["player"])
+        return
+
+    stats = run(arguments.level, arguments.frames, arguments.dt,
+                ScriptedInput.load(arguments.script) if arguments.script else None,
+                arguments.render)
+    print(f"{stats['frames']} frames, {stats['simulated']:.1f} s simulated "
+          f"in {stats['elapsed']:.2f} s ({stats['speedup']:.1f}x real time)")
+    print("Player x, y, health:", *stats["player"])
+    if arguments.trace:
+        profiler.export(arguments.trace)
+
+
+if __name__ == "__main__":
+    main()
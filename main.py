@@ -1,5 +1,7 @@
 import pygame
 from modules import game
+from modules.profiler import profiler
+from modules.render import dirty_rects
 from modules.parameters.options import screen_res, fps, title, icon_path
 
 
@@ -15,6 +17,9 @@ released_buttons = set()
 keyboard_keys = set()
 pressed_keys = set()
 released_keys = set()
+trace_path = "profile_trace.json"  # Recent frames are written here on F12
+profiler.enabled = True
+replay_path = "replay.bin"  # Input since the level started is written on F9
 game.init()
 
 
@@ -40,6 +45,14 @@ def on_keyboard_key(key: int, pressed: bool) -> None:
 
     keyboard_keys.add(key)
     pressed_keys.add(key)
+    if key == pygame.K_F12:
+        profiler.export(trace_path)
+    elif key == pygame.K_F9 and game.recorder is not None:
+        game.recorder.save(replay_path)
+    elif key == pygame.K_F5 and game.game_status == 1:
+        game.quicksave()
+    elif key == pygame.K_F8 and game.game_status == 1:
+        game.quickload()
 
 
 def update(dt: int) -> None:
@@ -48,9 +61,11 @@ def update(dt: int) -> None:
                 mouse_buttons=mouse_buttons, pressed_buttons=pressed_buttons,
                 released_buttons=released_buttons, mouse_pos=mouse_pos,
                 clock=clock, dt=dt)
-    pygame.display.flip()
+    with profiler.zone("pygame.display.update"):
+        dirty_rects.present()
 
 
+@profiler.profile("main.event_handling")
 def event_handling() -> None:
     global running, mouse_pos
 
@@ -75,9 +90,10 @@ def event_handling() -> None:
 
 def main() -> None:
     while running:
-        dt = clock.tick(fps)
+        dt = clock.tick(fps)  # Caps rendering only, ticks are fixed
         event_handling()
         update(dt)
+        profiler.next_frame()
 
         pressed_buttons.clear()
         released_buttons.clear()
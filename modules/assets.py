@@ -0,0 +1,122 @@
+import pygame
+from collections import OrderedDict
+from modules.parameters.options import ASSET_MEMORY, fonts_path, images_path
+
+
+class ImageCache:
+    """Images shared between all users and converted to the display format.\n
+    Keyed by path, size, colorkey and rotation. Least recently used images
+    are dropped from the cache when the memory budget is exceeded, surfaces
+    still used by somebody stay alive until they are released"""
+
+    def __init__(self, memory: int = ASSET_MEMORY) -> None:
+        self.max_memory = memory
+        self.memory = 0
+        self.images: OrderedDict[tuple, pygame.Surface] = OrderedDict()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def load(self, path: str, size: tuple[int, int] = None,
+             colorkey: tuple[int, int, int] = None,
+             rotation: float = 0) -> pygame.Surface:
+        """Get an image from `images_path`. Never modify returned surfaces,
+        they are shared. Rotation is rounded to whole degrees"""
+
+        key = path, None if size is None else tuple(size), \
+            None if colorkey is None else tuple(colorkey), round(rotation) % 360
+        image = self.images.get(key)
+        if image is not None:
+            self.hits += 1
+            self.images.move_to_end(key)
+            return image
+        self.misses += 1
+
+        if rotation:
+            image = pygame.transform.rotate(
+                self.load(path, size, colorkey), key[3])
+        elif size is not None:
+            image = pygame.transform.scale(self.load(path, None, colorkey), size)
+        else:
+            image = self.convert(pygame.image.load(images_path + path))
+            if colorkey is not None:
+                image.set_colorkey(colorkey)
+
+        self.images[key] = image
+        self.memory += self.get_size(image)
+        while self.memory > self.max_memory and len(self.images) > 1:
+            self.memory -= self.get_size(self.images.popitem(last=False)[1])
+            self.evictions += 1
+        return image
+
+    @staticmethod
+    def convert(image: pygame.Surface) -> pygame.Surface:
+        """Convert to the display pixel format, if there is a display"""
+
+        if pygame.display.get_surface() is None:
+            return image
+        if image.get_flags() & pygame.SRCALPHA:
+            return image.convert_alpha()
+        return image.convert()
+
+    @staticmethod
+    def get_size(image: pygame.Surface) -> int:
+        return image.get_width() * image.get_height() * image.get_bytesize()
+
+    def clear(self) -> None:
+        self.images.clear()
+        self.memory = 0
+
+    def get_stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {"images": len(self.images), "memory": self.memory,
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / requests if requests else 0}
+
+
+images = ImageCache()
+
+
+class FontCache:
+    """Fonts shared per (file, size) and a cache of rendered texts.\n
+    Least recently rendered texts are dropped past `max_texts`"""
+
+    def __init__(self, max_texts: int = 512) -> None:
+        self.fonts: dict[tuple[str, int], pygame.font.Font] = {}
+        self.max_texts = max_texts
+        self.texts: OrderedDict[tuple, pygame.Surface] = OrderedDict()
+        self.hits, self.misses = 0, 0
+
+    def get(self, file: str, size: int) -> pygame.font.Font:
+        """Get a font from `fonts_path`"""
+
+        key = file, size
+        if key not in self.fonts:
+            self.fonts[key] = pygame.font.Font(fonts_path + file, size)
+        return self.fonts[key]
+
+    def render(self, font: tuple[str, int], text: str, antialias: bool,
+               color: tuple[int, int, int]) -> pygame.Surface:
+        """Render a text with a font `(file, size)`. Never modify returned
+        surfaces, they are shared"""
+
+        key = font[0], font[1], text, antialias, tuple(color)
+        surface = self.texts.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.texts.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.get(*font).render(text, antialias, color)
+        self.texts[key] = surface
+        if len(self.texts) > self.max_texts:
+            self.texts.popitem(last=False)
+        return surface
+
+    def get_stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {"fonts": len(self.fonts), "texts": len(self.texts),
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0}
+
+
+fonts = FontCache()
@@ -0,0 +1,49 @@
+import pygame
+from modules.parameters.colors import BLACK, COLORS_SHORT
+from modules.parameters.options import TILESIZE
+from modules.tiles import TileGrid
+
+
+class TileAtlas:
+    """Pre-rendered tiles, one surface per tile code and size.\n
+    Layers are composed by blitting these in one `Surface.blits` call
+    instead of drawing every tile"""
+
+    def __init__(self, colors: dict[str, tuple[int, int, int]] = COLORS_SHORT) -> None:
+        self.colors = colors
+        self.tiles: dict[tuple[str, tuple[int, int]], pygame.Surface] = {}
+
+    def get(self, code: str, size: tuple[int, int] = (TILESIZE, TILESIZE)) -> pygame.Surface:
+        key = code, size
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self.tiles[key] = pygame.Surface(size)
+            tile.fill(self.colors[code])
+        return tile
+
+    def draw(self, surface: pygame.Surface, matrix: TileGrid,
+             area: tuple[int, int, int, int], origin: tuple[int, int] = (0, 0),
+             tile_size: float = TILESIZE) -> pygame.Rect:
+        """Redraw tiles of the area `(left, top, right, bottom)` on a surface
+        which top left corner is the `origin` tile. Tiles can have a
+        fractional size, then they are snapped to whole pixels.\n
+        Returns the changed rect of the surface"""
+
+        left, top, right, bottom = area
+        x = int((left - origin[0]) * tile_size)
+        y = int((top - origin[1]) * tile_size)
+        rect = pygame.Rect(x, y, int((right - origin[0]) * tile_size) - x,
+                           int((bottom - origin[1]) * tile_size) - y)
+        surface.fill(BLACK, rect)
+        sequence = []
+        for col_index, row_index, tile in matrix.items(*area):
+            x = int((col_index - origin[0]) * tile_size)
+            y = int((row_index - origin[1]) * tile_size)
+            sequence.append((self.get(tile, (
+                int((col_index - origin[0] + 1) * tile_size) - x,
+                int((row_index - origin[1] + 1) * tile_size) - y)), (x, y)))
+        surface.blits(sequence, doreturn=False)
+        return rect
+
+
+atlas = TileAtlas()
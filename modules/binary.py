@@ -0,0 +1,29 @@
+def write_varint(stream: bytearray, value: int) -> None:
+    """Unsigned integer in 7 bit groups, low groups first"""
+
+    while value > 0x7F:
+        stream.append(value & 0x7F | 0x80)
+        value >>= 7
+    stream.append(value)
+
+
+def read_varint(data: bytes, offset: int) -> tuple[int, int]:
+    """Returns the value and the offset after it"""
+
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def zigzag(value: int) -> int:
+    """Signed integer as unsigned, small magnitudes stay small"""
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
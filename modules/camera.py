@@ -0,0 +1,98 @@
+import pygame
+import numpy as np
+from math import ceil
+from modules.render import ENTITIES, RenderQueue
+from modules.parameters.options import TILESIZE, screen_res
+
+
+class Camera:
+    """Viewport which follows an entity over a level.\n
+    Blits through the camera are shifted to screen coordinates, skipped
+    when they are out of view and queued by layer until `render`, so it can
+    be passed instead of a surface.
+    Without a surface (headless simulation) nothing is drawn"""
+
+    def __init__(self, map_size: tuple[int, int],
+                 view_size: tuple[int, int] = screen_res) -> None:
+        self.map_width, self.map_height = map_size
+        self.width, self.height = view_size
+        self.x, self.y = 0, 0
+        self.surface: pygame.Surface = None
+        self.queue = RenderQueue()
+
+    def follow(self, entity, alpha: float = 1) -> None:
+        """Center the view on the entity, keeping it inside the map.
+        With `alpha` below 1 it is centered on the interpolated entity"""
+
+        self.look_at(*(entity.eyes if alpha == 1 else entity.get_eyes(alpha)))
+
+    def look_at(self, x: float, y: float) -> None:
+        """Center the view on a point, keeping it inside the map"""
+        self.x, self.y = self.get_position(x, y)
+
+    def get_position(self, x: float, y: float) -> tuple[int, int]:
+        """Top left corner of the view centered on a point"""
+
+        return (int(min(max(x - self.width / 2, 0),
+                        max(self.map_width - self.width, 0))),
+                int(min(max(y - self.height / 2, 0),
+                        max(self.map_height - self.height, 0))))
+
+    def get_tiles_area(self, position: tuple[int, int] = None
+                       ) -> tuple[int, int, int, int]:
+        """Visible tiles `(left, top, right, bottom)`, right and bottom are
+        exclusive. The size is constant, so the area can leave the map.\n
+        With `position` it is the area of a view with that top left corner"""
+
+        x, y = (self.x, self.y) if position is None else position
+        left, top = x // TILESIZE, y // TILESIZE
+        return (left, top, left + ceil(self.width / TILESIZE) + 1,
+                top + ceil(self.height / TILESIZE) + 1)
+
+    def is_visible(self, x: float, y: float, width: int, height: int) -> bool:
+        return x + width > self.x and x < self.x + self.width\
+            and y + height > self.y and y < self.y + self.height
+
+    def cull(self, x: np.ndarray, y: np.ndarray, width: np.ndarray,
+             height: np.ndarray) -> np.ndarray:
+        """`is_visible` of many rects, returns a mask"""
+
+        return (x + width > self.x) & (x < self.x + self.width)\
+            & (y + height > self.y) & (y < self.y + self.height)
+
+    def to_screen(self, pos: tuple[float, float]) -> tuple[float, float]:
+        return pos[0] - self.x, pos[1] - self.y
+
+    def to_world(self, pos: tuple[float, float]) -> tuple[float, float]:
+        return pos[0] + self.x, pos[1] + self.y
+
+    def blit(self, source: pygame.Surface, dest: tuple[float, float],
+             area: tuple = None, layer: int = ENTITIES) -> None:
+        """Blit a surface placed in world coordinates"""
+
+        if self.surface is None:
+            return
+        width, height = source.get_size() if area is None else area[2:]
+        if self.is_visible(dest[0], dest[1], width, height):
+            self.queue.submit(source, (dest[0] - self.x, dest[1] - self.y), area, layer)
+
+    def blits(self, sequence, doreturn: bool = False, layer: int = ENTITIES) -> None:
+        """Blit many surfaces placed in world coordinates"""
+
+        if self.surface is None:
+            return
+        offset_x, offset_y = self.x, self.y
+        self.queue.extend(
+            [(source, (dest[0] - offset_x, dest[1] - offset_y), *(area or (None,)))
+             for source, dest, *area in sequence
+             if self.is_visible(dest[0], dest[1],
+                                *(source.get_size() if not area else area[0][2:]))],
+            layer)
+
+    def render(self) -> None:
+        """Draw the queued blits on the surface"""
+
+        if self.surface is None:
+            self.queue.clear()
+            return
+        self.queue.flush(self.surface)
@@ -0,0 +1,224 @@
+import os
+import numpy as np
+from bisect import bisect_right
+from collections import OrderedDict
+from mmap import mmap, ACCESS_READ
+from modules.tiles import TileGrid
+from modules.parameters.options import CHUNK_SIZE, CHUNK_MEMORY
+
+
+class TextMapSource:
+    """Memory mapped text .map file which is read row by row.\n
+    Only offsets of rows are indexed on open, rows are split when needed"""
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE,
+                 cached_rows: int = 256) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.palette = None
+        # Byte offsets of every chunk column for recently read rows
+        self.cached_rows = cached_rows
+        self.columns: OrderedDict[int, np.ndarray] = OrderedDict()
+        self.open()
+
+    def open(self) -> None:
+        self.file = open(self.path, "rb")
+        self.data = mmap(self.file.fileno(), 0, access=ACCESS_READ)\
+            if os.path.getsize(self.path) else b""
+        self.rows = [0]
+        position = self.data.find(b"\n")
+        while position != -1:
+            self.rows.append(position + 1)
+            position = self.data.find(b"\n", position + 1)
+        self.width = len(self.get_row(0).split())
+        self.height = len(self.rows)
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap):
+            self.data.close()
+        self.file.close()
+        self.columns.clear()
+
+    def get_row(self, row: int) -> bytes:
+        end = self.rows[row + 1] if row + 1 < len(self.rows) else len(self.data)
+        return self.data[self.rows[row]:end]
+
+    def get_columns(self, row: int, line: bytes) -> np.ndarray:
+        """Byte offsets of tokens which start chunk columns in a row"""
+
+        if row in self.columns:
+            self.columns.move_to_end(row)
+            return self.columns[row]
+        chars = np.frombuffer(line, dtype=np.uint8)
+        spaces = (chars == 32) | (chars == 9) | (chars == 10) | (chars == 13)
+        starts = np.flatnonzero(
+            ~spaces & np.concatenate(([True], spaces[:-1])))
+        self.columns[row] = starts[::self.chunk_size]
+        if len(self.columns) > self.cached_rows:
+            self.columns.popitem(last=False)
+        return self.columns[row]
+
+    def read_chunk(self, chunk_col: int, chunk_row: int, get_id) -> bytearray:
+        """Parse tile ids of a chunk, codes are converted with `get_id`"""
+
+        size = self.chunk_size
+        chunk = bytearray(size * size)
+        top = chunk_row * size
+        for row in range(top, min(top + size, self.height)):
+            line = self.get_row(row)
+            columns = self.get_columns(row, line)
+            if chunk_col >= len(columns):
+                continue
+            end = columns[chunk_col + 1] if chunk_col + 1 < len(columns)\
+                else len(line)
+            codes = line[columns[chunk_col]:end].decode().split()[:size]
+            start = (row - top) * size
+            chunk[start:start + len(codes)] = bytes(map(get_id, codes))
+        return chunk
+
+    def find(self, code: str) -> tuple[int, int] | None:
+        """Get `(col, row)` of the first tile with the code"""
+
+        token = code.encode()
+        position = self.data.find(token)
+        while position != -1:
+            end = position + len(token)
+            if (position == 0 or self.data[position - 1:position].isspace())\
+                    and (end == len(self.data) or self.data[end:end + 1].isspace()):
+                row = bisect_right(self.rows, position) - 1
+                return (len(self.data[self.rows[row]:position].split()), row)
+            position = self.data.find(token, end)
+        return None
+
+
+class ChunkedGrid(TileGrid):
+    """Layer split into square chunks which are parsed on demand.\n
+    Only recently used chunks are kept in memory, edited ones are never
+    evicted until they are saved"""
+
+    def __init__(self, source: TextMapSource, chunk_size: int = CHUNK_SIZE,
+                 memory: int = CHUNK_MEMORY) -> None:
+        super().__init__(source.width, source.height, source.palette,
+                         bytearray())
+        self.source = source
+        self.chunk_size = chunk_size
+        self.max_chunks = max(1, memory // chunk_size ** 2)
+        self.chunks: OrderedDict[tuple[int, int], bytearray] = OrderedDict()
+        self.edited: dict[tuple[int, int], bytearray] = {}
+
+    def get_chunk(self, chunk_col: int, chunk_row: int) -> bytearray:
+        key = chunk_col, chunk_row
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        chunk = self.edited.get(key)
+        if chunk is not None:
+            return chunk
+        return self.load_chunk(chunk_col, chunk_row)
+
+    def load_chunk(self, chunk_col: int, chunk_row: int) -> bytearray:
+        """Parse a chunk, evicting the least recently used one if needed"""
+
+        chunk = self.source.read_chunk(chunk_col, chunk_row, self.get_id)
+        self.chunks[chunk_col, chunk_row] = chunk
+        if len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def get(self, col: int, row: int) -> int:
+        if 0 <= col < self.width and 0 <= row < self.height:
+            size = self.chunk_size
+            chunk_col, col = divmod(col, size)
+            chunk_row, row = divmod(row, size)
+            return self.get_chunk(chunk_col, chunk_row)[row * size + col]
+        return 0
+
+    def set(self, col: int, row: int, code: str) -> None:
+        if 0 <= col < self.width and 0 <= row < self.height:
+            size = self.chunk_size
+            chunk_col, col = divmod(col, size)
+            chunk_row, row = divmod(row, size)
+            chunk = self.get_chunk(chunk_col, chunk_row)
+            self.chunks.pop((chunk_col, chunk_row), None)
+            self.edited[chunk_col, chunk_row] = chunk
+            chunk[row * size + col] = self.get_id(code)
+
+    def fill(self, left: int, top: int, right: int, bottom: int,
+             code: str) -> None:
+        for row_index in range(max(top, 0), min(bottom, self.height)):
+            for col_index in range(max(left, 0), min(right, self.width)):
+                self.set(col_index, row_index, code)
+
+    def lookup(self, cols: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        size = self.chunk_size
+        chunks_per_row = self.width // size + 1
+        cols, rows = np.broadcast_arrays(cols, rows)
+        inside = (cols >= 0) & (cols < self.width)\
+            & (rows >= 0) & (rows < self.height)
+        keys = rows // size * chunks_per_row + cols // size
+        tiles = np.zeros(np.shape(cols), dtype=np.uint8)
+        for key in np.unique(keys[inside]).tolist():
+            in_chunk = inside & (keys == key)
+            chunk_row, chunk_col = divmod(key, chunks_per_row)
+            chunk = np.frombuffer(self.get_chunk(chunk_col, chunk_row),
+                                  dtype=np.uint8)
+            tiles[in_chunk] = chunk[rows[in_chunk] % size * size
+                                    + cols[in_chunk] % size]
+        return tiles
+
+    def find(self, code: str) -> tuple[int, int] | None:
+        return self.source.find(code)
+
+    def items(self, left: int = 0, top: int = 0,
+              right: int = None, bottom: int = None):
+        size, palette = self.chunk_size, self.palette
+        left, top = max(left, 0), max(top, 0)
+        right = self.width if right is None else min(right, self.width)
+        bottom = self.height if bottom is None else min(bottom, self.height)
+        for chunk_row in range(top // size, (bottom - 1) // size + 1):
+            for chunk_col in range(left // size, (right - 1) // size + 1):
+                chunk = self.get_chunk(chunk_col, chunk_row)
+                chunk_left, chunk_top = chunk_col * size, chunk_row * size
+                col_start = max(left, chunk_left)
+                col_end = min(right, chunk_left + size)
+                for row_index in range(max(top, chunk_top),
+                                       min(bottom, chunk_top + size)):
+                    start = (row_index - chunk_top) * size - chunk_left
+                    for col_index, tile in enumerate(
+                            chunk[start + col_start:start + col_end], col_start):
+                        if tile:
+                            yield col_index, row_index, palette[tile]
+
+    def iter_rows(self):
+        """Rows of tile codes, parsed one band of chunks at a time"""
+
+        size, palette = self.chunk_size, self.palette
+        for chunk_row in range(0, (self.height - 1) // size + 1):
+            band = [self.get_chunk(chunk_col, chunk_row)
+                    for chunk_col in range(0, (self.width - 1) // size + 1)]
+            for row_index in range(chunk_row * size,
+                                   min((chunk_row + 1) * size, self.height)):
+                start = (row_index - chunk_row * size) * size
+                row = []
+                for chunk in band:
+                    row.extend(palette[tile]
+                               for tile in chunk[start:start + size])
+                yield row[:self.width]
+
+    def to_rows(self) -> list[list[str]]:
+        return list(self.iter_rows())
+
+    def save(self, path: str) -> None:
+        """Write the layer band by band and map the new file"""
+
+        with open(path + ".tmp", "w", encoding="utf-8") as data:
+            for row_index, row in enumerate(self.iter_rows()):
+                if row_index:
+                    data.write("\n")
+                data.write(" ".join(row))
+        self.source.close()
+        os.replace(path + ".tmp", path)
+        self.source = TextMapSource(path, self.chunk_size)
+        self.chunks.clear()
+        self.edited.clear()
@@ -1,6 +1,10 @@
 import pygame
-from math import sin
-from modules.parameters.options import fonts_path
+import numpy as np
+from math import sin, tau
+from modules.assets import fonts, images
+from modules.camera import Camera
+from modules.render import EFFECTS
+from modules.parameters.options import GRAVITY
 
 pygame.mixer.init()
 pygame.font.init()
@@ -20,7 +24,7 @@ class SpeechBubble:
         self.x, self.y = coords
         self.bg_color = bg_color
         self.text = text
-        self.font = pygame.font.Font(fonts_path+font[0], font[1])
+        self.font = fonts.get(*font)
         self.font_size = font[1]
         self.width = min(self.font_size * 15, self.font_size * len(text) // 2) + self.font_size * 2
         self.height = self.font_size * (len(text) // 30 + 3)
@@ -28,7 +32,7 @@ class SpeechBubble:
         self.surface.fill(bg_color)
         for line in range(len(text)//30+1):
             self.surface.blit(
-                self.font.render(self.text[30*line:30*line+30], True, text_color),
+                fonts.render(font, self.text[30*line:30*line+30], True, text_color),
                 (self.font_size, self.font_size * (line+1)))
 
 
@@ -37,3 +41,174 @@ def lsd(color: float, brightness: int) -> tuple:
             abs(int(sin(color+1) * brightness)),
             abs(int(sin(color+2) * brightness)))
 
+
+class Emitter:
+    """Particles of one kind stored as arrays and updated in one step.\n
+    Particles play frames of a shared sprite sheet (looping if they live
+    longer than the animation), fly and fall without colliding"""
+
+    fields = ("x", "y", "prev_x", "prev_y", "speed_x", "speed_y", "weight",
+              "time", "time_left")
+
+    def __init__(self, sprite_path: str, size: tuple[int, int], cols: int,
+                 rows: int = 1, frame_delay: int = 30, lifetime: int = None,
+                 capacity: int = 256) -> None:
+        self.sprite_path = sprite_path
+        self.size = size
+        self.cols, self.rows = cols, rows
+        self.frame_delay = frame_delay
+        # By default particles play the animation once
+        self.lifetime = cols * rows * frame_delay if lifetime is None else lifetime
+        self.count = 0
+        for name in self.fields:
+            setattr(self, name, np.zeros(capacity))
+        self.frames: list[pygame.Surface] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get_frames(self) -> list[pygame.Surface]:
+        """Frames of the sheet, cut once from the cached image"""
+
+        if self.frames is None:
+            width, height = self.size
+            sheet = images.load(self.sprite_path, (width * self.cols,
+                                                   height * self.rows))
+            self.frames = [sheet.subsurface((col * width, row * height, width, height))
+                           for row in range(self.rows) for col in range(self.cols)]
+        return self.frames
+
+    def grow(self, count: int) -> None:
+        """Make room for `count` more particles"""
+
+        capacity = len(self.x)
+        while capacity < self.count + count:
+            capacity *= 2
+        for name in self.fields:
+            array = getattr(self, name)
+            if len(array) < capacity:
+                setattr(self, name, np.concatenate(
+                    (array, np.zeros(capacity - len(array)))))
+
+    def clear(self) -> None:
+        self.count = 0
+
+    def emit(self, coords: tuple[float, float], count: int = 1, speed: float = 0,
+             angle: float = 0, spread: float = tau, weight: float = 0,
+             lifetime: int = None) -> None:
+        """Spawn particles at one point, flying at random angles within
+        `spread` around `angle`"""
+
+        self.emit_many(np.full(count, coords[0], dtype=np.float64),
+                       np.full(count, coords[1], dtype=np.float64),
+                       speed, angle, spread, weight, lifetime)
+
+    def emit_many(self, x: np.ndarray, y: np.ndarray, speed: float = 0,
+                  angle: float = 0, spread: float = tau, weight: float = 0,
+                  lifetime: int = None) -> None:
+        """Spawn a particle at every point"""
+
+        count = len(x)
+        if not count:
+            return
+        if self.count + count > len(self.x):
+            self.grow(count)
+        new = slice(self.count, self.count + count)
+        self.x[new] = self.prev_x[new] = x
+        self.y[new] = self.prev_y[new] = y
+        angles = angle + (np.random.random(count) - 0.5) * spread
+        speeds = speed * np.random.random(count) if speed else 0
+        self.speed_x[new] = np.cos(angles) * speeds
+        self.speed_y[new] = np.sin(angles) * speeds
+        self.weight[new] = weight
+        self.time[new] = 0
+        self.time_left[new] = self.lifetime if lifetime is None else lifetime
+        self.count += count
+
+    def update(self, dt: float) -> None:
+        """Move and age all particles, expired ones are swap-removed"""
+
+        count = self.count
+        if not count:
+            return
+        self.prev_x[:count] = self.x[:count]
+        self.prev_y[:count] = self.y[:count]
+        self.x[:count] += self.speed_x[:count] * dt
+        self.y[:count] += self.speed_y[:count] * dt
+        self.speed_y[:count] += GRAVITY * self.weight[:count] * dt
+        self.time[:count] += dt
+        self.time_left[:count] -= dt
+
+        dead = self.time_left[:count] <= 0
+        if dead.any():
+            new_count = count - int(np.count_nonzero(dead))
+            holes = np.flatnonzero(dead[:new_count])
+            movers = np.flatnonzero(~dead[new_count:]) + new_count
+            for name in self.fields:
+                array = getattr(self, name)
+                array[holes] = array[movers]
+            self.count = new_count
+
+    def draw(self, camera: Camera, alpha: float = 1) -> None:
+        """Queue particles in view of the camera on the effects layer"""
+
+        if camera.surface is None or not self.count:
+            return
+        count = self.count
+        x, y = self.x[:count], self.y[:count]
+        if alpha != 1:
+            prev_x, prev_y = self.prev_x[:count], self.prev_y[:count]
+            x, y = prev_x + (x - prev_x) * alpha, prev_y + (y - prev_y) * alpha
+        width, height = self.size
+        visible = camera.cull(x, y, width, height)
+        frames = self.get_frames()
+        indices = (self.time[:count][visible] // self.frame_delay).astype(np.intp)\
+            % len(frames)
+        camera.queue.extend(
+            [(frames[index], (x, y)) for index, x, y in zip(
+                indices.tolist(), (x[visible] - camera.x).tolist(),
+                (y[visible] - camera.y).tolist())],
+            EFFECTS)
+
+
+class Particles:
+    """Emitters by name, updated and drawn together"""
+
+    def __init__(self) -> None:
+        self.emitters: dict[str, Emitter] = {}
+
+    def __getitem__(self, name: str) -> Emitter:
+        return self.emitters[name]
+
+    def __len__(self) -> int:
+        return sum(map(len, self.emitters.values()))
+
+    def add(self, name: str, emitter: Emitter) -> None:
+        self.emitters[name] = emitter
+
+    def emit(self, name: str, coords: tuple[float, float], **parameters) -> None:
+        self.emitters[name].emit(coords, **parameters)
+
+    def clear(self) -> None:
+        for emitter in self.emitters.values():
+            emitter.clear()
+
+    def update(self, dt: float) -> None:
+        for emitter in self.emitters.values():
+            emitter.update(dt)
+
+    def draw(self, camera: Camera, alpha: float = 1) -> None:
+        for emitter in self.emitters.values():
+            emitter.draw(camera, alpha)
+
+
+def make_particles() -> Particles:
+    """Emitters of a state, see `State`"""
+
+    particles = Particles()
+    particles.add("spark", Emitter("other/spark.png", (20, 20), cols=6, frame_delay=30))
+    return particles
+
+
+# Particles of the current state
+particles = make_particles()
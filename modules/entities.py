@@ -1,11 +1,49 @@
 import pygame
-from math import sin, cos, degrees, atan2
-from modules import maths, weapons
+import numpy as np
+from math import atan2
+from modules import systems, weapons
+from modules.assets import images
 from modules.physics import *
-from modules.parameters.options import TILESIZE, images_path, FRICTION
+from modules.profiler import profiler
+from modules.registry import AI, HEALTH, POSITION, SPRITE, VELOCITY, Registry
+from modules.tiles import TileGrid
+
+
+# Entities' data lives in registry columns, classes below are facades over it.
+# It is the registry of the current state, see `State.activate`
+registry = Registry()
+
+
+class Column:
+    """Attribute of an entity stored in a registry column"""
+
+    def __init__(self, name: str, cast=float) -> None:
+        self.name = name
+        self.cast = cast
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        return self.cast(getattr(registry, self.name)[entity.index])
+
+    def __set__(self, entity, value) -> None:
+        getattr(registry, self.name)[entity.index] = value
+
+
+def as_collision(value) -> tuple[float, float, int]:
+    return float(value[0]), float(value[1]), int(value[2])
 
 
 class SpriteSheet:
+    sprite_sheet_cols = Column("sheet_cols", int)
+    sprite_sheet_rows = Column("sheet_rows", int)
+    frame_delay = Column("frame_delay")
+    current_col = Column("frame_col", int)
+    current_row = Column("frame_row", int)
+    time_passed_since_frame = Column("frame_time")
+    _width = Column("width", int)
+    _height = Column("height", int)
+
     def __init__(
         self,
         sprite_path: str,
@@ -16,46 +54,77 @@ class SpriteSheet:
         colorkey: tuple[int, int, int] = None
     ) -> None:
 
+        self.id = registry.create(self, SPRITE)
+        self.index = registry.get_index(self.id)
         self.sprite_sheet_cols, self.sprite_sheet_rows = cols, rows
         self.frame_delay = frame_delay
         self.rotation = rotation
+        registry.cycles[self.index] = -1
 
-        self.sheet = pygame.image.load(images_path+sprite_path)
+        self.sprite_path = sprite_path
+        self.colorkey = colorkey
         if size is not None:
             self._width, self._height = size
-            self.sheet = pygame.transform.scale(
-                self.sheet, (self._width * self.sprite_sheet_cols,
-                             self._height * self.sprite_sheet_rows))
+            self.sheet = images.load(
+                sprite_path, (self._width * self.sprite_sheet_cols,
+                              self._height * self.sprite_sheet_rows), colorkey)
         else:
+            self.sheet = images.load(sprite_path, colorkey=colorkey)
             self._width = self.sheet.get_width() // self.sprite_sheet_cols
             self._height = self.sheet.get_height() // self.sprite_sheet_rows
-        if colorkey is not None:
-            self.sheet.set_colorkey(colorkey)
 
+        self.reset_animation()
+
+    @classmethod
+    def restore(cls, index: int, sprite_path: str, colorkey: tuple,
+                rotation: float) -> "SpriteSheet":
+        """Facade of a slot filled from a snapshot, constructors aren't run.
+        The sheet comes from the image cache"""
+
+        entity = cls.__new__(cls)
+        entity.id = registry.get_id(index)
+        entity.index = index
+        entity.rotation = rotation
+        entity.sprite_path = sprite_path
+        entity.colorkey = colorkey
+        entity.sheet = images.load(
+            sprite_path, (entity._width * entity.sprite_sheet_cols,
+                          entity._height * entity.sprite_sheet_rows), colorkey)
+        return entity
+
+    @property
+    def shift_x(self) -> int:
+        return self.current_col * self._width
+
+    @property
+    def shift_y(self) -> int:
+        return self.current_row * self._height
+
+    def reset_animation(self) -> None:
         self.current_col, self.current_row = 0, 0
-        self.shift_x, self.shift_y = 0, 0
         self.time_passed_since_frame = 0
 
     def get_size(self) -> tuple[int, int]:
         return self._width, self._height
 
+    def get_indices(self) -> np.ndarray:
+        """Registry slot of the entity as a batch, for systems"""
+        return np.array((self.index,))
+
+    def draw(self, surface: pygame.Surface, alpha: float = 1) -> None:
+        systems.draw(registry, self.get_indices(), surface, alpha)
+
     def update(self, dt: int, surface: pygame.Surface) -> None:
-        surface.blit(self.sheet, (self.x, self.y),
-                     (self.shift_x, self.shift_y, self._width, self._height))
-        self.time_passed_since_frame += dt
-        if self.time_passed_since_frame >= self.frame_delay:
-            self.time_passed_since_frame = 0
-            self.current_col += 1
-            if self.current_col == self.sprite_sheet_cols:
-                self.current_col = 0
-                self.current_row += 1
-                if self.current_row == self.sprite_sheet_rows:
-                    self.current_row = 0
-            self.shift_x = self.current_col * self._width
-            self.shift_y = self.current_row * self._height
+        indices = self.get_indices()
+        systems.draw(registry, indices, surface)
+        systems.animate(registry, indices, dt)
 
 
 class Entity(SpriteSheet):
+    x = Column("x")
+    y = Column("y")
+    max_health = Column("max_health", int)
+
     def __init__(
         self,
         coords: tuple,
@@ -71,37 +140,112 @@ class Entity(SpriteSheet):
         super().__init__(sprite_path=sprite_path, cols=sprite_sheet_cols,
                          rows=sprite_sheet_rows, frame_delay=sprite_frame_delay,
                          size=size, rotation=rotation, colorkey=sprite_color_key)
+        registry.components[self.index] |= POSITION | HEALTH
         self.x, self.y = coords
+        self.snap()
         self.max_health = max_health
-        self.__health = max_health
+        registry.health[self.index] = max_health
 
         self.center = self._width / 2, self._height / 2
         self.eyes = self.x + self.center[0], self.y + self.center[1]
 
-        self.__alive = True
+        registry.alive[self.index] = True
+
+    @classmethod
+    def restore(cls, index: int, sprite_path: str, colorkey: tuple,
+                rotation: float) -> "Entity":
+        entity = super().restore(index, sprite_path, colorkey, rotation)
+        entity.center = entity._width / 2, entity._height / 2
+        return entity
+
+    @property
+    def eyes(self) -> tuple[float, float]:
+        return float(registry.eyes_x[self.index]), float(registry.eyes_y[self.index])
+
+    @eyes.setter
+    def eyes(self, eyes: tuple[float, float]) -> None:
+        registry.eyes_x[self.index], registry.eyes_y[self.index] = eyes
+
+    def get_eyes(self, alpha: float = 1) -> tuple[float, float]:
+        """Eyes between the previous and the current tick"""
+        back = 1 - alpha
+        return (float(registry.eyes_x[self.index]
+                      - (registry.x[self.index] - registry.prev_x[self.index]) * back),
+                float(registry.eyes_y[self.index]
+                      - (registry.y[self.index] - registry.prev_y[self.index]) * back))
+
+    def snap(self) -> None:
+        """Don't interpolate from the previous position, after teleporting"""
+        registry.prev_x[self.index] = registry.x[self.index]
+        registry.prev_y[self.index] = registry.y[self.index]
 
     def take_damage(self, damage: int) -> None:
-        self.__health -= damage
+        registry.health[self.index] -= damage
 
     def _die(self) -> None:
-        self.__alive = False
+        registry.alive[self.index] = False
 
     def get_health(self) -> int:
-        return self.__health
+        return int(registry.health[self.index])
 
     def is_alive(self) -> bool:
-        return self.__alive
+        return registry.is_valid(self.id) and bool(registry.alive[self.index])
 
     def update(self, dt: int, surface: pygame.Surface) -> None:
         super().update(dt=dt, surface=surface)
-        if self.__health <= 0:
-            self._die()
+        systems.check_health(registry, self.get_indices())
+
+
+class Group:
+    """Entities of one kind, used like a list. Membership is the `kind`
+    column of the current registry"""
+
+    def __init__(self, kind: int) -> None:
+        self.kind = kind
+
+    def get_indices(self) -> np.ndarray:
+        return registry.select(kind=self.kind)
+
+    def append(self, entity: Entity) -> None:
+        registry.kind[entity.index] = self.kind
+
+    def remove(self, entity: Entity) -> None:
+        """Take an entity out of the group and of the registry"""
+        registry.kind[entity.index] = 0
+        registry.destroy(entity.id)
+
+    def clear(self) -> None:
+        for entity in list(self):
+            self.remove(entity)
+
+    def __iter__(self):
+        objects = registry.objects
+        return (objects[index] for index in self.get_indices().tolist())
 
+    def __len__(self) -> int:
+        return int(np.count_nonzero(registry.kind[:registry.used] == self.kind))
 
-idles: list[Entity] = list()
+    def __getitem__(self, item: int) -> Entity:
+        return registry.objects[self.get_indices()[item]]
+
+
+def despawn() -> None:
+    """Remove dead entities of all groups, at the end of a tick"""
+    used = registry.used
+    for index in np.flatnonzero((registry.kind[:used] != 0)
+                                & ~registry.alive[:used]).tolist():
+        registry.kind[index] = 0
+        registry.destroy(registry.get_id(index))
+
+
+IDLE, MOVABLE, CHARACTER, FIGHTER = range(1, 5)
+idles = Group(IDLE)
 
 
 class Sprite(Entity):
+    current_cycle = Column("cycle", int)
+    cycles = Column("cycles", int)
+
     def __init__(
         self,
         coords: tuple[int, int],
@@ -118,19 +262,21 @@ class Sprite(Entity):
                          sprite_sheet_rows=sprite_sheet_rows,
                          sprite_frame_delay=sprite_frame_delay,
                          sprite_color_key=sprite_color_key)
+        # Sprites die after playing all cycles, see `systems.animate`
         self.cycles = cycles
         self.current_cycle = 0
 
-    def update(self, dt: int, surface: pygame.Surface) -> None:
-        super().update(dt, surface)
-        if self.current_row == 0 and self.current_col == 0 and\
-                self.time_passed_since_frame == 0:
-            self.current_cycle += 1
-        if self.current_cycle == self.cycles:
-            self._die()
-
 
 class Movable(Entity):
+    _speed_x = Column("speed_x")
+    _speed_y = Column("speed_y")
+    _max_speed = Column("max_speed")
+    _acceleration = Column("acceleration")
+    _weight = Column("weight")
+    _on_ground = Column("on_ground", bool)
+    collided_x = Column("collided_x", as_collision)
+    collided_y = Column("collided_y", as_collision)
+
     def __init__(
         self,
         coords: tuple,
@@ -145,16 +291,16 @@ class Movable(Entity):
 
         super().__init__(coords=coords, max_health=max_health,
                          sprite_path=sprite_path, size=size, rotation=rotation)
+        registry.components[self.index] |= VELOCITY
 
         self._max_speed = max_speed
         self._speed_x, self._speed_y = 0, 0
         self._acceleration = acceleration
         self._weight = weight
 
-        self._on_ground: bool = False
-        self.collided_x: tuple[int, int, str] = [self.x, self.y, "0"]
-        self.collided_y: tuple[int, int, str] = [self.x, self.y, "0"]
-        self.triggered: tuple[int, int, str] = [self.x, self.y, "0"]
+        self._on_ground = False
+        self.collided_x = (self.x, self.y, 0)
+        self.collided_y = (self.x, self.y, 0)
 
     def move_right(self, dt: float) -> None:
         dt_acceleration = self._acceleration * dt
@@ -168,110 +314,21 @@ class Movable(Entity):
 
     def update(
         self,
-        map_terrain: list[list[str]],
-        map_triggers: list[list[str]],
+        map_terrain: TileGrid,
         surface: pygame.Surface,
         dt: int
     ) -> None:
         """Update a character"""
         super().update(dt=dt, surface=surface)
+        systems.move(registry, self.get_indices(), map_terrain, dt)
 
-        self._speed_x *= FRICTION[self.collided_y[2]]
-
-        dt_speed_x = self._speed_x * dt
-        dt_speed_y = self._speed_y * dt
-
-        # X collision
-        area = calc_area_x(
-            self.x, self.y, dt_speed_x, self._width, self._height)
-        self.collided_x = check_collision_x(area, map_terrain)
-        if self.collided_x[2] != "0":
-            if area[1] == 1:
-                self.x = self.collided_x[0] - self._width
-            else:
-                self.x = self.collided_x[0] + TILESIZE
-            self._speed_x = 0
-            triggered_x = (self.x, self.y, "0")
-        else:
-            self.x += dt_speed_x
-            triggered_x = check_collision_x(area, map_triggers)
-
-        # Y collision
-        area = calc_area_y(
-            self.x, self.y, dt_speed_y, self._width, self._height)
-        self.collided_y = check_collision_y(area, map_terrain)
-        if self.collided_y[2] != "0":
-            if area[1] == 1:
-                self.y = self.collided_y[1] - self._height
-                self._on_ground = True
-            else:
-                self.y = self.collided_y[1] + TILESIZE
-            self._speed_y = 0
-            triggered_y = (self.x, self.y, "0")
-        else:
-            self.y += dt_speed_y
-            self._on_ground = False
-            triggered_y = check_collision_y(area, map_triggers)
-            self._speed_y += apply_gravity(self._weight) * dt
-
-        self.eyes = self.x + self.center[0], self.y + self.center[1]
 
-        self.triggered = triggered_x if triggered_x[2] != "0" else triggered_y
-
-
-movables: list[Movable] = list()
-
-
-class Bullet(Movable):
-    def __init__(
-        self,
-        coords: tuple[int, int],
-        speed: float,
-        weight: float,
-        angle: float,
-        sprite_path: str = None,
-        size: tuple = None
-    ) -> None:
-        super().__init__(coords=coords, max_health=1, max_speed=speed,
-                         acceleration=0, weight=weight, sprite_path=sprite_path,
-                         size=size, rotation=angle)
-        self.sheet = pygame.transform.rotate(self.sheet, -degrees(self.rotation))
-        self._speed_x, self._speed_y = cos(angle) * speed, sin(angle) * speed
-        self.__damage = maths.calculate_damage(speed, self._height)
-
-    def _die(self) -> None:
-        super()._die()
-        idles.append(Sprite(coords=(self.x, self.y),
-                            sprite_path="other/spark.png", size=(20, 20),
-                            rotation=self.rotation,
-                            sprite_sheet_cols=6, sprite_sheet_rows=1,
-                            sprite_frame_delay=30, cycles=1))
-        bullets.remove(self)
-
-    def update(
-        self,
-        map_terrain: list[list[str]], map_triggers: list[list[str]],
-        surface: pygame.Surface,
-        dt: int,
-        entities: set[Entity]
-    ) -> None:
-        super().update(map_terrain=map_terrain, map_triggers=map_triggers,
-                       surface=surface, dt=dt)
-        for entity in entities:
-            if entity_collision(self.x, self.y, self._width, self._height,
-                                        entity.x, entity.y,
-                                        *entity.get_size()):
-                entity.take_damage(self.__damage)
-                bullets.remove(self)
-                return
-        if self.collided_x[2] != "0" or self.collided_y[2] != "0":
-            self._die()
-
-
-bullets: list[Bullet] = list()
+movables = Group(MOVABLE)
 
 
 class Character(Movable):
+    _jump_strength = Column("jump_strength")
+
     def __init__(
         self,
         coords: tuple,
@@ -302,19 +359,23 @@ class Character(Movable):
 
     def update(
         self,
-        map_terrain: list[list[str]],
-        map_triggers: list[list[str]],
+        map_terrain: TileGrid,
         surface: pygame.Surface,
         dt: int
     ) -> None:
-        super().update(map_terrain=map_terrain, map_triggers=map_triggers,
-                       surface=surface, dt=dt)
+        super().update(map_terrain=map_terrain, surface=surface, dt=dt)
 
 
-characters: list[Character] = list()
+characters = Group(CHARACTER)
 
 
 class Fighter(Character):
+    _vision_range = Column("vision_range")
+    _attack_range = Column("attack_range")
+    _attack_delay = Column("attack_delay")
+    _attack_damage = Column("attack_damage", int)
+    _time_passed_since_attack = Column("attack_time")
+
     def __init__(
         self,
         coords: tuple,
@@ -336,6 +397,7 @@ class Fighter(Character):
                          acceleration=acceleration, weight=weight,
                          jump_strength=jump_strength, sprite_path=sprite_path,
                          size=size)
+        registry.components[self.index] |= AI
 
         self._vision_range = vision_range
         self._attack_range = attack_range
@@ -344,21 +406,9 @@ class Fighter(Character):
 
         self._time_passed_since_attack = 0
 
-    def interact(self, enemies: list[Entity], dt: int) -> None:
+    def interact(self, enemies: SpatialHash, dt: int) -> None:
         """Interaction with enemies"""
-        for enemy in enemies:
-            distance = maths.calculate_distance(
-                (self.x, self.y), (enemy.x, enemy.y))
-
-            if self._attack_range < distance < self._vision_range:
-                if self.eyes[0] > enemy.eyes[0]:
-                    self.move_left(dt)
-                else:
-                    self.move_right(dt)
-                if self.collided_x[2] != "0":
-                    self.jump()
-            elif distance <= self._attack_range:
-                self.attack(enemy)
+        systems.interact(registry, self.get_indices(), enemies, dt)
 
     def attack(self, enemy: Entity) -> None:
         if self._time_passed_since_attack >= self._attack_delay:
@@ -367,19 +417,16 @@ class Fighter(Character):
 
     def update(
         self,
-        map_terrain: list[list[str]],
-        map_triggers: list[list[str]],
-        enemies: set[Entity],
+        map_terrain: TileGrid,
+        enemies: SpatialHash,
         surface: pygame.Surface,
         dt: int
     ) -> None:
-        super().update(map_terrain=map_terrain, map_triggers=map_triggers,
-                       surface=surface, dt=dt)
-        self.interact(enemies, dt)
-        self._time_passed_since_attack += dt
+        super().update(map_terrain=map_terrain, surface=surface, dt=dt)
+        systems.think(registry, self.get_indices(), enemies, dt)
 
 
-fighters: list[Fighter] = list()
+fighters = Group(FIGHTER)
 
 
 class Player(Character):
@@ -413,19 +460,37 @@ class Player(Character):
         if self.__slots[slot] != 0:
             self.__selected_slot = slot
 
+    def get_state(self) -> list[float]:
+        """Selected slot and cooldowns of tools, NaN for empty slots"""
+        return [self.__selected_slot] + [
+            float("nan") if tool == 0 else tool.get_state() for tool in self.__slots]
+
+    def set_state(self, state: list[float]) -> None:
+        self.__selected_slot = int(state[0])
+        for tool, tool_state in zip(self.__slots, state[1:]):
+            if tool != 0:
+                tool.set_state(tool_state)
+
+    @profiler.profile("Player.update")
     def update(
         self,
-        map_terrain: list[list[str]],
-        map_triggers: list[list[str]],
+        map_terrain: TileGrid,
         surface: pygame.Surface,
         dt: int
     ) -> None:
-        super().update(map_terrain=map_terrain, map_triggers=map_triggers,
-                       surface=surface, dt=dt)
+        super().update(map_terrain=map_terrain, surface=surface, dt=dt)
         for tool in self.__slots:
             if tool != 0:
                 tool.update(self.x, self.y, dt, surface)
 
+    def draw(self, surface: pygame.Surface, alpha: float = 1) -> None:
+        super().draw(surface, alpha)
+        x = registry.prev_x[self.index] + (self.x - registry.prev_x[self.index]) * alpha
+        y = registry.prev_y[self.index] + (self.y - registry.prev_y[self.index]) * alpha
+        for tool in self.__slots:
+            if tool != 0:
+                tool.draw(float(x), float(y), surface)
+
 
 # TEST ENTITIES
 
@@ -1,9 +1,18 @@
 import pygame
+import numpy as np
 from json import load as json_load
+from zlib import crc32
 from modules import entities, level
 from modules.interface import \
-    Button, SwitchButton, Label, Menu, MiniMap, Slider, make_button_table
+    Button, SwitchButton, Label, Menu, Slider, make_button_table
+from modules.loader import LevelLoader
 from modules.parameters.colors import *
+from modules.profiler import profiler
+from modules.replay import Recorder
+from modules.session import Session, control
+from modules.snapshot import Snapshot, capture, restore
+from modules.render import dirty_rects
+from modules.timestep import FixedTimestep
 from modules.parameters.options import \
     fps, images_path, level_when_game_started, music_path, save_changes, \
         screen_center, screen_res, sensitivity, volume
@@ -14,12 +23,22 @@ pygame.mixer.init()
 game_status: int
 current_menu: Menu
 current_map: level.Level
+# Session of the player, `current_map` is its world while in game
+session: Session = None
+player: entities.Player = None
+# The world is simulated in fixed ticks, independently of the frame rate
+timestep = FixedTimestep()
+# Neighbours of the current level are loaded in the background
+loader = LevelLoader()
+# Input of frames since the level was started
+recorder: Recorder = None
+quicksave_snapshot: Snapshot = None
 
 
 # Menu
 
 def goto_menu(menu_name: str="main", level_name: str = None) -> None:
-    global game_status, current_map, current_menu, player, mini_map
+    global game_status, current_map, current_menu, player
     if menu_name == "main":
 
         # sound_menu = pygame.mixer.Sound(music_path+"main_menu.wav")
@@ -27,22 +46,25 @@ def goto_menu(menu_name: str="main", level_name: str = None) -> None:
         # sound_menu.play()
 
         current_map = None
+        loader.prefetch()
         game_status = 0
         pygame.mouse.set_visible(1)
 
     elif menu_name == "in_game":
-        current_map = level.World(level_name)
-        mini_map = MiniMap(current_map.matrix_terrain, (85, 0), 15, 150)
+        start_level(level_name)
         current_menu = menus["in_game"]
-        player = entities.Player(coords=current_map.spawn, max_health=100,
-                                 max_speed=0.7, acceleration=0.01, weight=1,
-                                 jump_strength=1.5)
         game_status = 1
     elif menu_name == "editing":
         current_map = level.EditLevel(level_name)
         game_status = 2
 
     current_menu = menus[menu_name]
+    # The new screen is drawn in full, widgets over the editor are redrawn
+    # whenever the level under them is
+    overlays = current_menu.get_rects()
+    if game_status == 2:
+        overlays.append(current_map.mini_map.rect)
+    dirty_rects.set_overlays(overlays)
 
 
 # Editing
@@ -63,11 +85,14 @@ def editing_change_brush_mode():
 
 # Other
 
-def change_level(level_name: str) -> None:
-    global current_map, mini_map
-    current_map = level.World(level_name)
-    mini_map = MiniMap(current_map.matrix_terrain, (85, 0), 15, 150)
-    player.x, player.y = current_map.spawn
+def start_level(level_name: str) -> None:
+    """Start a new session in the level with a player on its spawn"""
+    global session, current_map, player, recorder
+    session = Session(level_name, loader)
+    current_map = session.world
+    player = session.add_player()
+    timestep.reset()
+    recorder = Recorder(level_name, get_checksum)
 
 
 def apply_changes() -> None:
@@ -77,50 +102,105 @@ def apply_changes() -> None:
                 volume=volume, sensitivity=sensitivity)
 
 
+def quicksave() -> None:
+    global quicksave_snapshot
+    quicksave_snapshot = capture(current_map, player)
+
+
+def load_snapshot(snapshot: Snapshot) -> None:
+    """Go back to a snapshot, its level is entered if it was left"""
+    global current_map
+    level_path = snapshot.get_text("level")
+    session.state.activate()
+    if session.world.path != level_path:
+        session.enter_level(level_path.removeprefix("maps/"))
+    session.pending_level = None
+    current_map = session.world
+    restore(snapshot, current_map, player)
+    timestep.reset()
+
+
+def quickload() -> None:
+    """Go back to the quicksave. Recording starts over from it, a replay
+    can't go through the jump back"""
+    global recorder
+    if quicksave_snapshot is None:
+        return
+    load_snapshot(quicksave_snapshot)
+    recorder = Recorder(current_map.path.removeprefix("maps/"), get_checksum,
+                        snapshot=quicksave_snapshot.to_bytes())
+
+
+def get_checksum() -> int:
+    """CRC of the simulated state: the level, the player, entities and
+    bullets. Entities are sorted, so slots they took don't matter"""
+
+    registry = session.state.registry
+    state = [current_map.path.encode("utf-8"),
+             np.array([player.x, player.y, registry.speed_x[player.index],
+                       registry.speed_y[player.index], player.get_health(),
+                       timestep.accumulator])]
+    for group in (entities.idles, entities.movables, entities.characters,
+                  entities.fighters):
+        indices = group.get_indices()
+        columns = np.stack((registry.x[indices], registry.y[indices],
+                            registry.speed_x[indices], registry.speed_y[indices],
+                            registry.health[indices]))
+        state.append(columns[:, np.lexsort(columns[::-1])])
+    bullets = session.state.bullets
+    state.append(np.stack([array[:bullets.count] for array in (
+        bullets.x, bullets.y, bullets.speed_x, bullets.speed_y)]))
+    checksum = 0
+    for part in state:
+        checksum = crc32(part if isinstance(part, bytes) else part.tobytes(), checksum)
+    return checksum
+
+
 def exit_game() -> None:
     apply_changes()
+    loader.shutdown()
     quit()
 
 
+def simulate(surface: pygame.Surface, keyboard_keys: set, mouse_buttons: set,
+             mouse_pos: tuple, dt: float) -> None:
+    """World tick: entities, player input and triggers.\n
+    Nothing is drawn when `surface` is None"""
+
+    global current_map
+    session.begin_tick(surface, dt)
+    current_map = session.world
+    control(player, keyboard_keys, mouse_buttons,
+            current_map.camera.to_world(mouse_pos), dt)
+    session.end_tick(dt)
+
+
+def advance(keyboard_keys: set, mouse_buttons: set, mouse_pos: tuple,
+            dt: float) -> None:
+    """Simulate as many fixed ticks as fit in `dt`"""
+
+    for _ in range(timestep.advance(dt)):
+        simulate(None, keyboard_keys, mouse_buttons, mouse_pos, timestep.step)
+
+
+@profiler.profile("game.update")
 def update(surface: pygame.Surface, keyboard_keys: set, pressed_keys: set,
            released_keys: set, mouse_buttons: set, pressed_buttons: set,
            released_buttons: set, mouse_pos: tuple,
            clock: pygame.time.Clock, dt: float) -> None:
-    """Game tick"""
+    """Game frame. In game the world is simulated in as many fixed ticks as
+    fit in `dt` and drawn between the last two of them. Elsewhere only dirty
+    areas of the screen are redrawn"""
 
+    current_menu.collect_changes()
     if game_status == 1:
+        dirty_rects.add_all()
         # surface.fill(BLACK)
-        current_map.update(surface, dt, player)
-
-        if pygame.K_w in keyboard_keys:
-            player.jump()
-        if pygame.K_a in keyboard_keys:
-            player.move_left(dt)
-        if pygame.K_d in keyboard_keys:
-            player.move_right(dt)
-        if pygame.K_1 in keyboard_keys:
-            player.change_slot(0)
-        if pygame.K_2 in keyboard_keys:
-            player.change_slot(1)
-        if pygame.K_3 in keyboard_keys:
-            player.change_slot(2)
-        if pygame.K_4 in keyboard_keys:
-            player.change_slot(3)
-        if pygame.K_5 in keyboard_keys:
-            player.change_slot(4)
-
-        if pygame.BUTTON_LEFT in mouse_buttons:
-            player.attack(mouse_pos)
-
-        player.update(current_map.matrix_terrain,
-                      current_map.matrix_triggers, surface, dt)
-        match player.triggered[2]:
-            case "0":
-                pass
-            case "CL":
-                change_level(current_map.info["next"])
+        advance(keyboard_keys, mouse_buttons, mouse_pos, dt)
+        recorder.record(keyboard_keys, mouse_buttons, mouse_pos, dt)
+        current_map.draw(surface, player, timestep.alpha)
 
-        mini_map.draw(surface)
+        current_map.mini_map.draw(surface)
         current_menu.labels["fps"].change_text(f"FPS: {round(clock.get_fps())}")
         current_menu.labels["health"].change_text(f"{player.get_health()}+")
 
@@ -1,7 +1,11 @@
 import pygame
 from modules.parameters.colors import *
-from modules.parameters.options import (TILESIZE, images_path, screen_res,
-                                           fonts_path)
+from modules.parameters.options import TILESIZE, screen_res
+from modules.assets import fonts, images
+from modules.atlas import atlas
+from modules.profiler import profiler
+from modules.render import DirtyRects, dirty_rects
+from modules.tiles import TileGrid
 
 pygame.font.init()
 
@@ -42,8 +46,10 @@ class Label:
 
         # Text
         if font is None: font = font_default
-        self.font = pygame.font.Font(fonts_path+font[0], font[1])
-        self.text = self.font.render(text, False, self.text_color)
+        self.font_key = tuple(font)
+        self.font = fonts.get(*self.font_key)
+        self.current_text = text, self.text_color
+        self.text = fonts.render(self.font_key, text, False, self.text_color)
         self.text_pos = (
             self.rect.w // 2 - self.text.get_rect().w // 2,
             self.rect.h // 2 - self.text.get_rect().h // 2)
@@ -55,15 +61,21 @@ class Label:
         self.surface_default.set_alpha(self.alpha)
         self.surface_default.set_colorkey(TRANSPARENT)
         self.surface = self.surface_default
+        self.changed = True  # Has to be drawn again
 
     def change_text(self, text: str, color: tuple = None) -> None:
-        self.text = self.font.render(
-            text, False, color if color else self.text_color)
+        """Render a new text, nothing is done if it hasn't changed"""
+        color = color if color else self.text_color
+        if (text, color) == self.current_text:
+            return
+        self.current_text = text, color
+        self.text = fonts.render(self.font_key, text, False, color)
         self.text_pos = (
             self.rect.w // 2 - self.text.get_rect().w // 2,
             self.rect.h // 2 - self.text.get_rect().h // 2)
         self.surface_default.fill(self.color)
         self.surface_default.blit(self.text, self.text_pos)
+        self.changed = True
 
     def change_background(self, color: tuple) -> None:
         """Change the label background color"""
@@ -74,6 +86,7 @@ class Label:
         self.surface_default.blit(self.text, self.text_pos)
         self.surface_default.set_alpha(self.alpha)
         self.surface = self.surface_default
+        self.changed = True
 
     def draw(self, surface: pygame.Surface) -> None:
         surface.blit(self.surface, self.rect)
@@ -110,6 +123,7 @@ class Button(Label):
         self.pressed = True
 
         self.surface = self.surface_pressed
+        self.changed = True
 
     def on_release(self, doFunc: bool):
         self.pressed = False
@@ -117,6 +131,7 @@ class Button(Label):
             self.func(*self.args)
 
         self.surface = self.surface_default
+        self.changed = True
 
 
 def make_button_table(
@@ -172,8 +187,8 @@ class SwitchButton(Button):
         self.alpha2 = color2[3] if len(color2) == 4 else self.alpha
 
         # Text
-        self.text2 = self.font.render(
-            text2 if text2 else text, True,
+        self.text2 = fonts.render(
+            self.font_key, text2 if text2 else text, True,
             text2_color if text2_color else text_color)
         self.text2_pos: tuple = (
             self.rect.w // 2 - self.text2.get_rect().w // 2,
@@ -199,6 +214,7 @@ class SwitchButton(Button):
             self.surface = self.surface_pressed_activated
         else:
             self.surface = self.surface_pressed
+        self.changed = True
 
     def on_release(self, doFunc: bool) -> None:
         self.pressed = False
@@ -210,6 +226,7 @@ class SwitchButton(Button):
             self.surface = self.surface_activated
         else:
             self.surface = self.surface_default
+        self.changed = True
 
 
 class Slider(Button):
@@ -326,32 +343,39 @@ class Table:
 
 
 class MiniMap:
-    def __init__(self, level_matrix: list[list[str]], coords: tuple[int, int],
-                 size: int, transparency: int) -> None:
+    """Top view of a level. A streamed map is not drawn at once, chunks are
+    drawn by `redraw` as they are streamed in"""
+
+    def __init__(self, level_matrix: TileGrid, coords: tuple[int, int],
+                 size: int, transparency: int, streamed: bool = False) -> None:
+        self.streamed = streamed
         self.coords = (screen_res[0] * coords[0] / 100,
                        screen_res[1] * coords[1] / 100)
         self.rect = pygame.Rect(0, 0, size, size)
         self.rect.center = self.coords
+        # Tiles are drawn at their scaled size, which can be fractional
+        self.tile_size = TILESIZE * size / 100
         self.surface = self.create_surface(level_matrix)
-        self.surface = pygame.transform.scale(
-            self.surface,
-            (self.surface.get_width() * size // 100,
-             self.surface.get_height() * size // 100))
         self.surface.set_alpha(transparency)
-
-    def create_surface(self, matrix: list[list[str]]) -> pygame.Surface:
-        """Create a top view map of a level"""
-        surface = pygame.Surface(
-            (len(matrix[0]) * TILESIZE, len(matrix) * TILESIZE))
-        for row_index, row in enumerate(matrix):
-            for col_index, tile in enumerate(row):
-                if tile == "0":
-                    continue
-                coords = col_index * TILESIZE, row_index * TILESIZE
-                pygame.draw.rect(surface, COLORS_SHORT[tile],
-                                 (*coords, TILESIZE, TILESIZE))
+        # Covers what is drawn, the map is larger than `size`
+        self.rect.size = self.surface.get_size()
+        self.changed = True
+
+    def create_surface(self, matrix: TileGrid) -> pygame.Surface:
+        """Create a top view map of a level, empty if it is streamed"""
+        surface = pygame.Surface((int(matrix.width * self.tile_size),
+                                  int(matrix.height * self.tile_size)))
+        if not self.streamed:
+            atlas.draw(surface, matrix, (0, 0, matrix.width, matrix.height),
+                       tile_size=self.tile_size)
         return surface
 
+    def redraw(self, matrix: TileGrid, area: tuple[int, int, int, int]) -> None:
+        """Redraw changed tiles of the area `(left, top, right, bottom)`"""
+        atlas.draw(self.surface, matrix, area, tile_size=self.tile_size)
+        self.changed = True
+
+    @profiler.profile("MiniMap.draw")
     def draw(self, surface: pygame.Surface) -> None:
         surface.blit(self.surface, self.rect)
 
@@ -370,13 +394,16 @@ class Menu:
         self.surface = pygame.Surface(screen_res)
         self.surface.set_colorkey(TRANSPARENT)
         self.surface.fill(TRANSPARENT)
+        # Without a background the menu is drawn over the world or the editor
+        self.background = bool(background_path)
         if background_path:
-            self.surface.blit(
-                pygame.transform.scale(
-                    pygame.image.load(
-                        images_path + background_path).convert_alpha(),
-                    screen_res),
-                (0, 0))
+            self.surface.blit(images.load(background_path, screen_res), (0, 0))
+
+    def get_widgets(self) -> list[Label]:
+        return [*self.labels.values(), *self.buttons]
+
+    def get_rects(self) -> list[pygame.Rect]:
+        return [widget.rect for widget in self.get_widgets()]
 
     def press_button(self, mouse_pos: tuple) -> None:
         for button in self.buttons:
@@ -392,10 +419,24 @@ class Menu:
                 return True
         return False
 
-    def update(self, surface: pygame.Surface) -> None:
-        surface.blit(self.surface, (0, 0))
+    def collect_changes(self, dirty: DirtyRects = dirty_rects) -> None:
+        """Mark rects of changed labels and buttons as dirty. Called before
+        anything is drawn in a frame, so what is under them is redrawn too"""
 
-        for label in self.labels.values():
-            label.draw(surface)
-        for button in self.buttons:
-            button.draw(surface)
+        for widget in self.get_widgets():
+            if widget.changed:
+                dirty.add(widget.rect)
+                widget.changed = False
+
+    @profiler.profile("Menu.update")
+    def update(self, surface: pygame.Surface,
+               dirty: DirtyRects = dirty_rects) -> None:
+        """Redraw the background, labels and buttons in dirty areas only"""
+
+        if self.background:
+            for rect in dirty.get_rects():
+                surface.blit(self.surface, rect, rect)
+
+        for widget in self.get_widgets():
+            if dirty.collides(widget.rect):
+                widget.draw(surface)
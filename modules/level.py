@@ -1,8 +1,22 @@
+import os
 import pygame
+import numpy as np
 from json import load as load_json
-from modules.parameters.options import TILESIZE, screen_res
+from modules.parameters.options import \
+    CHUNK_SIZE, STREAMING_THRESHOLD, TILESIZE, screen_res
 from modules.parameters.colors import COLORS_SHORT
-from modules import entities
+from modules import entities, systems
+from modules.atlas import atlas
+from modules.camera import Camera
+from modules.chunks import ChunkedGrid, TextMapSource
+from modules.interface import MiniMap
+from modules.mapfile import MapFile, is_compiled
+from modules.physics import SpatialHash
+from modules.profiler import profiler
+from modules.render import TERRAIN, DirtyRects, dirty_rects
+from modules.state import State
+from modules.tiles import EMPTY, TileGrid
+from modules.triggers import Triggers
 
 
 class Level:
@@ -11,113 +25,277 @@ class Level:
     def __init__(self, name: str) -> None:
         """Load level"""
         self.path = "maps/" + name
+        # Compiled levels are mapped instead of being parsed
+        self.compiled = MapFile(self.path + "/level.bin")\
+            if is_compiled(self.path) else None
         # Load matrices
         self.matrix_terrain = self.load_matrix("terrain")
         self.matrix_entities = self.load_matrix("entities")
         self.matrix_triggers = self.load_matrix("triggers")
-        # Create surfaces
-        self.surface = pygame.Surface((len(self.matrix_terrain[0]) * TILESIZE,
-                                       len(self.matrix_terrain) * TILESIZE))
-        self.surface_terrain = self.create_surface(self.matrix_terrain)
 
-    def load_matrix(self, name: str) -> list[list[str]]:
-        """Create a matrix of a layer"""
+    def load_matrix(self, name: str) -> TileGrid:
+        """Create a matrix of a layer.\n
+        Big layers are streamed by chunks instead of being read in full"""
 
-        with open(self.path+"/"+name+".map", "r", encoding="utf-8") as f:
-            return [row.split() for row in f.read().split("\n")]
+        if self.compiled is not None:
+            return self.compiled.load_layer(name)
+        path = self.path+"/"+name+".map"
+        if os.path.getsize(path) > STREAMING_THRESHOLD:
+            return ChunkedGrid(TextMapSource(path))
+        with open(path, "r", encoding="utf-8") as f:
+            return TileGrid.from_rows(
+                [row.split() for row in f.read().split("\n")])
 
-    def create_surface(self, matrix: list[list[str]],
+    def create_surface(self, matrix: TileGrid,
                        transparency: int = 100) -> pygame.Surface:
         """Create a surface of a layer"""
 
         surface = pygame.Surface(screen_res)
         surface.set_alpha(transparency)
-        for row_index, row in enumerate(matrix):
-            for col_index, tile in enumerate(row):
-                if tile == "0":
-                    continue
-                x, y = col_index * TILESIZE, row_index * TILESIZE
-                pygame.draw.rect(surface, COLORS_SHORT[tile], (x, y, TILESIZE, TILESIZE))
+        self.draw_tiles(surface, matrix,
+                        (0, 0, -(-screen_res[0] // TILESIZE),
+                         -(-screen_res[1] // TILESIZE)), (0, 0))
         return surface
 
-    def update(self) -> None:
-        self.surface.blit(self.surface_terrain, (0, 0))
+    def draw_tiles(self, surface: pygame.Surface, matrix: TileGrid,
+                   area: tuple[int, int, int, int],
+                   origin: tuple[int, int]) -> None:
+        """Redraw tiles of the area `(left, top, right, bottom)` on a surface
+        which top left corner is the `origin` tile"""
+
+        atlas.draw(surface, matrix, area, origin)
 
 
 class World(Level):
+    """Level which is played.\n
+    Loading touches no shared state, so worlds can be loaded on a worker
+    thread ahead of time. Entities, bullets and particles are in a state of
+    the session, `start` puts the world in it on the main thread"""
+
     def __init__(self, name) -> None:
         super().__init__(name)
         self.spawn = (0, 0)
+        # Set player spawn
+        spawn = self.matrix_entities.find("SP")
+        if spawn is not None:
+            self.spawn = spawn[0] * TILESIZE, spawn[1] * TILESIZE
         # Info about this level (previous and next levels, etc)
         self.info = load_json(open(self.path + "/info.json"))
         # Other
-        self.entities = self.spawnEntities(self.matrix_entities)
+        self.entities = entities
+        self.spawned_chunks = set()
+        self.state: State = None
+        # Broadphase grids, rebuilt every tick
+        self.targets = SpatialHash()
+        self.enemies = SpatialHash()
+        # Regions of the trigger layer, callbacks are added by the game.
+        # Chunks of a streamed layer are compiled as they are streamed in
+        self.triggers = Triggers(self.matrix_triggers,
+                                 isinstance(self.matrix_triggers, ChunkedGrid))
+        # View
+        self.camera = Camera((self.matrix_terrain.width * TILESIZE,
+                              self.matrix_terrain.height * TILESIZE))
+        left, top, right, bottom = self.camera.get_tiles_area()
+        self.surface_terrain = pygame.Surface(
+            ((right - left) * TILESIZE, (bottom - top) * TILESIZE))
+        self.terrain_area = None
+        # Parsing all chunks of a streamed map would defeat streaming, they
+        # are drawn on the minimap when their entities are spawned
+        self.mini_map = MiniMap(self.matrix_terrain, (85, 0), 15, 150,
+                                isinstance(self.matrix_terrain, ChunkedGrid))
+        # The first view is baked around the spawn
+        self.camera.look_at(self.spawn[0] + TILESIZE / 2, self.spawn[1] + TILESIZE / 2)
+        self.bake_terrain()
 
-    def spawnEntities(self, matrix: list):
-        """Create an object of all entities in level"""
+    def start(self, state: State) -> None:
+        """Make it the world of a state and the state current, on the main
+        thread"""
+
+        self.state = state
+        state.activate()
+        self.spawnEntities(self.matrix_entities)
+
+    def spawnEntities(self, matrix: TileGrid) -> None:
+        """Empty groups of the previous world of the state, players stay.\n
+        Entities are spawned by chunks when the camera comes close to them"""
 
         entities.idles.clear()
         entities.movables.clear()
-        entities.bullets.clear()
         entities.characters.clear()
         entities.fighters.clear()
-        for row_index, row in enumerate(matrix):
-            for col_index, tile in enumerate(row):
-                if tile == "0":
+        self.state.bullets.clear()
+        self.state.particles.clear()
+        self.spawned_chunks = set()
+
+    def stream_entities(self, areas: list = None) -> None:
+        """Spawn entities of chunks in view and next to it. Other tile
+        areas can be given instead of the view"""
+
+        for area in areas or (self.camera.get_tiles_area(),):
+            self.stream_area(*area)
+
+    def stream_area(self, left: int, top: int, right: int, bottom: int) -> None:
+        for chunk_row in range(top // CHUNK_SIZE - 1,
+                               (bottom - 1) // CHUNK_SIZE + 2):
+            for chunk_col in range(left // CHUNK_SIZE - 1,
+                                   (right - 1) // CHUNK_SIZE + 2):
+                if (chunk_col, chunk_row) in self.spawned_chunks:
+                    continue
+                self.spawned_chunks.add((chunk_col, chunk_row))
+                area = (chunk_col * CHUNK_SIZE, chunk_row * CHUNK_SIZE,
+                        (chunk_col + 1) * CHUNK_SIZE, (chunk_row + 1) * CHUNK_SIZE)
+                if self.mini_map.streamed:
+                    self.mini_map.redraw(self.matrix_terrain, area)
+                self.triggers.load_chunk(chunk_col, chunk_row)
+                for col_index, row_index, tile in self.matrix_entities.items(*area):
+                    coords = col_index * TILESIZE, row_index * TILESIZE
+                    match tile:
+                        # Spawn different
+                        case "TM":
+                            entities.movables.append(entities.TestMovable(coords))
+                        # Spawn fighters
+                        case "TF":
+                            entities.fighters.append(entities.TestFighter(coords))
+
+    def draw_terrain(self) -> None:
+        """Draw visible terrain"""
+
+        if self.camera.surface is None:
+            return
+        self.bake_terrain()
+        area = self.terrain_area
+        self.camera.blit(self.surface_terrain,
+                         (area[0] * TILESIZE, area[1] * TILESIZE), layer=TERRAIN)
+
+    def bake_terrain(self) -> None:
+        """Update the cached view of terrain. When the camera moves, it is
+        scrolled and only tiles which came into view are drawn"""
+
+        area = self.camera.get_tiles_area()
+        if area != self.terrain_area:
+            left, top, right, bottom = area
+            if self.terrain_area is None:
+                exposed = (area,)
+            else:
+                old_left, old_top, old_right, old_bottom = self.terrain_area
+                self.surface_terrain.scroll((old_left - left) * TILESIZE,
+                                            (old_top - top) * TILESIZE)
+                exposed = (
+                    (left, top, min(old_left, right), bottom),
+                    (max(old_right, left), top, right, bottom),
+                    (left, top, right, min(old_top, bottom)),
+                    (left, max(old_bottom, top), right, bottom))
+            for exposed_area in exposed:
+                if exposed_area[0] >= exposed_area[2]\
+                        or exposed_area[1] >= exposed_area[3]:
                     continue
-                coords = col_index * TILESIZE, row_index * TILESIZE
-                match tile:
-                    # Set player spawn
-                    case "SP":
-                        self.spawn = coords
-                    # Spawn different
-                    case "TM":
-                        entities.movables.append(entities.TestMovable(coords))
-                    # Spawn fighters
-                    case "TF":
-                        entities.fighters.append(entities.TestFighter(coords))
-        return entities
-
-    def update(self, surface: pygame.Surface, dt: int, player) -> None:
-        super().update()
+                self.draw_tiles(self.surface_terrain, self.matrix_terrain,
+                                exposed_area, (left, top))
+            self.terrain_area = area
+
+    def update(self, surface: pygame.Surface, dt: int, player,
+               players: tuple = ()) -> None:
+        """Tick of the world. Entities are queued for drawing as they are
+        updated unless `surface` is None, then `draw` renders the world
+        afterwards. The queue is drawn by `camera.render`.\n
+        The camera follows `player`, entities are streamed around other
+        `players` too and fighters chase all of them"""
+
+        self.camera.surface = surface
+        self.camera.follow(player)
+        registry = self.state.registry
+        registry.store_positions()
+        with profiler.zone("World.streaming"):
+            self.stream_entities([self.camera.get_tiles_area()] + [
+                self.camera.get_tiles_area(self.camera.get_position(*other.eyes))
+                for other in players])
+        with profiler.zone("World.terrain"):
+            self.draw_terrain()
+        # Every group is updated in batches by systems
+        with profiler.zone("World.broadphase"):
+            indices = np.concatenate([
+                group.get_indices() for group in (
+                    self.entities.idles, self.entities.movables,
+                    self.entities.characters, self.entities.fighters)])
+            self.targets.clear()
+            self.targets.insert_many(
+                [registry.objects[index] for index in indices.tolist()],
+                registry.x[indices], registry.y[indices],
+                registry.width[indices], registry.height[indices])
+            self.enemies.rebuild((player, *players))
         # Bullets
-        for bullet in self.entities.bullets:
-            bullet.update(self.matrix_terrain, self.matrix_triggers, self.surface, dt,
-                          {*self.entities.idles, *self.entities.movables,
-                           *self.entities.characters, *self.entities.fighters})
+        with profiler.zone("World.bullets"):
+            self.state.bullets.update(self.matrix_terrain, self.camera, dt, self.targets)
+        # Particles
+        with profiler.zone("World.particles"):
+            self.state.particles.update(dt)
+            self.state.particles.draw(self.camera)
         # Idles
-        for idle in self.entities.idles:
-            idle.update(dt, self.surface)
-            if not idle.is_alive():
-                self.entities.idles.remove(idle)
+        with profiler.zone("World.idles"):
+            indices = self.entities.idles.get_indices()
+            systems.draw(registry, indices, self.camera)
+            systems.animate(registry, indices, dt)
+            systems.check_health(registry, indices)
         # Movables
-        for movable in self.entities.movables:
-            movable.update(self.matrix_terrain, self.matrix_triggers, self.surface, dt)
-            if not movable.is_alive():
-                self.entities.movables.remove(movable)
+        with profiler.zone("World.movables"):
+            self.update_movables(self.entities.movables.get_indices(), dt)
         # Characters
-        for character in self.entities.characters:
-            character.update(self.matrix_terrain, self.matrix_triggers, self.surface, dt)
-            if not character.is_alive():
-                self.entities.characters.remove(character)
+        with profiler.zone("World.characters"):
+            self.update_movables(self.entities.characters.get_indices(), dt)
         # Fighters
-        for fighter in self.entities.fighters:
-            fighter.update(self.matrix_terrain, self.matrix_triggers,
-                           (player,), self.surface, dt)
-            if not fighter.is_alive():
-                self.entities.fighters.remove(fighter)
+        with profiler.zone("World.fighters"):
+            indices = self.entities.fighters.get_indices()
+            self.update_movables(indices, dt)
+            systems.think(registry, indices, self.enemies, dt)
+        # Dead entities are removed once all groups are updated
+        with profiler.zone("World.despawn"):
+            self.entities.despawn()
+
+    @profiler.profile("World.draw")
+    def draw(self, surface: pygame.Surface, player, alpha: float = 1) -> None:
+        """Render the world `alpha` of the way from the previous tick to the
+        current one"""
+
+        self.camera.surface = surface
+        self.camera.follow(player, alpha)
+        self.draw_terrain()
+        self.state.bullets.draw(self.camera, alpha)
+        self.state.particles.draw(self.camera, alpha)
+        systems.draw(self.state.registry, np.concatenate([
+            group.get_indices() for group in (
+                self.entities.idles, self.entities.movables,
+                self.entities.characters, self.entities.fighters)]),
+            self.camera, alpha)
+        player.draw(self.camera, alpha)
+        self.camera.render()
 
-        surface.blit(self.surface, (0, 0))
+    def update_movables(self, indices: np.ndarray, dt: int) -> None:
+        """What `Movable.update` does, for a batch of registry slots"""
+
+        registry = self.state.registry
+        systems.draw(registry, indices, self.camera)
+        systems.animate(registry, indices, dt)
+        systems.check_health(registry, indices)
+        systems.move(registry, indices, self.matrix_terrain, dt)
 
 
 class EditLevel(Level):
     def __init__(self, name: str) -> None:
         super().__init__(name)
 
+        # Opaque, the screen is redrawn only in dirty areas and a translucent
+        # layer would blend with what was there before
+        self.surface_terrain = self.create_surface(self.matrix_terrain, 255)
         self.surface_entities = self.create_surface(self.matrix_entities, 50)
         self.suraface_triggers = self.create_surface(self.matrix_triggers, 50)
         self.current_matrix = self.matrix_terrain
         self.current_surface = self.surface_terrain
+        self.mini_map = MiniMap(self.matrix_terrain, (85, 0), 15, 150)
+        # Tile areas edited since the last frame, only these are redrawn
+        self.dirty_areas: list[tuple[int, int, int, int]] = []
+        # Rect of the filling tool as `(color, rect)`, the one on the screen
+        self.preview: tuple = None
+        self.drawn_preview: tuple = None
 
         # Other
         self.brush = "wh"
@@ -134,24 +312,24 @@ class EditLevel(Level):
     def change_tile(self, clear: bool = False, apply: bool = False) -> None:
         """Uses pen or filling tool to change tiles with current brush"""
         if self.brush_mode == 1:
-            self.current_matrix[self.current_mouse_pos[1]][self.current_mouse_pos[0]]\
-                = "0" if clear else self.brush
-            pygame.draw.rect(
-                self.current_surface,
-                (0, 0, 0, 0) if clear else COLORS_SHORT[self.brush],
-                (self.current_mouse_pos[0] * TILESIZE,
-                 self.current_mouse_pos[1] * TILESIZE, TILESIZE, TILESIZE))
+            self.current_matrix.set(*self.current_mouse_pos,
+                                    EMPTY if clear else self.brush)
+            self.dirty_areas.append((*self.current_mouse_pos,
+                                     self.current_mouse_pos[0] + 1,
+                                     self.current_mouse_pos[1] + 1))
         elif self.brush_mode == 2:
             if apply:
-                for row_index in range(min(self.start_mouse_pos[1], self.current_mouse_pos[1]),
-                                       max(self.start_mouse_pos[1], self.current_mouse_pos[1])):
-                    for col_index in range(min(self.start_mouse_pos[0], self.current_mouse_pos[0]),
-                                           max(self.start_mouse_pos[0], self.current_mouse_pos[0])):
-                        self.current_matrix[row_index][col_index] = "0" if clear else self.brush
-            pygame.draw.rect(
-                self.current_surface if apply else self.surface,
+                area = (min(self.start_mouse_pos[0], self.current_mouse_pos[0]),
+                        min(self.start_mouse_pos[1], self.current_mouse_pos[1]),
+                        max(self.start_mouse_pos[0], self.current_mouse_pos[0]),
+                        max(self.start_mouse_pos[1], self.current_mouse_pos[1]))
+                self.current_matrix.fill(*area, EMPTY if clear else self.brush)
+                self.dirty_areas.append(area)
+                self.preview = None
+                return
+            self.preview = (
                 (0, 0, 0, 0) if clear else COLORS_SHORT[self.brush],
-                (min(self.start_mouse_pos[0], self.current_mouse_pos[0]) * TILESIZE,
+                pygame.Rect(min(self.start_mouse_pos[0], self.current_mouse_pos[0]) * TILESIZE,
                  min(self.start_mouse_pos[1], self.current_mouse_pos[1]) * TILESIZE,
                  abs(self.start_mouse_pos[0] - self.current_mouse_pos[0]) * TILESIZE,
                  abs(self.start_mouse_pos[1] - self.current_mouse_pos[1]) * TILESIZE))
@@ -164,16 +342,42 @@ class EditLevel(Level):
 
     def save_changes(self) -> None:
         """Save all changes to .map files"""
-        with open(self.path+"/terrain.map", "w") as data:
-            data.write("\n".join([" ".join(row) for row in self.matrix_terrain]))
-        with open(self.path+"/entities.map", "w") as data:
-            data.write("\n".join([" ".join(row) for row in self.matrix_entities]))
-        with open(self.path+"/triggers.map", "w") as data:
-            data.write("\n".join([" ".join(row) for row in self.matrix_triggers]))
+        self.matrix_terrain.save(self.path+"/terrain.map")
+        self.matrix_entities.save(self.path+"/entities.map")
+        self.matrix_triggers.save(self.path+"/triggers.map")
+
+    def redraw_dirty(self, dirty: DirtyRects = dirty_rects) -> None:
+        """Re-render only the edited tiles of the layer and the minimap,
+        their areas of the screen are marked as dirty"""
+
+        for area in self.dirty_areas:
+            self.draw_tiles(self.current_surface, self.current_matrix, area, (0, 0))
+            if self.current_matrix is self.matrix_terrain:
+                self.mini_map.redraw(self.matrix_terrain, area)
+            left, top, right, bottom = area
+            dirty.add((left * TILESIZE, top * TILESIZE,
+                       (right - left) * TILESIZE, (bottom - top) * TILESIZE))
+        self.dirty_areas.clear()
+        if self.mini_map.changed:
+            dirty.add(self.mini_map.rect)
+            self.mini_map.changed = False
+
+    def update(self, mouse_pos: tuple, surface: pygame.Surface,
+               dirty: DirtyRects = dirty_rects) -> None:
+        """Draw the level in dirty areas of the screen only"""
 
-    def update(self, mouse_pos: tuple, surface: pygame.Surface) -> None:
-        super().update()
+        self.redraw_dirty(dirty)
+        if self.preview != self.drawn_preview:
+            for preview in self.preview, self.drawn_preview:
+                if preview is not None:
+                    dirty.add(preview[1])
+            self.drawn_preview = self.preview
 
         self.current_mouse_pos = mouse_pos[0] // TILESIZE, mouse_pos[1] // TILESIZE
 
-        surface.blit(self.surface, (0, 0))
+        for rect in dirty.get_rects():
+            surface.blit(self.surface_terrain, rect, rect)
+        if self.preview is not None and dirty.collides(self.preview[1]):
+            pygame.draw.rect(surface, *self.preview)
+        if dirty.collides(self.mini_map.rect):
+            self.mini_map.draw(surface)
@@ -0,0 +1,45 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from modules.level import World
+
+
+class LevelLoader:
+    """Loads worlds on a worker thread ahead of time.\n
+    Maps are parsed, triggers compiled and surfaces baked there, the game
+    only starts a loaded world, so changing a level takes a single frame.
+    Worlds are used once, a level which is needed again is loaded again"""
+
+    def __init__(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix="LevelLoader")
+        self.loading: dict[str, Future] = {}
+
+    def load(self, name: str) -> None:
+        """Start loading a level unless it is loaded already"""
+
+        if name and name not in self.loading:
+            self.loading[name] = self.executor.submit(World, name)
+
+    def prefetch(self, *names: str) -> None:
+        """Load these levels, other ones are dropped"""
+
+        for name in list(self.loading):
+            if name not in names:
+                self.loading.pop(name).cancel()
+        for name in names:
+            self.load(name)
+
+    def is_ready(self, name: str) -> bool:
+        return name in self.loading and self.loading[name].done()
+
+    def get(self, name: str) -> World:
+        """Loaded world, waits for it if it is still loading and loads it
+        right away if it wasn't requested"""
+
+        future = self.loading.pop(name, None)
+        if future is None:
+            return World(name)
+        return future.result()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.loading.clear()
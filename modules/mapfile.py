@@ -0,0 +1,229 @@
+import os
+import struct
+import zlib
+from mmap import mmap, ACCESS_COPY, ACCESS_READ
+from modules.chunks import ChunkedGrid, TextMapSource
+from modules.tiles import TileGrid
+from modules.parameters.options import CHUNK_SIZE
+
+
+MAGIC = b"TMAP"
+VERSION = 1
+ALIGNMENT = 65536  # mmap offsets must be a multiple of the allocation granularity
+LAYERS = ("terrain", "entities", "triggers")
+COMPILED_NAME = "level.bin"
+
+HEADER = struct.Struct("<4sHHQ")
+LAYER = struct.Struct("<IIH?QQH")
+CHUNK = struct.Struct("<QI")
+
+
+class Layer:
+    """Entry of the layer table"""
+
+    def __init__(self, name: str, width: int, height: int, chunk_size: int,
+                 compressed: bool, offset: int, length: int,
+                 palette: list[str], chunks: list[tuple[int, int]] = None) -> None:
+        self.name = name
+        self.width, self.height = width, height
+        self.chunk_size = chunk_size
+        self.compressed = compressed
+        self.offset, self.length = offset, length
+        self.palette = palette
+        self.chunks = chunks
+
+    def get_chunks_per_row(self) -> int:
+        return -(-self.width // self.chunk_size)
+
+
+class CompressedSource:
+    """Chunk source of a compressed layer, used by `ChunkedGrid`"""
+
+    def __init__(self, data: mmap, layer: Layer) -> None:
+        self.data = data
+        self.layer = layer
+        self.width, self.height = layer.width, layer.height
+        self.chunk_size = layer.chunk_size
+        self.palette = layer.palette
+
+    def read_chunk(self, chunk_col: int, chunk_row: int, get_id) -> bytearray:
+        offset, length = self.layer.chunks[
+            chunk_row * self.layer.get_chunks_per_row() + chunk_col]
+        return bytearray(zlib.decompress(self.data[offset:offset + length]))
+
+    def find(self, code: str) -> tuple[int, int] | None:
+        if code not in self.palette:
+            return None
+        tile = bytes((self.palette.index(code),))
+        for index in range(len(self.layer.chunks)):
+            chunk_row, chunk_col = divmod(index, self.layer.get_chunks_per_row())
+            position = self.read_chunk(chunk_col, chunk_row, None).find(tile)
+            if position != -1:
+                row, col = divmod(position, self.chunk_size)
+                return (chunk_col * self.chunk_size + col,
+                        chunk_row * self.chunk_size + row)
+        return None
+
+    def close(self) -> None: ...
+
+
+class MapFile:
+    """Compiled level, all layers are stored in one file:\n
+    - header: magic, version, amount of layers, offset of the layer table
+    - layer data: raw tile ids row by row (aligned to `ALIGNMENT` so a layer
+      can be memory mapped on its own) or zlib compressed chunks
+    - layer table: name, width, height, chunk size, compression, offset and
+      length of data, palette of tile codes and the chunk index\n
+    Raw layers are memory mapped copy-on-write, so tiles are indexed without
+    being copied and edits never touch the file"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            magic, version, layers, table_offset = HEADER.unpack(
+                file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a compiled map of version {VERSION}")
+            file.seek(table_offset)
+            table = file.read()
+        self.layers: dict[str, Layer] = {}
+        position = 0
+        for _ in range(layers):
+            layer, position = read_layer(table, position)
+            self.layers[layer.name] = layer
+        self.data: mmap = None
+
+    def load_layer(self, name: str) -> TileGrid:
+        layer = self.layers[name]
+        if layer.compressed:
+            if self.data is None:
+                with open(self.path, "rb") as file:
+                    self.data = mmap(file.fileno(), 0, access=ACCESS_READ)
+            return ChunkedGrid(CompressedSource(self.data, layer),
+                               chunk_size=layer.chunk_size)
+        tiles = bytearray()
+        if layer.length:
+            with open(self.path, "rb") as file:
+                tiles = mmap(file.fileno(), layer.length, offset=layer.offset,
+                             access=ACCESS_COPY)
+        return TileGrid(layer.width, layer.height, layer.palette, tiles)
+
+
+def is_compiled(path: str) -> bool:
+    """Whether a level has a compiled file which is newer than its text maps"""
+
+    compiled = path + "/" + COMPILED_NAME
+    if not os.path.exists(compiled):
+        return False
+    modified = os.path.getmtime(compiled)
+    return all(os.path.getmtime(path + "/" + name + ".map") <= modified
+               for name in LAYERS if os.path.exists(path + "/" + name + ".map"))
+
+
+def read_layer(table: bytes, position: int) -> tuple[Layer, int]:
+    name_length = table[position]
+    name = table[position + 1:position + 1 + name_length].decode()
+    position += 1 + name_length
+    width, height, chunk_size, compressed, offset, length, palette_length = \
+        LAYER.unpack_from(table, position)
+    position += LAYER.size
+    palette = []
+    for _ in range(palette_length):
+        code_length = table[position]
+        palette.append(table[position + 1:position + 1 + code_length].decode())
+        position += 1 + code_length
+    chunks = None
+    if compressed:
+        chunks = []
+        amount = -(-width // chunk_size) * -(-height // chunk_size)
+        for _ in range(amount):
+            chunks.append(CHUNK.unpack_from(table, position))
+            position += CHUNK.size
+    return Layer(name, width, height, chunk_size, compressed, offset, length,
+                 palette, chunks), position
+
+
+def write_layer(layer: Layer) -> bytes:
+    name = layer.name.encode()
+    data = bytes((len(name),)) + name + LAYER.pack(
+        layer.width, layer.height, layer.chunk_size, layer.compressed,
+        layer.offset, layer.length, len(layer.palette))
+    for code in layer.palette:
+        code = code.encode()
+        data += bytes((len(code),)) + code
+    if layer.compressed:
+        data += b"".join(CHUNK.pack(*chunk) for chunk in layer.chunks)
+    return data
+
+
+def compile_level(path: str, compress: bool = False,
+                  chunk_size: int = CHUNK_SIZE) -> None:
+    """Convert text .map layers of a level to one compiled file.\n
+    Layers are streamed by chunks, so memory use doesn't grow with the map.\n
+    Run `python -m modules.mapfile compile maps/<name>` to convert levels"""
+
+    layers = []
+    with open(path + "/" + COMPILED_NAME + ".tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for name in LAYERS:
+            grid = ChunkedGrid(TextMapSource(path + "/" + name + ".map",
+                                             chunk_size), chunk_size)
+            chunks_per_row = -(-grid.width // chunk_size)
+            chunk_rows = -(-grid.height // chunk_size)
+            if compress:
+                offset, chunks = file.tell(), []
+                for chunk_row in range(chunk_rows):
+                    for chunk_col in range(chunks_per_row):
+                        data = zlib.compress(grid.get_chunk(chunk_col, chunk_row))
+                        chunks.append((file.tell(), len(data)))
+                        file.write(data)
+            else:
+                file.write(bytes(-file.tell() % ALIGNMENT))
+                offset, chunks = file.tell(), None
+                for chunk_row in range(chunk_rows):
+                    band = [grid.get_chunk(chunk_col, chunk_row)
+                            for chunk_col in range(chunks_per_row)]
+                    for row in range(min(chunk_size,
+                                         grid.height - chunk_row * chunk_size)):
+                        start = row * chunk_size
+                        file.write(b"".join(
+                            chunk[start:start + chunk_size]
+                            for chunk in band)[:grid.width])
+            layers.append(Layer(name, grid.width, grid.height, chunk_size,
+                                compress, offset, file.tell() - offset,
+                                grid.palette, chunks))
+            grid.source.close()
+        table_offset = file.tell()
+        for layer in layers:
+            file.write(write_layer(layer))
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, len(layers), table_offset))
+    os.replace(path + "/" + COMPILED_NAME + ".tmp", path + "/" + COMPILED_NAME)
+
+
+def decompile_level(path: str) -> None:
+    """Write text .map layers of a level from its compiled file"""
+
+    compiled = MapFile(path + "/" + COMPILED_NAME)
+    for name in LAYERS:
+        compiled.load_layer(name).save(path + "/" + name + ".map")
+    # Text maps are newer now, keep the compiled file in use
+    os.utime(path + "/" + COMPILED_NAME)
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Convert levels between text and "
+                                        "compiled map formats")
+    parser.add_argument("action", choices=("compile", "decompile"))
+    parser.add_argument("levels", nargs="+", help="level folders, like maps/test_1")
+    parser.add_argument("--compress", action="store_true",
+                        help="store layers as zlib compressed chunks")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    arguments = parser.parse_args()
+    for level in arguments.levels:
+        if arguments.action == "compile":
+            compile_level(level, arguments.compress, arguments.chunk_size)
+        else:
+            decompile_level(level)
@@ -0,0 +1,172 @@
+import pygame
+import numpy as np
+from struct import Struct
+from modules.binary import read_varint, unzigzag, write_varint, zigzag
+from modules.parameters.options import screen_res
+
+
+# Types of packets, the first byte of every packet. A server answers JOIN
+# with FULL when its session has no room for another player
+JOIN, WELCOME, INPUT, STATE, LEAVE, FULL = range(6)
+# Keys of the keyboard set which are sent, a bit each
+KEYS = (pygame.K_a, pygame.K_d, pygame.K_w,
+        pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4, pygame.K_5)
+QUANTUM = 8  # Positions of entities are sent in 1/8 of a pixel
+# Entities and bullets this far from a player are sent to it
+INTEREST = screen_res[0], screen_res[1]
+MAX_ENTITIES = 64  # Nearest ones are sent, so a packet fits in a datagram
+MAX_BULLETS = 64
+# Fields of an entity: kind (group of the registry, 0 for players), x, y
+# and health, all integers. A bit of each in the flags of an entity
+FIELDS = 4
+
+input_struct = Struct("<BIIBBhh")  # Type, input number, acked tick, keys,
+                                   # mouse buttons, aim x and y
+welcome_struct = Struct("<BQIIdd")  # Type, player id, tick, level number,
+                                   # spawn x and y, the level name follows
+state_struct = Struct("<BIIII")  # Type, tick, base tick, last input number,
+                                 # level number
+own_struct = Struct("<ddddh")  # Exact x, y, speed x, speed y and health
+
+
+def encode_input(number: int, acked_tick: int, keyboard_keys: set,
+                 mouse_buttons: set, aim: tuple[float, float]) -> bytes:
+    """Input of a tick, shaped like the sets of `main.py`. The aim is
+    relative to the player's eyes"""
+
+    keys = sum(1 << bit for bit, key in enumerate(KEYS) if key in keyboard_keys)
+    buttons = sum(1 << button for button in mouse_buttons if button < 8)
+    return input_struct.pack(INPUT, number, acked_tick, keys, buttons,
+                             int(max(min(aim[0], 32767), -32768)),
+                             int(max(min(aim[1], 32767), -32768)))
+
+
+def decode_input(data: bytes) -> tuple[int, int, set, set, tuple[int, int]]:
+    """Input number, acked tick, keyboard keys, mouse buttons and aim"""
+
+    _, number, acked_tick, keys, buttons, aim_x, aim_y = input_struct.unpack(data)
+    return (number, acked_tick,
+            {key for bit, key in enumerate(KEYS) if keys >> bit & 1},
+            {button for button in range(8) if buttons >> button & 1},
+            (aim_x, aim_y))
+
+
+def encode_welcome(player_id: int, tick: int, level: int,
+                   coords: tuple[float, float], level_name: str) -> bytes:
+    """Reply to a join. `level` counts level changes of the session, states
+    carry it too, so a client knows when to join the next level"""
+
+    return welcome_struct.pack(WELCOME, player_id, tick, level, *coords)\
+        + level_name.encode("utf-8")
+
+
+def decode_welcome(data: bytes) -> tuple[int, int, int, tuple[float, float], str]:
+    """Player id, tick, level number, spawn and level name"""
+
+    _, player_id, tick, level, x, y = welcome_struct.unpack_from(data)
+    return (player_id, tick, level, (x, y),
+            data[welcome_struct.size:].decode("utf-8"))
+
+
+def get_interest(x: np.ndarray, y: np.ndarray, center: tuple[float, float],
+                 limit: int = MAX_ENTITIES) -> np.ndarray:
+    """Indices of points near the center, at most `limit` nearest ones"""
+
+    dx, dy = np.abs(x - center[0]), np.abs(y - center[1])
+    near = np.flatnonzero((dx < INTEREST[0]) & (dy < INTEREST[1]))
+    order = np.argsort(dx[near] + dy[near], kind="stable")[:limit]
+    return near[order]
+
+
+def quantize(ids: list[int], kinds: np.ndarray, x: np.ndarray, y: np.ndarray,
+             health: np.ndarray) -> dict[int, tuple[int, ...]]:
+    """States of entities by id, as sent"""
+
+    return dict(zip(ids, zip(kinds.tolist(),
+                             np.rint(x * QUANTUM).astype(np.int64).tolist(),
+                             np.rint(y * QUANTUM).astype(np.int64).tolist(),
+                             health.tolist())))
+
+
+def encode_state(tick: int, base_tick: int, input_number: int, level: int,
+                 own: tuple, current: dict[int, tuple], base: dict[int, tuple],
+                 bullets: list[tuple[int, int]] = ()) -> bytes:
+    """State of the world for a player, entities are delta compressed
+    against the state of `base_tick` the player acknowledged: only removed
+    entities and changed fields are written.\n
+    `own` is the exact state of the player for reconciliation, bullets are
+    whole pixels relative to the player"""
+
+    stream = bytearray(state_struct.pack(STATE, tick, base_tick, input_number, level))
+    stream += own_struct.pack(*own)
+
+    removed = sorted(base.keys() - current.keys())
+    write_varint(stream, len(removed))
+    previous = 0
+    for entity_id in removed:  # Sorted, so differences are small
+        write_varint(stream, entity_id - previous)
+        previous = entity_id
+
+    changed = sorted(entity_id for entity_id, state in current.items()
+                     if base.get(entity_id) != state)
+    write_varint(stream, len(changed))
+    previous = 0
+    for entity_id in changed:
+        write_varint(stream, entity_id - previous)
+        previous = entity_id
+        state = current[entity_id]
+        old = base.get(entity_id)
+        flags = (1 << FIELDS) - 1 if old is None else sum(
+            1 << field for field in range(FIELDS) if state[field] != old[field])
+        old = old or (0,) * FIELDS
+        stream.append(flags)
+        for field in range(FIELDS):
+            if flags >> field & 1:
+                write_varint(stream, zigzag(state[field] - old[field]))
+
+    write_varint(stream, len(bullets))
+    for x, y in bullets:
+        write_varint(stream, zigzag(x))
+        write_varint(stream, zigzag(y))
+    return bytes(stream)
+
+
+def decode_state(data: bytes, bases: dict[int, dict]) -> tuple:
+    """Tick, base tick, last input number, level number, own state,
+    entities by id and bullets. The base state has to be in `bases` by its
+    tick, tick 0 is an empty base"""
+
+    _, tick, base_tick, input_number, level = state_struct.unpack_from(data)
+    offset = state_struct.size
+    own = own_struct.unpack_from(data, offset)
+    offset += own_struct.size
+    current = dict(bases[base_tick]) if base_tick else {}
+
+    count, offset = read_varint(data, offset)
+    entity_id = 0
+    for index in range(count):
+        difference, offset = read_varint(data, offset)
+        entity_id += difference
+        current.pop(entity_id, None)
+
+    count, offset = read_varint(data, offset)
+    entity_id = 0
+    for index in range(count):
+        difference, offset = read_varint(data, offset)
+        entity_id += difference
+        flags = data[offset]
+        offset += 1
+        state = list(current.get(entity_id, (0,) * FIELDS))
+        for field in range(FIELDS):
+            if flags >> field & 1:
+                value, offset = read_varint(data, offset)
+                state[field] += unzigzag(value)
+        current[entity_id] = tuple(state)
+
+    count, offset = read_varint(data, offset)
+    bullets = []
+    for index in range(count):
+        x, offset = read_varint(data, offset)
+        y, offset = read_varint(data, offset)
+        bullets.append((unzigzag(x), unzigzag(y)))
+    return tick, base_tick, input_number, level, own, current, bullets
@@ -9,11 +9,18 @@ fonts_path = settings["fonts_path"]
 icon_path = settings["icon"]
 title = settings["title"]
 TILESIZE = settings["tilesize"]
+CHUNK_SIZE = settings["chunk_size"]
+CHUNK_MEMORY = settings["chunk_memory"]
+STREAMING_THRESHOLD = settings["streaming_threshold"]
+ASSET_MEMORY = settings["asset_memory"]
+PROFILER_FRAMES = settings["profiler_frames"]
+MAX_TICKS_PER_FRAME = settings["max_ticks_per_frame"]
 
 with open("settings/world_settings.json") as world_settings:
     world_settings = load_json(world_settings)
 GRAVITY = world_settings["gravity"]
 FRICTION = world_settings["friction"]
+TICK_RATE = world_settings["tick_rate"]  # Simulation steps per second
 
 with open("settings/preferences.json") as preferences:
     preferences = load_json(preferences)
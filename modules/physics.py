@@ -1,72 +1,169 @@
+import numpy as np
 from pygame import Rect
-from math import floor
+from math import ceil, floor, inf
 from modules.parameters.options import TILESIZE, GRAVITY
+from modules.tiles import TileGrid
 
 
 def apply_gravity(weight: float) -> float:
     return GRAVITY * weight
 
 
-def calc_area_x(x: float, y: float, speed: float, width: int, height: int) -> tuple:
-    """Create an area\n\nUSE FOR ONLY `x-axis`"""
-
-    if speed >= 0:
-        vector = 1
-        rect = (floor((x + width-1) / TILESIZE),            # left
-                floor(y / TILESIZE),                        # top
-                floor((x + width + speed) / TILESIZE + 1),  # right
-                floor((y + height - 1) / TILESIZE + 1))     # bottom
-    else:
-        vector = -1
-        rect = (floor(x / TILESIZE),                        # right
-                floor(y / TILESIZE),                        # top
-                floor((x + speed - 1) / TILESIZE - 1),      # left
-                floor((y + height - 1) / TILESIZE + 1))     # bottom
-    return rect, vector
-
-
-def calc_area_y(x: float, y: float, speed: float, width: int, height: int) -> tuple:
-    """Create an area\n\nUSE FOR ONLY `y-axis`"""
-
-    if speed >= 0:
-        vector = 1
-        rect = (floor(x / TILESIZE),                           # left
-                floor((y + height - 1) / TILESIZE),            # top
-                floor((x + width - 1) / TILESIZE + 1),         # right
-                floor((y + height + speed) / TILESIZE + 1))    # bottom
-    else:
-        vector = -1
-        rect = (floor(x / TILESIZE),                           # left
-                floor(y / TILESIZE),                           # bottom
-                floor((x + width + TILESIZE - 1) / TILESIZE),  # right
-                floor((y + speed - TILESIZE - 1) / TILESIZE))  # top
-    return rect, vector
-
-
-def check_collision_x(area: tuple, matrix: list[list[str]]) -> tuple[int, int, str, int]:
-    """Check every tile of object's rect if it's collided with walls.\n
-    Returns tile's coordinates.\n
-    USE FOR ONLY `x-axis`"""
-
-    for col_index in range(area[0][0], area[0][2], area[1]):
-        for row_index in range(area[0][1], area[0][3]):
-            if matrix[row_index][col_index] != "0":
-                return (col_index * TILESIZE, row_index * TILESIZE,
-                        matrix[row_index][col_index])
-    return (col_index * TILESIZE, row_index * TILESIZE, matrix[row_index][col_index])
-
-
-def check_collision_y(area: tuple, matrix: list[list[str]]) -> tuple[int, int, str, int]:
-    """Check every tile of object's rect if it's collided with walls.\n
-    Returns tile's coordinates.\n
-    USE FOR ONLY `y-axis`"""
-
-    for row_index in range(area[0][1], area[0][3], area[1]):
-        for col_index in range(area[0][0], area[0][2]):
-            if matrix[row_index][col_index] != "0":
-                return (col_index * TILESIZE, row_index * TILESIZE,
-                        matrix[row_index][col_index])
-    return (col_index * TILESIZE, row_index * TILESIZE, matrix[row_index][col_index])
+def sweep(x: float, y: float, width: float, height: float, dx: float, dy: float,
+          grid: TileGrid) -> tuple[float, int, int, int, int, int]:
+    """Move a box by `(dx, dy)` until it hits a solid tile of the grid.
+    Only cells its leading edges enter are checked, they are walked one
+    column or row boundary at a time (grid DDA), so the cost doesn't depend
+    on the speed.\n
+    Returns `(time, normal_x, normal_y, col, row, tile)`: the part of the
+    move done before the contact, the normal of the hit face and the hit
+    cell. Without a hit time is 1 and the tile is 0.\n
+    Tiles the box already overlaps are ignored, so it can't get stuck in them"""
+
+    get, solid = grid.get, grid.solid
+    step_x, col, next_x, delta_x = get_crossing(x, width, dx)
+    step_y, row, next_y, delta_y = get_crossing(y, height, dy)
+    while True:
+        if next_x <= next_y:
+            time = next_x
+            if time > 1:
+                break
+            top = y + dy * time
+            first = floor(top / TILESIZE)
+            for row_index in range(first, max(ceil((top + height) / TILESIZE), first + 1)):
+                tile = get(col, row_index)
+                if solid[tile]:
+                    return time, -step_x, 0, col, row_index, tile
+            col += step_x
+            next_x += delta_x
+        else:
+            time = next_y
+            if time > 1:
+                break
+            left = x + dx * time
+            first = floor(left / TILESIZE)
+            for col_index in range(first, max(ceil((left + width) / TILESIZE), first + 1)):
+                tile = get(col_index, row)
+                if solid[tile]:
+                    return time, 0, -step_y, col_index, row, tile
+            row += step_y
+            next_y += delta_y
+    return 1.0, 0, 0, 0, 0, 0
+
+
+def get_crossing(position: float, size: float, speed: float) -> tuple:
+    """For one axis of `sweep`: the direction, the first cell the leading edge
+    enters, the time it enters it and the time to cross a cell"""
+
+    if speed > 0:
+        cell = ceil((position + size) / TILESIZE)
+        return 1, cell, (cell * TILESIZE - position - size) / speed, TILESIZE / speed
+    if speed < 0:
+        cell = floor(position / TILESIZE) - 1
+        return -1, cell, (position - (cell + 1) * TILESIZE) / -speed, TILESIZE / -speed
+    return 0, 0, inf, inf
+
+
+def sweep_many(x: np.ndarray, y: np.ndarray, width: np.ndarray,
+               height: np.ndarray, dx: np.ndarray, dy: np.ndarray,
+               grid: TileGrid) -> tuple[np.ndarray, ...]:
+    """`sweep` of many boxes at once, every boundary crossing is one pass
+    over the boxes which are still moving. Returns arrays of the same values"""
+
+    count = len(x)
+    x, y, dx, dy = (np.asarray(array, dtype=np.float64) for array in (x, y, dx, dy))
+    width, height = np.asarray(width), np.asarray(height)
+    step_x, col, next_x, delta_x = get_crossings(x, width, dx)
+    step_y, row, next_y, delta_y = get_crossings(y, height, dy)
+    time = np.ones(count)
+    normal_x = np.zeros(count, dtype=np.int64)
+    normal_y = np.zeros(count, dtype=np.int64)
+    hit_col = np.zeros(count, dtype=np.int64)
+    hit_row = np.zeros(count, dtype=np.int64)
+    hit_tile = np.zeros(count, dtype=np.int64)
+    moving = np.arange(count)
+    while True:
+        along_x = next_x <= next_y
+        now = np.where(along_x, next_x, next_y)
+        keep = now <= 1
+        if not keep.all():
+            moving, along_x, now = moving[keep], along_x[keep], now[keep]
+            step_x, col, next_x, delta_x = \
+                step_x[keep], col[keep], next_x[keep], delta_x[keep]
+            step_y, row, next_y, delta_y = \
+                step_y[keep], row[keep], next_y[keep], delta_y[keep]
+        if not len(moving):
+            break
+        # Cells of the entered column or row
+        start = np.floor(np.where(
+            along_x, y[moving] + dy[moving] * now,
+            x[moving] + dx[moving] * now) / TILESIZE).astype(np.int64)
+        stop = np.ceil(np.where(
+            along_x, y[moving] + height[moving] + dy[moving] * now,
+            x[moving] + width[moving] + dx[moving] * now) / TILESIZE).astype(np.int64)
+        span = np.maximum(stop - start, 1)
+        offsets = np.arange(span.max())[None, :]
+        across = start[:, None] + offsets
+        cols = np.where(along_x[:, None], col[:, None], across)
+        rows = np.where(along_x[:, None], across, row[:, None])
+        tiles = grid.lookup(cols, rows)
+        # Viewed only between lookups, parsing a chunk can grow the palette
+        solid = np.frombuffer(grid.solid, dtype=np.uint8)
+        hits = (offsets < span[:, None]) & (solid[tiles] != 0)
+        del solid
+        found = hits.any(axis=1)
+        if found.any():
+            first = hits[found].argmax(axis=1)
+            hit = moving[found]
+            time[hit] = now[found]
+            normal_x[hit] = np.where(along_x[found], -step_x[found], 0)
+            normal_y[hit] = np.where(along_x[found], 0, -step_y[found])
+            hit_col[hit] = cols[found, first]
+            hit_row[hit] = rows[found, first]
+            hit_tile[hit] = tiles[found, first]
+            # Boxes which hit are dropped on the next pass
+            next_x[found] = next_y[found] = inf
+        col += np.where(along_x, step_x, 0)
+        next_x = np.where(along_x, next_x + delta_x, next_x)
+        row += np.where(along_x, 0, step_y)
+        next_y = np.where(along_x, next_y, next_y + delta_y)
+    return time, normal_x, normal_y, hit_col, hit_row, hit_tile
+
+
+def get_crossings(position: np.ndarray, size: np.ndarray, speed: np.ndarray) -> tuple:
+    """`get_crossing` of many boxes at once"""
+
+    forward = speed > 0
+    step = np.sign(speed).astype(np.int64)
+    cell = np.where(forward, np.ceil((position + size) / TILESIZE),
+                    np.floor(position / TILESIZE) - 1).astype(np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distance = np.where(forward, cell * TILESIZE - position - size,
+                            position - (cell + 1) * TILESIZE)
+        time = np.where(step != 0, distance / np.abs(speed), inf)
+        delta = np.where(step != 0, TILESIZE / np.abs(speed), inf)
+    return step, cell, time, delta
+
+
+def ray_cast(x: np.ndarray, y: np.ndarray, dx: np.ndarray, dy: np.ndarray,
+             grid: TileGrid) -> tuple[np.ndarray, ...]:
+    """Cast rays of points from `(x, y)` by `(dx, dy)` through the grid,
+    for projectiles. Returns arrays like `sweep_many`, rays which start in a
+    solid tile hit it at time 0 with a zero normal"""
+
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    zeros = np.zeros(len(x))
+    time, normal_x, normal_y, cols, rows, tiles = sweep_many(
+        x, y, zeros, zeros, dx, dy, grid)
+    start_cols = np.floor(x / TILESIZE).astype(np.int64)
+    start_rows = np.floor(y / TILESIZE).astype(np.int64)
+    start_tiles = grid.lookup(start_cols, start_rows)
+    inside = np.frombuffer(grid.solid, dtype=np.uint8)[start_tiles] != 0
+    time[inside] = 0
+    normal_x[inside], normal_y[inside] = 0, 0
+    cols[inside], rows[inside] = start_cols[inside], start_rows[inside]
+    tiles[inside] = start_tiles[inside]
+    return time, normal_x, normal_y, cols, rows, tiles
 
 
 def entity_collision(
@@ -87,3 +184,76 @@ def entity_collision_pg(
 ) -> bool:
     """Check the collision between two areas using `pygame.Rect.colliderect`"""
     return Rect(x_1, y_1, width_1, height_1).colliderect(Rect(x_2, y_2, width_2, height_2))
+
+
+class SpatialHash:
+    """Uniform grid of entities' rects for broadphase collision queries"""
+
+    def __init__(self, cell_size: int = TILESIZE * 8) -> None:
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list] = {}
+
+    def clear(self) -> None:
+        self.cells.clear()
+
+    def insert(self, entity) -> None:
+        """Add an entity to every cell its rect touches"""
+
+        cells = self.cells
+        width, height = entity.get_size()
+        left, top, right, bottom = self.get_cells(
+            entity.x, entity.y, width, height)
+        for col in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                if (col, row) in cells:
+                    cells[col, row].append(entity)
+                else:
+                    cells[col, row] = [entity]
+
+    def insert_many(self, entities: list, x: np.ndarray, y: np.ndarray,
+                    width: np.ndarray, height: np.ndarray) -> None:
+        """`insert` of many entities, their rects are given as arrays"""
+
+        cells = self.cells
+        cell_size = self.cell_size
+        for entity, left, top, right, bottom in zip(
+                entities, np.floor(x / cell_size).astype(np.int64).tolist(),
+                np.floor(y / cell_size).astype(np.int64).tolist(),
+                np.floor((x + width) / cell_size).astype(np.int64).tolist(),
+                np.floor((y + height) / cell_size).astype(np.int64).tolist()):
+            for col in range(left, right + 1):
+                for row in range(top, bottom + 1):
+                    if (col, row) in cells:
+                        cells[col, row].append(entity)
+                    else:
+                        cells[col, row] = [entity]
+
+    def rebuild(self, *groups) -> None:
+        """Fill the grid from scratch with entities of every group"""
+
+        self.cells.clear()
+        for group in groups:
+            for entity in group:
+                self.insert(entity)
+
+    def get_cells(self, x: float, y: float,
+                  width: float, height: float) -> tuple[int, int, int, int]:
+        """Cells range covered by a rect (inclusive)"""
+
+        cell_size = self.cell_size
+        return (floor(x / cell_size), floor(y / cell_size),
+                floor((x + width) / cell_size), floor((y + height) / cell_size))
+
+    def query(self, x: float, y: float, width: float, height: float):
+        """Get entities which rects may intersect with the given rect"""
+
+        cells = self.cells
+        left, top, right, bottom = self.get_cells(x, y, width, height)
+        if left == right and top == bottom:
+            return cells.get((left, top), ())
+        found = set()
+        for col in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                if (col, row) in cells:
+                    found.update(cells[col, row])
+        return found
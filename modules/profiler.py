@@ -0,0 +1,99 @@
+from collections import deque
+from functools import wraps
+from json import dump as json_dump
+from time import perf_counter_ns
+from modules.parameters.options import PROFILER_FRAMES
+
+
+class Zone:
+    """Named timed section, used as `with profiler.zone("name"):`"""
+
+    __slots__ = "profiler", "name", "start"
+
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self) -> None:
+        self.start = perf_counter_ns()
+
+    def __exit__(self, *exception) -> None:
+        if self.profiler.enabled:
+            self.profiler.events.append(
+                (self.name, self.start, perf_counter_ns() - self.start))
+
+
+class Profiler:
+    """Frame profiler. Zones record (name, start, duration) in ns for
+    the current frame, `next_frame` moves them to a ring buffer of the last
+    `frames` frames, which can be exported as a Chrome trace
+    (chrome://tracing, ui.perfetto.dev)"""
+
+    def __init__(self, frames: int = PROFILER_FRAMES, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.zones: dict[str, Zone] = {}
+        self.frames: deque[tuple[int, int, list]] = deque(maxlen=frames)
+        self.events: list[tuple[str, int, int]] = []
+        self.frame_start = perf_counter_ns()
+
+    def zone(self, name: str) -> Zone:
+        zone = self.zones.get(name)
+        if zone is None:
+            zone = self.zones[name] = Zone(self, name)
+        return zone
+
+    def profile(self, name: str):
+        """Decorator which times every call of a function as a zone"""
+
+        def decorator(function):
+            zone = self.zone(name)
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with zone:
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def next_frame(self) -> None:
+        """Close the current frame and start the next one"""
+
+        now = perf_counter_ns()
+        if self.enabled:
+            self.frames.append((self.frame_start, now - self.frame_start, self.events))
+        self.events = []
+        self.frame_start = now
+
+    def get_stats(self) -> dict[str, tuple[float, float]]:
+        """Mean and max time in ms of every zone per frame over the buffer"""
+
+        totals: dict[str, list[int]] = {}
+        for _, _, events in self.frames:
+            frame: dict[str, int] = {}
+            for name, _, duration in events:
+                frame[name] = frame.get(name, 0) + duration
+            for name, duration in frame.items():
+                totals.setdefault(name, []).append(duration)
+        frames = len(self.frames) or 1
+        return {name: (sum(durations) / frames / 1e6, max(durations) / 1e6)
+                for name, durations in totals.items()}
+
+    def export(self, path: str) -> None:
+        """Write the buffered frames as Chrome trace-event JSON"""
+
+        events = []
+        for number, (start, duration, zones) in enumerate(self.frames):
+            events.append({"name": "frame", "ph": "X", "pid": 0, "tid": 0,
+                           "ts": start / 1000, "dur": duration / 1000,
+                           "args": {"frame": number}})
+            events.extend({"name": name, "ph": "X", "pid": 0, "tid": 0,
+                           "ts": start / 1000, "dur": duration / 1000}
+                          for name, start, duration in zones)
+        with open(path, "w") as trace:
+            json_dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace)
+
+
+# Off unless a frame loop which calls `next_frame` turns it on, events
+# would pile up otherwise
+profiler = Profiler(enabled=False)
@@ -0,0 +1,187 @@
+import pygame
+import numpy as np
+from math import cos, sin, degrees, tau
+from modules import effects, maths
+from modules.assets import images
+from modules.camera import Camera
+from modules.physics import SpatialHash, ray_cast
+from modules.render import PROJECTILES
+from modules.tiles import TileGrid
+from modules.parameters.options import TILESIZE, GRAVITY
+
+
+class BulletPool:
+    """Bullets stored as structure of arrays and simulated in one batch"""
+
+    directions = 32  # Amount of pre-rotated sprites per bullet size
+    fields = ("x", "y", "prev_x", "prev_y", "speed_x", "speed_y", "weight",
+              "damage", "size", "direction", "time_left")
+
+    def __init__(self, sprite_path: str, capacity: int = 256,
+                 lifetime: int = 5000) -> None:
+        self.sprite_path = sprite_path
+        self.lifetime = lifetime
+        self.count = 0
+
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)  # Positions at the start of a tick
+        self.prev_y = np.zeros(capacity)
+        self.speed_x = np.zeros(capacity)
+        self.speed_y = np.zeros(capacity)
+        self.weight = np.zeros(capacity)
+        self.damage = np.zeros(capacity, dtype=np.int32)
+        self.size = np.zeros(capacity, dtype=np.int32)
+        self.direction = np.zeros(capacity, dtype=np.int32)
+        self.time_left = np.zeros(capacity)
+
+        self.frames: dict[tuple[int, int], pygame.Surface] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get_arrays(self) -> tuple[np.ndarray, ...]:
+        return tuple(getattr(self, name) for name in self.fields)
+
+    def grow(self) -> None:
+        """Double the capacity of every array"""
+
+        for name in self.fields:
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate((array, np.zeros_like(array))))
+
+    def clear(self) -> None:
+        self.count = 0
+
+    def spawn(self, coords: tuple[float, float], speed: float, angle: float,
+              weight: float, size: int) -> None:
+        """Shoot a bullet"""
+
+        if self.count == len(self.x):
+            self.grow()
+        index = self.count
+        self.x[index], self.y[index] = coords
+        self.prev_x[index], self.prev_y[index] = coords
+        self.speed_x[index] = cos(angle) * speed
+        self.speed_y[index] = sin(angle) * speed
+        self.weight[index] = weight
+        self.damage[index] = maths.calculate_damage(speed, size)
+        self.size[index] = size
+        self.direction[index] = round(angle / tau * self.directions) % self.directions
+        self.time_left[index] = self.lifetime
+        self.count += 1
+
+    def remove(self, dead: np.ndarray) -> None:
+        """Swap-remove bullets by a mask of `count` length.\n
+        Holes are filled with alive bullets from the tail in one step"""
+
+        new_count = self.count - int(np.count_nonzero(dead))
+        holes = np.flatnonzero(dead[:new_count])
+        movers = np.flatnonzero(~dead[new_count:]) + new_count
+        for array in self.get_arrays():
+            array[holes] = array[movers]
+        self.count = new_count
+
+    def get_frame(self, size: int, direction: int) -> pygame.Surface:
+        """Get a scaled and rotated bullet sprite"""
+
+        if (size, direction) not in self.frames:
+            self.frames[size, direction] = images.load(
+                self.sprite_path, (size, size),
+                rotation=-degrees(direction * tau / self.directions))
+        return self.frames[size, direction]
+
+    def move(self, map_terrain: TileGrid, dt: int) -> np.ndarray:
+        """Move all bullets and return a mask of ones which hit terrain.\n
+        Centers of bullets are ray cast through the map, so fast bullets
+        don't tunnel and stop right at the wall"""
+
+        count = self.count
+        x, y = self.x[:count], self.y[:count]
+        speed_x, speed_y = self.speed_x[:count], self.speed_y[:count]
+        half_size = self.size[:count] / 2
+        time, *_, tiles = ray_cast(x + half_size, y + half_size,
+                                   speed_x * dt, speed_y * dt, map_terrain)
+        hit = tiles != 0
+        x += speed_x * dt * time
+        y += speed_y * dt * time
+        speed_y += np.where(hit, 0, GRAVITY * self.weight[:count] * dt)
+        self.time_left[:count] -= dt
+        return hit
+
+    def hit_entities(self, targets: SpatialHash, free: np.ndarray) -> np.ndarray:
+        """Damage entities touched by free bullets, returns mask of used bullets"""
+
+        count = self.count
+        x, y, size = self.x[:count], self.y[:count], self.size[:count]
+        used = np.zeros(count, dtype=bool)
+        cell_size = targets.cell_size
+        cells = set(zip((x // cell_size).astype(np.intp).tolist(),
+                        (y // cell_size).astype(np.intp).tolist()))
+        cells.update(zip(((x + size) // cell_size).astype(np.intp).tolist(),
+                         ((y + size) // cell_size).astype(np.intp).tolist()))
+        # By registry index, entities are hit in its order so that a bullet
+        # touching several of them hits the same one in every run
+        candidates = {}
+        for cell in cells:
+            for entity in targets.cells.get(cell, ()):
+                candidates[entity.index] = entity
+
+        for index in sorted(candidates):
+            entity = candidates[index]
+            width, height = entity.get_size()
+            touched = free & ~used\
+                & (x <= entity.x + width) & (x + size >= entity.x)\
+                & (y <= entity.y + height) & (y + size >= entity.y)
+            if touched.any():
+                entity.take_damage(int(self.damage[:count][touched].sum()))
+                used |= touched
+        return used
+
+    def update(self, map_terrain: TileGrid, camera: Camera,
+               dt: int, targets: SpatialHash) -> None:
+        if not self.count:
+            return
+        self.prev_x[:self.count] = self.x[:self.count]
+        self.prev_y[:self.count] = self.y[:self.count]
+        hit_terrain = self.move(map_terrain, dt)
+        count = self.count
+        x, y = self.x[:count], self.y[:count]
+        outside = (x < 0) | (x >= map_terrain.width * TILESIZE)\
+            | (y < 0) | (y >= map_terrain.height * TILESIZE)
+        hit_entities = self.hit_entities(targets, ~hit_terrain & ~outside)
+
+        effects.particles["spark"].emit_many(x[hit_terrain], y[hit_terrain])
+
+        dead = hit_terrain | hit_entities | outside\
+            | (self.time_left[:count] <= 0)
+        if dead.any():
+            self.remove(dead)
+        self.draw(camera)
+
+    def draw(self, camera: Camera, alpha: float = 1) -> None:
+        """Draw bullets which are in view of the camera, with `alpha` below 1
+        between their previous and current positions"""
+
+        if camera.surface is None:
+            return
+        count = self.count
+        x, y, size = self.x[:count], self.y[:count], self.size[:count]
+        if alpha != 1:
+            prev_x, prev_y = self.prev_x[:count], self.prev_y[:count]
+            x, y = prev_x + (x - prev_x) * alpha, prev_y + (y - prev_y) * alpha
+        # Rotated sprites are up to `size * sqrt(2)` wide
+        visible = camera.cull(x, y, size * 2, size * 2)
+        get_frame = self.get_frame
+        camera.queue.extend(
+            [(get_frame(size, direction), (x, y)) for x, y, size, direction
+             in zip((x[visible] - camera.x).tolist(),
+                    (y[visible] - camera.y).tolist(),
+                    size[visible].tolist(),
+                    self.direction[:count][visible].tolist())],
+            PROJECTILES)
+
+
+BULLET_SPRITE = "weapons/bullet.png"
+# Bullets of the current state, see `State`
+bullets = BulletPool(BULLET_SPRITE)
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+# Components, an entity has a mask of them
+POSITION = 1   # x, y, size and eyes
+HEALTH = 2     # health and alive flag
+SPRITE = 4     # animation of a sprite sheet
+VELOCITY = 8   # speed, weight and collisions with the map
+AI = 16        # chasing and attacking enemies
+
+
+class Registry:
+    """Entities stored as columns of component arrays (structure of arrays),
+    so systems can process a whole batch of entities in one pass.\n
+    Entities are referred by generational ids: the slot index in the low
+    `index_bits` and the generation of the slot above them. A slot is reused
+    by a newer generation after its entity is destroyed, so old ids become
+    invalid instead of pointing to another entity"""
+
+    index_bits = 20
+    fields = {
+        # Position
+        "x": np.float64, "y": np.float64,
+        "width": np.int64, "height": np.int64,
+        "eyes_x": np.float64, "eyes_y": np.float64,
+        "prev_x": np.float64, "prev_y": np.float64,  # At the start of a tick
+        # Health
+        "health": np.int64, "max_health": np.int64, "alive": np.bool_,
+        # Sprite
+        "frame_col": np.int64, "frame_row": np.int64,
+        "frame_time": np.float64, "frame_delay": np.float64,
+        "sheet_cols": np.int64, "sheet_rows": np.int64,
+        "cycle": np.int64, "cycles": np.int64,
+        # Velocity
+        "speed_x": np.float64, "speed_y": np.float64,
+        "max_speed": np.float64, "acceleration": np.float64,
+        "weight": np.float64, "jump_strength": np.float64,
+        "on_ground": np.bool_,
+        "collided_x": (np.float64, 3), "collided_y": (np.float64, 3),
+        # AI
+        "vision_range": np.float64, "attack_range": np.float64,
+        "attack_delay": np.float64, "attack_damage": np.int64,
+        "attack_time": np.float64,
+    }
+
+    def __init__(self, capacity: int = 256) -> None:
+        self.used = 0  # Slots below are taken or on the free list
+        self.free: list[int] = []
+        self.generation = np.zeros(capacity, dtype=np.int64)
+        self.components = np.zeros(capacity, dtype=np.uint8)
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+        for name, dtype in self.fields.items():
+            shape = (capacity,) if not isinstance(dtype, tuple) else (capacity, dtype[1])
+            setattr(self, name, np.zeros(
+                shape, dtype=dtype if not isinstance(dtype, tuple) else dtype[0]))
+        # Python objects (facades) of entities, for sheets and custom behavior
+        self.objects: list = [None] * capacity
+
+    def __len__(self) -> int:
+        return self.used - len(self.free)
+
+    def grow(self) -> None:
+        """Double the capacity"""
+
+        for name in ("generation", "components", "kind", *self.fields):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate((array, np.zeros_like(array))))
+        self.objects.extend([None] * len(self.objects))
+
+    def create(self, entity, components: int) -> int:
+        """Take a slot for an entity, all its columns start zeroed.
+        Returns the id of the entity"""
+
+        if self.free:
+            index = self.free.pop()
+        else:
+            if self.used == len(self.components):
+                self.grow()
+            index = self.used
+            self.used += 1
+        for name in self.fields:
+            getattr(self, name)[index] = 0
+        self.components[index] = components
+        self.kind[index] = 0
+        self.objects[index] = entity
+        return self.get_id(index)
+
+    def destroy(self, entity_id: int) -> None:
+        index = self.get_index(entity_id)
+        self.generation[index] += 1
+        self.components[index] = 0
+        self.kind[index] = 0
+        self.objects[index] = None
+        self.free.append(index)
+
+    def get_id(self, index: int) -> int:
+        return int(self.generation[index]) << self.index_bits | index
+
+    def get_index(self, entity_id: int) -> int:
+        """Slot of an entity, raises `KeyError` if the entity was destroyed"""
+
+        index = entity_id & ((1 << self.index_bits) - 1)
+        if index >= self.used or not self.components[index]\
+                or self.generation[index] != entity_id >> self.index_bits:
+            raise KeyError(f"Entity {entity_id} doesn't exist")
+        return index
+
+    def is_valid(self, entity_id: int) -> bool:
+        index = entity_id & ((1 << self.index_bits) - 1)
+        return index < self.used and bool(self.components[index])\
+            and self.generation[index] == entity_id >> self.index_bits
+
+    def store_positions(self) -> None:
+        """Remember positions before a tick, rendering interpolates from them"""
+
+        self.prev_x[:self.used] = self.x[:self.used]
+        self.prev_y[:self.used] = self.y[:self.used]
+
+    def select(self, components: int = 0, kind: int = None) -> np.ndarray:
+        """Slots of entities which have all the components (and are of the
+        kind), in slot order"""
+
+        if kind and not components:
+            # Destroyed slots have no kind
+            return np.flatnonzero(self.kind[:self.used] == kind)
+        mask = (self.components[:self.used] & components) == components
+        mask &= self.components[:self.used] != 0
+        if kind is not None:
+            mask &= self.kind[:self.used] == kind
+        return np.flatnonzero(mask)
+
+    def clear(self) -> None:
+        # Ids of the old entities must not match the new ones
+        self.generation[:self.used] += 1
+        self.used = 0
+        self.free.clear()
+        self.components[:] = 0
+        self.kind[:] = 0
+        self.objects = [None] * len(self.objects)
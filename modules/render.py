@@ -0,0 +1,99 @@
+import pygame
+from modules.parameters.options import screen_res
+
+
+# Layers of the world, lower ones are drawn first
+TERRAIN, PROJECTILES, EFFECTS, ENTITIES = range(4)
+
+
+class RenderQueue:
+    """Blit commands `(source, dest, area)` collected over a frame by layer.\n
+    Rendering is deferred to `flush`, which blits each layer with one
+    `Surface.blits` call. Commands of a layer keep the order of submission"""
+
+    def __init__(self) -> None:
+        self.layers: dict[int, list[tuple]] = {}
+
+    def __len__(self) -> int:
+        return sum(map(len, self.layers.values()))
+
+    def submit(self, source: pygame.Surface, dest: tuple[float, float],
+               area: tuple = None, layer: int = ENTITIES) -> None:
+        commands = self.layers.get(layer)
+        if commands is None:
+            commands = self.layers[layer] = []
+        commands.append((source, dest, area))
+
+    def extend(self, sequence, layer: int = ENTITIES) -> None:
+        """Submit many `(source, dest, area)` commands of a layer"""
+
+        commands = self.layers.get(layer)
+        if commands is None:
+            commands = self.layers[layer] = []
+        commands.extend(sequence)
+
+    def flush(self, surface: pygame.Surface) -> None:
+        """Draw all commands, lowest layer first, and empty the queue"""
+
+        for layer in sorted(self.layers):
+            surface.blits(self.layers[layer], doreturn=False)
+        self.layers.clear()
+
+    def clear(self) -> None:
+        self.layers.clear()
+
+
+class DirtyRects:
+    """Areas of the screen changed in a frame, presented with
+    `pygame.display.update` instead of flipping the whole screen.\n
+    Overlays (widgets drawn over everything) are redrawn whole, so an area
+    which touches one grows by its rect. When changes cover most of the
+    screen a full flip is done instead"""
+
+    def __init__(self, size: tuple[int, int] = screen_res,
+                 flip_ratio: float = 0.5) -> None:
+        self.screen_rect = pygame.Rect(0, 0, *size)
+        self.flip_ratio = flip_ratio
+        self.rects: list[pygame.Rect] = []
+        self.overlays: list[pygame.Rect] = []
+        self.full = True
+
+    def set_overlays(self, rects) -> None:
+        """Set rects of overlays, the next frame is redrawn in full"""
+
+        self.overlays = [pygame.Rect(rect) for rect in rects]
+        self.add_all()
+
+    def add(self, rect) -> None:
+        if self.full:
+            return
+        rect = self.screen_rect.clip(rect)
+        if not rect.w or not rect.h:
+            return
+        self.rects.append(rect)
+        for index in rect.collidelistall(self.overlays):
+            self.rects.append(self.screen_rect.clip(self.overlays[index]))
+
+    def add_all(self) -> None:
+        self.full = True
+
+    def collides(self, rect) -> bool:
+        return self.full or pygame.Rect(rect).collidelist(self.rects) != -1
+
+    def get_rects(self) -> list[pygame.Rect]:
+        """Areas to redraw this frame"""
+        return [self.screen_rect] if self.full else self.rects
+
+    def present(self) -> None:
+        """Show changed areas on the display and start a new frame"""
+
+        if self.full or sum(rect.w * rect.h for rect in self.rects)\
+                > self.flip_ratio * self.screen_rect.w * self.screen_rect.h:
+            pygame.display.flip()
+        elif self.rects:
+            pygame.display.update(self.rects)
+        self.rects = []
+        self.full = False
+
+
+dirty_rects = DirtyRects()
@@ -0,0 +1,153 @@
+from struct import Struct
+from modules.binary import read_varint, unzigzag, write_varint, zigzag
+
+
+# Recording is a header and frames. A frame starts with a byte of flags of
+# what changed since the previous frame, only changes follow it. Frames
+# where nothing changed are stored as a run: a zero byte and a count.
+# A recording started from a snapshot has it in the header
+MAGIC = b"RPL2"
+KEYS, BUTTONS, MOUSE, DT, CHECKSUM, WHOLE_DT = 1, 2, 4, 8, 16, 32
+dt_struct = Struct("<d")
+checksum_struct = Struct("<I")
+
+
+class Recorder:
+    """Input of game frames in a compact binary stream.\n
+    `checksum` is called every `checksum_interval` frames, its value of the
+    game state is stored to verify replays. `snapshot` is the bytes of the
+    state the recording starts from, if it isn't the start of the level"""
+
+    def __init__(self, level_name: str, checksum=None,
+                 checksum_interval: int = 60, snapshot: bytes = b"") -> None:
+        self.checksum = checksum
+        self.checksum_interval = checksum_interval
+        self.frames = 0
+        self.stream = bytearray(MAGIC)
+        name = level_name.encode("utf-8")
+        write_varint(self.stream, len(name))
+        self.stream += name
+        write_varint(self.stream, checksum_interval)
+        write_varint(self.stream, len(snapshot))
+        self.stream += snapshot
+        self.last = (), 0, (0, 0), None  # Keys, buttons, mouse pos, dt
+        self.repeat = 0  # Unchanged frames which aren't written yet
+
+    def record(self, keyboard_keys: set, mouse_buttons: set,
+               mouse_pos: tuple[int, int], dt: float) -> None:
+        """Add a frame, called after the frame is simulated"""
+
+        keys = tuple(sorted(keyboard_keys))
+        buttons = sum(1 << button for button in mouse_buttons)
+        last_keys, last_buttons, last_mouse, last_dt = self.last
+        self.frames += 1
+        checksum = self.checksum is not None\
+            and self.frames % self.checksum_interval == 0
+
+        flags = (KEYS if keys != last_keys else 0)\
+            | (BUTTONS if buttons != last_buttons else 0)\
+            | (MOUSE if mouse_pos != last_mouse else 0)\
+            | (CHECKSUM if checksum else 0)
+        if dt != last_dt:
+            # Milliseconds of the clock are whole, they take a byte or two
+            flags |= WHOLE_DT if dt >= 0 and float(dt).is_integer() else DT
+        if not flags:
+            self.repeat += 1
+            return
+        self.flush()
+        stream = self.stream
+        stream.append(flags)
+        if flags & KEYS:
+            write_varint(stream, len(keys))
+            previous = 0
+            for key in keys:  # Sorted, so differences are small
+                write_varint(stream, key - previous)
+                previous = key
+        if flags & BUTTONS:
+            write_varint(stream, buttons)
+        if flags & MOUSE:
+            write_varint(stream, zigzag(int(mouse_pos[0]) - int(last_mouse[0])))
+            write_varint(stream, zigzag(int(mouse_pos[1]) - int(last_mouse[1])))
+        if flags & WHOLE_DT:
+            write_varint(stream, int(dt))
+        elif flags & DT:
+            stream += dt_struct.pack(dt)
+        if flags & CHECKSUM:
+            stream += checksum_struct.pack(self.checksum())
+        self.last = keys, buttons, tuple(mouse_pos), dt
+
+    def flush(self) -> None:
+        """Write the run of unchanged frames"""
+
+        if self.repeat:
+            self.stream.append(0)
+            write_varint(self.stream, self.repeat)
+            self.repeat = 0
+
+    def get_bytes(self) -> bytes:
+        self.flush()
+        return bytes(self.stream)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as file:
+            file.write(self.get_bytes())
+
+
+class Recording:
+    """Recorded stream read back frame by frame"""
+
+    def __init__(self, data: bytes) -> None:
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a recording")
+        length, offset = read_varint(data, len(MAGIC))
+        self.level_name = data[offset:offset + length].decode("utf-8")
+        self.checksum_interval, offset = read_varint(data, offset + length)
+        length, offset = read_varint(data, offset)
+        self.snapshot = data[offset:offset + length]  # Empty if there is none
+        self.offset = offset + length
+        self.data = data
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        with open(path, "rb") as file:
+            return cls(file.read())
+
+    def __iter__(self):
+        """Frames `(keyboard_keys, mouse_buttons, mouse_pos, dt, checksum)`,
+        the checksum is None in frames without one"""
+
+        data, offset = self.data, self.offset
+        keys, buttons, mouse_pos, dt = set(), set(), (0, 0), None
+        while offset < len(data):
+            flags = data[offset]
+            offset += 1
+            if not flags:
+                repeat, offset = read_varint(data, offset)
+                for frame in range(repeat):
+                    yield keys, buttons, mouse_pos, dt, None
+                continue
+            if flags & KEYS:
+                count, offset = read_varint(data, offset)
+                keys, key = set(), 0
+                for index in range(count):
+                    difference, offset = read_varint(data, offset)
+                    key += difference
+                    keys.add(key)
+            if flags & BUTTONS:
+                mask, offset = read_varint(data, offset)
+                buttons = {button for button in range(mask.bit_length())
+                           if mask >> button & 1}
+            if flags & MOUSE:
+                dx, offset = read_varint(data, offset)
+                dy, offset = read_varint(data, offset)
+                mouse_pos = mouse_pos[0] + unzigzag(dx), mouse_pos[1] + unzigzag(dy)
+            if flags & WHOLE_DT:
+                dt, offset = read_varint(data, offset)
+            elif flags & DT:
+                dt, = dt_struct.unpack_from(data, offset)
+                offset += dt_struct.size
+            checksum = None
+            if flags & CHECKSUM:
+                checksum, = checksum_struct.unpack_from(data, offset)
+                offset += checksum_struct.size
+            yield keys, buttons, mouse_pos, dt, checksum
@@ -0,0 +1,120 @@
+import pygame
+from modules import entities
+from modules.level import World
+from modules.loader import LevelLoader
+from modules.state import State
+
+
+def new_player(coords: tuple[float, float]) -> entities.Player:
+    return entities.Player(coords=coords, max_health=100, max_speed=0.7,
+                           acceleration=0.01, weight=1, jump_strength=1.5)
+
+
+def control(player: entities.Player, keyboard_keys: set, mouse_buttons: set,
+            target: tuple[float, float], dt: float) -> None:
+    """Apply input to a player, `target` is the aim in world coordinates"""
+
+    if pygame.K_w in keyboard_keys:
+        player.jump()
+    if pygame.K_a in keyboard_keys:
+        player.move_left(dt)
+    if pygame.K_d in keyboard_keys:
+        player.move_right(dt)
+    if pygame.K_1 in keyboard_keys:
+        player.change_slot(0)
+    if pygame.K_2 in keyboard_keys:
+        player.change_slot(1)
+    if pygame.K_3 in keyboard_keys:
+        player.change_slot(2)
+    if pygame.K_4 in keyboard_keys:
+        player.change_slot(3)
+    if pygame.K_5 in keyboard_keys:
+        player.change_slot(4)
+
+    if pygame.BUTTON_LEFT in mouse_buttons:
+        player.attack(target)
+
+
+class Session:
+    """Players in a world, simulated in a state of their own. The level
+    changes for all of them when one enters a level change trigger ("CL").\n
+    The game plays a session, the server runs one for every group of
+    clients and the batch runner one for every environment. With a
+    `loader` levels next to the current one are loaded in the background,
+    otherwise a level is loaded when it is entered"""
+
+    def __init__(self, level_name: str, loader: LevelLoader = None) -> None:
+        self.state = State()
+        self.loader = loader
+        self.world: World = None
+        self.players: list[entities.Player] = []
+        # Level to change to at the start of the next tick
+        self.pending_level: str = None
+        self.levels = 0  # Level changes since the start
+        self.enter_level(level_name)
+
+    def enter_level(self, level_name: str) -> None:
+        """Start a world in the state, players go to its spawn"""
+
+        self.world = self.loader.get(level_name) if self.loader\
+            else World(level_name)
+        self.world.start(self.state)
+        self.world.triggers.on("CL", self.on_change_level)
+        self.pending_level = None
+        for player in self.players:
+            player.x, player.y = self.world.spawn
+            player.snap()
+        if self.loader:
+            self.loader.prefetch(self.world.info["next"], self.world.info["prev"])
+
+    def on_change_level(self, event: int, entity: entities.Entity, region) -> None:
+        self.pending_level = self.world.info["next"]
+        if self.loader:
+            self.loader.load(self.pending_level)
+
+    def add_player(self) -> entities.Player:
+        """New player on the spawn"""
+
+        self.state.activate()
+        player = new_player(self.world.spawn)
+        self.players.append(player)
+        return player
+
+    def remove_player(self, player: entities.Player) -> None:
+        self.players.remove(player)
+        self.state.registry.destroy(player.id)
+
+    def begin_tick(self, surface: pygame.Surface, dt: float) -> None:
+        """First part of a tick: the level changes if it was asked to and the
+        world is updated. Players are controlled after it.\n
+        Nothing is drawn when `surface` is None"""
+
+        self.state.activate()
+        if self.pending_level:
+            self.enter_level(self.pending_level)
+            self.levels += 1
+        self.world.update(surface, dt, self.players[0], self.players[1:])
+
+    def end_tick(self, dt: float) -> None:
+        """Last part of a tick: players move and their triggers fire"""
+
+        for player in self.players:
+            player.update(self.world.matrix_terrain, self.world.camera, dt)
+        self.world.triggers.update(self.players)
+        self.world.camera.render()
+
+    def tick(self, inputs: list[tuple[set, set, tuple]], dt: float) -> None:
+        """Tick without drawing, with an input of every player as
+        `(keyboard_keys, mouse_buttons, aim)`. The aim is relative to the
+        eyes of the player"""
+
+        self.begin_tick(None, dt)
+        for player, (keyboard_keys, mouse_buttons, aim) in zip(self.players, inputs):
+            eyes = player.eyes
+            control(player, keyboard_keys, mouse_buttons,
+                    (eyes[0] + aim[0], eyes[1] + aim[1]), dt)
+        self.end_tick(dt)
+
+    def close(self) -> None:
+        if self.loader:
+            self.loader.shutdown()
@@ -0,0 +1,308 @@
+import numpy as np
+from zlib import crc32
+from modules import effects, entities
+from modules.binary import read_varint, write_varint
+from modules.tiles import TileGrid
+
+
+MAGIC = b"SNP1"
+DELTA_MAGIC = b"SND1"
+# Sections of a delta: whole arrays, changed rows, sections which are gone
+FULL, SPARSE, REMOVED = range(3)
+LAYERS = "terrain", "entities", "triggers"
+
+
+def write_header(stream: bytearray, name: str, array: np.ndarray) -> None:
+    for text in (name, array.dtype.str):
+        encoded = text.encode("utf-8")
+        write_varint(stream, len(encoded))
+        stream += encoded
+    write_varint(stream, array.ndim)
+    for size in array.shape:
+        write_varint(stream, size)
+
+
+def read_header(data: bytes, offset: int) -> tuple[str, np.dtype, tuple, int]:
+    """Name, dtype and shape of a section, and the offset after them"""
+
+    texts = []
+    for text in range(2):
+        length, offset = read_varint(data, offset)
+        texts.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    ndim, offset = read_varint(data, offset)
+    shape = []
+    for axis in range(ndim):
+        size, offset = read_varint(data, offset)
+        shape.append(size)
+    return texts[0], np.dtype(texts[1]), tuple(shape), offset
+
+
+def read_array(data: bytes, offset: int, dtype: np.dtype,
+               shape: tuple) -> tuple[np.ndarray, int]:
+    size = int(np.prod(shape)) * dtype.itemsize
+    array = np.frombuffer(data, dtype, int(np.prod(shape)), offset).reshape(shape)
+    return array.copy(), offset + size
+
+
+def get_rows(array: np.ndarray) -> np.ndarray:
+    """Bytes of an array by rows, NaNs compare equal this way"""
+    return np.ascontiguousarray(array).reshape(len(array), -1).view(np.uint8)
+
+
+class Snapshot:
+    """State as named NumPy arrays.\n
+    `to_bytes` packs them in a compact binary form, `diff` stores only
+    rows which changed since a base snapshot and `patch` applies them"""
+
+    def __init__(self, sections: dict[str, np.ndarray] = None) -> None:
+        self.sections = {} if sections is None else sections
+        self.checksum: int = None
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.sections[name]
+
+    def __setitem__(self, name: str, array: np.ndarray) -> None:
+        self.sections[name] = np.ascontiguousarray(array)
+        self.checksum = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def get_text(self, name: str) -> str:
+        return self.sections[name].tobytes().decode("utf-8")
+
+    def set_text(self, name: str, text: str) -> None:
+        self[name] = np.frombuffer(text.encode("utf-8"), np.uint8)
+
+    def to_bytes(self) -> bytes:
+        stream = bytearray(MAGIC)
+        for name, array in self.sections.items():
+            write_header(stream, name, array)
+            stream += array.tobytes()
+        return bytes(stream)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Snapshot":
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a snapshot")
+        snapshot = cls()
+        offset = len(MAGIC)
+        while offset < len(data):
+            name, dtype, shape, offset = read_header(data, offset)
+            snapshot.sections[name], offset = read_array(data, offset, dtype, shape)
+        return snapshot
+
+    def get_checksum(self) -> int:
+        if self.checksum is None:
+            self.checksum = crc32(self.to_bytes())
+        return self.checksum
+
+    def diff(self, base: "Snapshot") -> bytes:
+        """Delta against a base. Unchanged sections are skipped, sections of
+        the same shape store only changed rows when there are few of them"""
+
+        stream = bytearray(DELTA_MAGIC)
+        stream += base.get_checksum().to_bytes(4, "little")
+        for name in base.sections.keys() - self.sections.keys():
+            stream.append(REMOVED)
+            write_header(stream, name, base.sections[name])
+        for name, array in self.sections.items():
+            base_array = base.sections.get(name)
+            if base_array is not None and base_array.dtype == array.dtype\
+                    and base_array.shape == array.shape:
+                if not len(array):
+                    continue
+                rows = get_rows(array)
+                changed = np.flatnonzero((rows != get_rows(base_array)).any(axis=1))
+                if not len(changed):
+                    continue
+                if len(changed) * 2 < len(array):
+                    stream.append(SPARSE)
+                    write_header(stream, name, array)
+                    write_varint(stream, len(changed))
+                    stream += changed.astype(np.uint32).tobytes()
+                    stream += np.ascontiguousarray(array[changed]).tobytes()
+                    continue
+            stream.append(FULL)
+            write_header(stream, name, array)
+            stream += array.tobytes()
+        return bytes(stream)
+
+    def patch(self, delta: bytes) -> "Snapshot":
+        """Snapshot which the delta was made of, this one is its base"""
+
+        if delta[:len(DELTA_MAGIC)] != DELTA_MAGIC:
+            raise ValueError("Not a delta snapshot")
+        offset = len(DELTA_MAGIC)
+        if int.from_bytes(delta[offset:offset + 4], "little") != self.get_checksum():
+            raise ValueError("Delta was made against another base")
+        offset += 4
+        sections = dict(self.sections)
+        while offset < len(delta):
+            kind = delta[offset]
+            name, dtype, shape, offset = read_header(delta, offset + 1)
+            if kind == REMOVED:
+                del sections[name]
+            elif kind == FULL:
+                sections[name], offset = read_array(delta, offset, dtype, shape)
+            else:
+                count, offset = read_varint(delta, offset)
+                changed, offset = read_array(delta, offset, np.dtype(np.uint32), (count,))
+                rows, offset = read_array(delta, offset, dtype, (count, *shape[1:]))
+                array = sections[name].copy()
+                array[changed] = rows
+                sections[name] = array
+        return Snapshot(sections)
+
+
+def capture_pool(snapshot: Snapshot, prefix: str, pool) -> None:
+    """Active part of a structure of arrays pool (bullets or particles)"""
+
+    for name in pool.fields:
+        snapshot[prefix + name] = getattr(pool, name)[:pool.count].copy()
+
+
+def restore_pool(snapshot: Snapshot, prefix: str, pool) -> None:
+    count = len(snapshot[prefix + pool.fields[0]])
+    pool.count = 0
+    if isinstance(pool, effects.Emitter):
+        pool.grow(count)
+    else:
+        while len(pool.x) < count:
+            pool.grow()
+    for name in pool.fields:
+        getattr(pool, name)[:count] = snapshot[prefix + name]
+    pool.count = count
+
+
+def capture(world, player) -> Snapshot:
+    """Snapshot of a world and the player: layers, the registry with facades
+    of entities, bullets, particles and what the world keeps of them"""
+
+    snapshot = Snapshot()
+    snapshot.set_text("level", world.path)
+    for layer in LAYERS:
+        matrix = getattr(world, "matrix_" + layer)
+        if type(matrix) is TileGrid:  # Streamed layers are read only
+            snapshot[f"{layer}.tiles"] = np.frombuffer(matrix.tiles, np.uint8)\
+                .reshape(matrix.height, matrix.width).copy()
+            snapshot.set_text(f"{layer}.palette", "\n".join(matrix.palette))
+
+    registry = world.state.registry
+    used = registry.used
+    snapshot["registry.free"] = np.array(registry.free, dtype=np.int64)
+    for name in ("generation", "components", "kind", *registry.fields):
+        snapshot["registry." + name] = getattr(registry, name)[:used].copy()
+
+    # Facades are rebuilt from their class, sprite and rotation
+    strings = {}
+    facades = np.full((used, 2), -1, dtype=np.int32)  # Class and sprite path
+    colorkeys = np.full((used, 3), -1, dtype=np.int16)
+    rotations = np.zeros(used)
+    for index, entity in enumerate(registry.objects[:used]):
+        if entity is None:
+            continue
+        facades[index] = (strings.setdefault(type(entity).__name__, len(strings)),
+                          strings.setdefault(entity.sprite_path, len(strings)))
+        if entity.colorkey is not None:
+            colorkeys[index] = entity.colorkey[:3]
+        rotations[index] = entity.rotation
+    snapshot.set_text("facades.strings", "\n".join(strings))
+    snapshot["facades.names"] = facades
+    snapshot["facades.colorkey"] = colorkeys
+    snapshot["facades.rotation"] = rotations
+    snapshot["player.index"] = np.array([player.index])
+    snapshot["player.state"] = np.array(player.get_state(), dtype=np.float64)
+
+    capture_pool(snapshot, "bullets.", world.state.bullets)
+    for name, emitter in world.state.particles.emitters.items():
+        capture_pool(snapshot, f"particles.{name}.", emitter)
+
+    snapshot["world.spawned_chunks"] = np.array(
+        sorted(world.spawned_chunks), dtype=np.int64).reshape(-1, 2)
+    # Regions are found by their chunk, which is compiled again if needed
+    region_keys = {region: (*chunk, index)
+                   for chunk, regions in world.triggers.chunks.items()
+                   for index, region in enumerate(regions)}
+    snapshot["world.inside"] = np.array(
+        [(entity_id, *region_keys[region])
+         for entity_id, regions in world.triggers.inside.items()
+         for region in regions], dtype=np.int64).reshape(-1, 4)
+    return snapshot
+
+
+def restore(snapshot: Snapshot, world, player) -> None:
+    """Put a world and the player back in the state of a snapshot of them.
+    Facades which still exist are reused, missing ones are rebuilt without
+    loading assets"""
+
+    if snapshot.get_text("level") != world.path:
+        raise ValueError(f"Snapshot of {snapshot.get_text('level')} "
+                         f"can't be restored in {world.path}")
+    for layer in LAYERS:
+        if f"{layer}.tiles" not in snapshot:
+            continue
+        matrix = getattr(world, "matrix_" + layer)
+        tiles = snapshot[f"{layer}.tiles"].tobytes()
+        palette = snapshot.get_text(f"{layer}.palette").split("\n")
+        if tiles != matrix.tiles[:] or palette != matrix.palette:
+            matrix.tiles = bytearray(tiles)
+            matrix.palette = palette
+            matrix.ids = {code: tile for tile, code in enumerate(palette)}
+            matrix.update_tables()
+            if layer == "terrain":
+                world.terrain_area = None
+                world.mini_map.redraw(matrix, (0, 0, matrix.width, matrix.height))
+
+    registry = world.state.registry
+    used = len(snapshot["registry.generation"])
+    while len(registry.components) < used:
+        registry.grow()
+    registry.used = used
+    registry.free = snapshot["registry.free"].tolist()
+    for name in ("generation", "components", "kind", *registry.fields):
+        getattr(registry, name)[:used] = snapshot["registry." + name]
+    registry.components[used:] = 0
+    registry.kind[used:] = 0
+
+    strings = snapshot.get_text("facades.strings").split("\n")
+    player_index = int(snapshot["player.index"][0])
+    objects = registry.objects
+    for index, (names, colorkey, rotation) in enumerate(zip(
+            snapshot["facades.names"].tolist(), snapshot["facades.colorkey"].tolist(),
+            snapshot["facades.rotation"].tolist())):
+        if index == player_index:
+            objects[index] = player
+            player.index, player.id = index, registry.get_id(index)
+            continue
+        if names[0] < 0:
+            objects[index] = None
+            continue
+        class_name, sprite_path = strings[names[0]], strings[names[1]]
+        colorkey = None if colorkey[0] < 0 else tuple(colorkey)
+        entity = objects[index]
+        if entity is not None and entity is not player\
+                and type(entity).__name__ == class_name\
+                and entity.sprite_path == sprite_path\
+                and (entity.colorkey and tuple(entity.colorkey[:3])) == colorkey\
+                and entity.rotation == rotation:
+            entity.id = registry.get_id(index)
+        else:
+            objects[index] = getattr(entities, class_name).restore(
+                index, sprite_path, colorkey, rotation)
+    objects[used:] = [None] * (len(objects) - used)
+    player.set_state(snapshot["player.state"].tolist())
+
+    restore_pool(snapshot, "bullets.", world.state.bullets)
+    for name, emitter in world.state.particles.emitters.items():
+        if f"particles.{name}.x" in snapshot:
+            restore_pool(snapshot, f"particles.{name}.", emitter)
+
+    world.spawned_chunks = set(map(tuple, snapshot["world.spawned_chunks"].tolist()))
+    for chunk in world.spawned_chunks:
+        world.triggers.load_chunk(*chunk)
+    world.triggers.inside = {}
+    for entity_id, chunk_col, chunk_row, region_index in snapshot["world.inside"].tolist():
+        world.triggers.inside.setdefault(entity_id, set()).add(
+            world.triggers.load_chunk(chunk_col, chunk_row)[region_index])
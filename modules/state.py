@@ -0,0 +1,21 @@
+from modules import effects, entities, projectiles
+from modules.registry import Registry
+
+
+class State:
+    """What worlds simulate: the registry of entities, bullets and
+    particles. Every session has its own, so several of them can run in
+    one process.\n
+    Facades of entities, weapons and effects use the current state through
+    `entities.registry`, `projectiles.bullets` and `effects.particles`,
+    `activate` makes a state current before it is simulated"""
+
+    def __init__(self) -> None:
+        self.registry = Registry()
+        self.bullets = projectiles.BulletPool(projectiles.BULLET_SPRITE)
+        self.particles = effects.make_particles()
+
+    def activate(self) -> None:
+        entities.registry = self.registry
+        projectiles.bullets = self.bullets
+        effects.particles = self.particles
@@ -0,0 +1,236 @@
+import numpy as np
+from modules.camera import Camera
+from modules.render import ENTITIES
+from modules.physics import sweep, sweep_many
+from modules.registry import Registry
+from modules.tiles import TileGrid
+from modules.parameters.options import TILESIZE, GRAVITY
+
+
+# Systems update a batch of registry slots in one pass, doing what the
+# methods of entity classes did for a single entity
+
+# Below this batch size NumPy overhead costs more than a Python loop
+SMALL_BATCH = 8
+
+
+def draw(registry: Registry, indices: np.ndarray, surface,
+         alpha: float = 1, layer: int = ENTITIES) -> None:
+    """Blit current frames of sprite sheets at entities' positions.
+    Through a camera, entities out of view are culled in one pass and the
+    blits are queued on the layer.\n
+    With `alpha` below 1 positions are interpolated from the previous tick"""
+
+    x, y = registry.x[indices], registry.y[indices]
+    if alpha != 1:
+        prev_x, prev_y = registry.prev_x[indices], registry.prev_y[indices]
+        x, y = prev_x + (x - prev_x) * alpha, prev_y + (y - prev_y) * alpha
+    width, height = registry.width[indices], registry.height[indices]
+    if isinstance(surface, Camera):
+        camera = surface
+        if camera.surface is None:
+            return
+        visible = camera.cull(x, y, width, height)
+        indices, width, height = indices[visible], width[visible], height[visible]
+        x, y = x[visible] - camera.x, y[visible] - camera.y
+    objects = registry.objects
+    sequence = [
+        (objects[index].sheet, (x, y), (col * w, row * h, w, h))
+        for index, x, y, col, row, w, h in zip(
+            indices.tolist(), x.tolist(), y.tolist(),
+            registry.frame_col[indices].tolist(),
+            registry.frame_row[indices].tolist(), width.tolist(), height.tolist())]
+    if isinstance(surface, Camera):
+        surface.queue.extend(sequence, layer)
+    else:
+        surface.blits(sequence, doreturn=False)
+
+
+def animate(registry: Registry, indices: np.ndarray, dt: float) -> None:
+    """Advance sprite sheet animations, sprites which played all their
+    cycles die"""
+
+    if not len(indices):
+        return
+    time = registry.frame_time[indices] + dt
+    advance = time >= registry.frame_delay[indices]
+    time[advance] = 0
+    col = registry.frame_col[indices] + advance
+    wrap = col == registry.sheet_cols[indices]
+    col[wrap] = 0
+    row = registry.frame_row[indices] + wrap
+    row[row == registry.sheet_rows[indices]] = 0
+    registry.frame_time[indices] = time
+    registry.frame_col[indices] = col
+    registry.frame_row[indices] = row
+
+    cycle = registry.cycle[indices] + ((col == 0) & (row == 0) & (time == 0))
+    registry.cycle[indices] = cycle
+    registry.alive[indices[cycle == registry.cycles[indices]]] = False
+
+
+def check_health(registry: Registry, indices: np.ndarray) -> None:
+    if not len(indices):
+        return
+    registry.alive[indices[registry.health[indices] <= 0]] = False
+
+
+def move(registry: Registry, indices: np.ndarray, map_terrain: TileGrid,
+         dt: float) -> None:
+    """Friction, gravity and collisions with the map"""
+
+    if len(indices) < SMALL_BATCH:
+        for index in indices.tolist():
+            move_one(registry, index, map_terrain, dt)
+        return
+    x, y = registry.x[indices], registry.y[indices]
+    width, height = registry.width[indices], registry.height[indices]
+    collided_y = registry.collided_y[indices]
+    speed_x = registry.speed_x[indices]\
+        * np.asarray(map_terrain.friction)[collided_y[:, 2].astype(np.int64)]
+    speed_y = registry.speed_y[indices]
+    on_ground = registry.on_ground[indices]
+    still = np.zeros(len(indices))
+
+    # X collision, the box is put against the hit tile
+    _, normal_x, _, cols, rows, tiles = sweep_many(
+        x, y, width, height, speed_x * dt, still, map_terrain)
+    hit = tiles != 0
+    x = np.where(hit, np.where(normal_x < 0, cols * TILESIZE - width,
+                               (cols + 1) * TILESIZE), x + speed_x * dt)
+    speed_x[hit] = 0
+    collided_x = np.stack((cols * TILESIZE, rows * TILESIZE, tiles), axis=1)
+
+    # Y collision
+    _, _, normal_y, cols, rows, tiles = sweep_many(
+        x, y, width, height, still, speed_y * dt, map_terrain)
+    hit = tiles != 0
+    down = normal_y < 0
+    y = np.where(hit, np.where(down, rows * TILESIZE - height,
+                               (rows + 1) * TILESIZE), y + speed_y * dt)
+    on_ground = np.where(hit, on_ground | down, False)
+    speed_y = np.where(hit, 0, speed_y + GRAVITY * registry.weight[indices] * dt)
+    collided_y = np.stack((cols * TILESIZE, rows * TILESIZE, tiles), axis=1)
+
+    registry.x[indices], registry.y[indices] = x, y
+    registry.speed_x[indices], registry.speed_y[indices] = speed_x, speed_y
+    registry.on_ground[indices] = on_ground
+    registry.collided_x[indices] = collided_x
+    registry.collided_y[indices] = collided_y
+    registry.eyes_x[indices] = x + width / 2
+    registry.eyes_y[indices] = y + height / 2
+
+
+def move_one(registry: Registry, index: int, map_terrain: TileGrid,
+             dt: float) -> None:
+    """`move` of a single entity without NumPy batching"""
+
+    x, y = registry.x[index].item(), registry.y[index].item()
+    width, height = registry.width[index].item(), registry.height[index].item()
+    speed_x = registry.speed_x[index].item()\
+        * map_terrain.friction[int(registry.collided_y[index, 2])]
+    speed_y = registry.speed_y[index].item()
+    on_ground = registry.on_ground[index].item()
+
+    # X collision, the box is put against the hit tile
+    _, normal_x, _, col, row, tile = sweep(x, y, width, height, speed_x * dt, 0,
+                                           map_terrain)
+    if tile:
+        x = col * TILESIZE - width if normal_x < 0 else (col + 1) * TILESIZE
+        speed_x = 0
+    else:
+        x += speed_x * dt
+    collided_x = col * TILESIZE, row * TILESIZE, tile
+
+    # Y collision
+    _, _, normal_y, col, row, tile = sweep(x, y, width, height, 0, speed_y * dt,
+                                           map_terrain)
+    if tile:
+        if normal_y < 0:
+            y = row * TILESIZE - height
+            on_ground = True
+        else:
+            y = (row + 1) * TILESIZE
+        speed_y = 0
+    else:
+        y += speed_y * dt
+        on_ground = False
+        speed_y += GRAVITY * registry.weight[index].item() * dt
+    collided_y = col * TILESIZE, row * TILESIZE, tile
+
+    registry.x[index], registry.y[index] = x, y
+    registry.speed_x[index], registry.speed_y[index] = speed_x, speed_y
+    registry.on_ground[index] = on_ground
+    registry.collided_x[index] = collided_x
+    registry.collided_y[index] = collided_y
+    registry.eyes_x[index] = x + width / 2
+    registry.eyes_y[index] = y + height / 2
+
+
+def interact(registry: Registry, indices: np.ndarray, enemies, dt: float) -> None:
+    """Chase enemies in vision range and attack ones in attack range"""
+
+    if not len(indices):
+        return
+    x, y = registry.x[indices], registry.y[indices]
+    vision = registry.vision_range[indices]
+    attack_range = registry.attack_range[indices]
+    # Fighters look in their own vision boxes, a box around all of them would
+    # cover the whole map when they are spread out. Cells with enemies are
+    # few, each is checked against the boxes of all fighters at once
+    cell_size = enemies.cell_size
+    left = np.floor((x - vision) / cell_size)
+    top = np.floor((y - vision) / cell_size)
+    right = np.floor((x - vision + vision * 2) / cell_size)
+    bottom = np.floor((y - vision + vision * 2) / cell_size)
+    found = {}
+    near: dict[int, np.ndarray] = {}  # Fighters which see an enemy, by index
+    for (col, row), cell in enemies.cells.items():
+        sees = (left <= col) & (col <= right) & (top <= row) & (row <= bottom)
+        if not sees.any():
+            continue
+        for enemy in cell:
+            found[enemy.index] = enemy
+            near[enemy.index] = near[enemy.index] | sees\
+                if enemy.index in near else sees
+
+    speed_x, speed_y = registry.speed_x[indices], registry.speed_y[indices]
+    on_ground = registry.on_ground[indices]
+    max_speed = registry.max_speed[indices]
+    acceleration = registry.acceleration[indices]
+    dt_acceleration = acceleration * dt
+    blocked = registry.collided_x[indices, 2] != 0
+    attack_time = registry.attack_time[indices]
+    ready = attack_time >= registry.attack_delay[indices]
+    # In the order of registry indices, not of a set of facades, so damage is
+    # dealt the same way in every run
+    for index in sorted(found):
+        enemy = found[index]
+        close = near[index]
+        distance = ((x - enemy.x) ** 2 + (y - enemy.y) ** 2) ** 0.5
+        chase = close & (attack_range < distance) & (distance < vision)
+        to_left = chase & (registry.eyes_x[indices] > enemy.eyes[0])
+        to_right = chase & ~to_left
+        to_left &= speed_x > -max_speed - dt_acceleration
+        to_right &= speed_x < max_speed + dt_acceleration
+        speed_x = np.where(to_left, speed_x - acceleration * dt,
+                           np.where(to_right, speed_x + dt_acceleration, speed_x))
+        jump = chase & blocked & on_ground
+        speed_y = np.where(jump, -registry.jump_strength[indices], speed_y)
+        on_ground = on_ground & ~jump
+
+        attack = close & ~chase & (distance <= attack_range) & ready
+        if attack.any():
+            enemy.take_damage(int(registry.attack_damage[indices][attack].sum()))
+            attack_time[attack] = 0
+            ready &= ~attack
+    registry.speed_x[indices], registry.speed_y[indices] = speed_x, speed_y
+    registry.on_ground[indices] = on_ground
+    registry.attack_time[indices] = attack_time
+
+
+def think(registry: Registry, indices: np.ndarray, enemies, dt: float) -> None:
+    """AI of fighters: interaction with enemies and attack delays"""
+
+    interact(registry, indices, enemies, dt)
+    registry.attack_time[indices] += dt
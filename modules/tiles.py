@@ -0,0 +1,129 @@
+import numpy as np
+from modules.parameters.options import FRICTION
+
+
+EMPTY = "0"
+
+
+class TileGrid:
+    """Layer of a level stored as a flat array of tile ids.\n
+    Every tile is one byte that indexes `palette`, id `0` is always empty"""
+
+    def __init__(self, width: int, height: int,
+                 palette: list[str] = None, tiles: bytearray = None) -> None:
+        self.width, self.height = width, height
+        self.palette = [EMPTY] if palette is None else list(palette)
+        self.ids = {code: tile for tile, code in enumerate(self.palette)}
+        self.tiles = bytearray(width * height) if tiles is None else tiles
+        self.solid = bytearray()
+        self.friction: list[float] = []
+        self.trigger: list[str] = []
+        self.update_tables()
+
+    @classmethod
+    def from_rows(cls, rows: list[list[str]]) -> "TileGrid":
+        """Create a grid from rows of tile codes"""
+
+        grid = cls(max(map(len, rows), default=0), len(rows))
+        for row_index, row in enumerate(rows):
+            start = row_index * grid.width
+            grid.tiles[start:start + len(row)] = bytes(map(grid.get_id, row))
+        return grid
+
+    def to_rows(self) -> list[list[str]]:
+        """Convert the grid back to rows of tile codes"""
+
+        palette, width = self.palette, self.width
+        return [[palette[tile] for tile in self.tiles[start:start + width]]
+                for start in range(0, len(self.tiles), width)]
+
+    def save(self, path: str) -> None:
+        """Write the grid to a text .map file"""
+
+        with open(path, "w", encoding="utf-8") as data:
+            data.write("\n".join([" ".join(row) for row in self.to_rows()]))
+
+    def update_tables(self) -> None:
+        """Rebuild lookup tables of tile properties (indexed by tile id).\n
+        Tables are changed in place: streamed grids find new codes while
+        chunks are parsed, references taken before that stay valid. NumPy
+        views of `solid` mustn't be kept over `get` or `lookup`, a bytearray
+        with views can't grow"""
+
+        self.solid[:] = bytes(code != EMPTY for code in self.palette)
+        self.friction[:] = [FRICTION.get(code, 1) for code in self.palette]
+        self.trigger[:] = [None if code == EMPTY else code for code in self.palette]
+
+    def get_id(self, code: str) -> int:
+        """Get the id of a tile code, registering it in the palette if needed"""
+
+        if code not in self.ids:
+            if len(self.palette) == 256:
+                raise ValueError("TileGrid palette is limited to 256 codes")
+            self.ids[code] = len(self.palette)
+            self.palette.append(code)
+            self.update_tables()
+        return self.ids[code]
+
+    def get(self, col: int, row: int) -> int:
+        """Get the tile id at the cell, tiles outside of the grid are empty"""
+
+        if 0 <= col < self.width and 0 <= row < self.height:
+            return self.tiles[row * self.width + col]
+        return 0
+
+    def lookup(self, cols: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Get tile ids of many cells at once, tiles outside of the grid are empty"""
+
+        inside = (cols >= 0) & (cols < self.width)\
+            & (rows >= 0) & (rows < self.height)
+        tiles = np.frombuffer(self.tiles, dtype=np.uint8)
+        indexes = (np.clip(rows, 0, self.height - 1) * self.width
+                   + np.clip(cols, 0, self.width - 1))
+        return np.where(inside, tiles[indexes], 0)
+
+    def find(self, code: str) -> tuple[int, int] | None:
+        """Get `(col, row)` of the first tile with the code"""
+
+        if code not in self.ids:
+            return None
+        index = self.tiles.find(bytes((self.ids[code],)))
+        if index == -1:
+            return None
+        row_index, col_index = divmod(index, self.width)
+        return col_index, row_index
+
+    def get_code(self, col: int, row: int) -> str:
+        return self.palette[self.get(col, row)]
+
+    def set(self, col: int, row: int, code: str) -> None:
+        if 0 <= col < self.width and 0 <= row < self.height:
+            self.tiles[row * self.width + col] = self.get_id(code)
+
+    def fill(self, left: int, top: int, right: int, bottom: int,
+             code: str) -> None:
+        """Fill the rect of cells (right and bottom are exclusive)"""
+
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, self.width), min(bottom, self.height)
+        if left >= right:
+            return
+        row_fill = bytes((self.get_id(code),)) * (right - left)
+        for row_index in range(top, bottom):
+            start = row_index * self.width + left
+            self.tiles[start:start + right - left] = row_fill
+
+    def items(self, left: int = 0, top: int = 0,
+              right: int = None, bottom: int = None):
+        """Iterate over non-empty cells of the rect as `(col, row, code)`"""
+
+        palette, tiles, width = self.palette, self.tiles, self.width
+        left = max(left, 0)
+        right = width if right is None else min(right, width)
+        bottom = self.height if bottom is None else min(bottom, self.height)
+        for row_index in range(max(top, 0), bottom):
+            start = row_index * width
+            for col_index, tile in enumerate(
+                    tiles[start + left:start + right], left):
+                if tile:
+                    yield col_index, row_index, palette[tile]
@@ -0,0 +1,36 @@
+from modules.parameters.options import MAX_TICKS_PER_FRAME, TICK_RATE
+
+
+class FixedTimestep:
+    """Accumulator of frame time which is spent in ticks of a fixed length,
+    so physics doesn't depend on the frame rate.\n
+    What is left in the accumulator is a part of the next tick, `alpha` of it
+    is used to interpolate rendering between the last two ticks"""
+
+    def __init__(self, tick_rate: int = TICK_RATE,
+                 max_ticks: int = MAX_TICKS_PER_FRAME) -> None:
+        self.step = 1000 / tick_rate
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+
+    @property
+    def alpha(self) -> float:
+        return self.accumulator / self.step
+
+    def advance(self, dt: float) -> int:
+        """Add frame time, returns how many ticks to simulate"""
+
+        self.accumulator += dt
+        ticks = int(self.accumulator // self.step)
+        if ticks > self.max_ticks:
+            # When ticks take longer than they simulate, catching up would
+            # make every next frame longer. The backlog is dropped instead,
+            # so the game slows down rather than freezes
+            ticks = self.max_ticks
+            self.accumulator %= self.step
+        else:
+            self.accumulator -= ticks * self.step
+        return ticks
+
+    def reset(self) -> None:
+        self.accumulator = 0.0
@@ -0,0 +1,136 @@
+from modules.physics import SpatialHash
+from modules.tiles import TileGrid
+from modules.parameters.options import CHUNK_SIZE, TILESIZE
+
+
+# Events of an entity and a region
+ENTER, STAY, EXIT = range(3)
+
+
+class Region:
+    """Rect of trigger tiles with the same code, in world coordinates"""
+
+    __slots__ = ("code", "x", "y", "width", "height")
+
+    def __init__(self, code: str, x: int, y: int, width: int, height: int) -> None:
+        self.code = code
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+
+    def get_size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+    def overlaps(self, x: float, y: float, width: float, height: float) -> bool:
+        return x < self.x + self.width and x + width > self.x\
+            and y < self.y + self.height and y + height > self.y
+
+
+def compile_regions(matrix: TileGrid, area: tuple = ()) -> list[Region]:
+    """Merge trigger tiles into rects: runs of a code in a row, then runs
+    with the same columns in the following rows. Only tiles of the area
+    `(left, top, right, bottom)` are merged if it is given"""
+
+    runs: dict[int, list[tuple[int, int, str]]] = {}
+    for col_index, row_index, code in matrix.items(*area):
+        row_runs = runs.setdefault(row_index, [])
+        if row_runs and row_runs[-1][1] == col_index and row_runs[-1][2] == code:
+            row_runs[-1] = row_runs[-1][0], col_index + 1, code
+        else:
+            row_runs.append((col_index, col_index + 1, code))
+
+    regions = []
+    growing: dict[tuple[int, int, str], Region] = {}  # Runs of the last row
+    for row_index in sorted(runs):
+        next_growing = {}
+        for run in runs[row_index]:
+            region = growing.get(run)
+            if region is not None and region.y + region.height == row_index * TILESIZE:
+                region.height += TILESIZE
+            else:
+                left, right, code = run
+                region = Region(code, left * TILESIZE, row_index * TILESIZE,
+                                (right - left) * TILESIZE, TILESIZE)
+                regions.append(region)
+            next_growing[run] = region
+        growing = next_growing
+    return regions
+
+
+class Triggers:
+    """Trigger layer compiled to regions in a spatial hash.\n
+    Entities are checked against nearby regions, and changes of the regions
+    they overlap are reported to callbacks registered by trigger code as
+    `callback(event, entity, region)`.\n
+    Regions are kept by chunks of `CHUNK_SIZE` tiles. A layer in memory is
+    compiled at once, a streamed one a chunk at a time by `load_chunk` as
+    chunks are streamed in, so its regions end at chunk borders"""
+
+    def __init__(self, matrix: TileGrid, streamed: bool = False) -> None:
+        self.matrix = matrix
+        self.streamed = streamed
+        self.index = SpatialHash()
+        # Regions by the chunk of their top left corner
+        self.chunks: dict[tuple[int, int], list[Region]] = {}
+        if not streamed:
+            for region in compile_regions(matrix):
+                self.chunks.setdefault(self.get_chunk(region), []).append(region)
+                self.index.insert(region)
+        self.callbacks: dict[tuple[str, int], list] = {}
+        # Regions every checked entity overlapped, by entity id
+        self.inside: dict[int, set[Region]] = {}
+
+    @property
+    def regions(self) -> list[Region]:
+        """Compiled regions"""
+        return [region for regions in self.chunks.values() for region in regions]
+
+    @staticmethod
+    def get_chunk(region: Region) -> tuple[int, int]:
+        size = CHUNK_SIZE * TILESIZE
+        return region.x // size, region.y // size
+
+    def load_chunk(self, chunk_col: int, chunk_row: int) -> list[Region]:
+        """Regions of a chunk, compiled if the layer is streamed and the
+        chunk wasn't loaded before"""
+
+        regions = self.chunks.get((chunk_col, chunk_row))
+        if regions is None:
+            regions = []
+            if self.streamed:
+                regions = compile_regions(self.matrix, (
+                    chunk_col * CHUNK_SIZE, chunk_row * CHUNK_SIZE,
+                    (chunk_col + 1) * CHUNK_SIZE, (chunk_row + 1) * CHUNK_SIZE))
+                for region in regions:
+                    self.index.insert(region)
+            self.chunks[chunk_col, chunk_row] = regions
+        return regions
+
+    def on(self, code: str, callback, event: int = ENTER) -> None:
+        self.callbacks.setdefault((code, event), []).append(callback)
+
+    def emit(self, event: int, entity, region: Region) -> None:
+        for callback in self.callbacks.get((region.code, event), ()):
+            callback(event, entity, region)
+
+    def get_regions(self, x: float, y: float, width: float,
+                    height: float) -> set[Region]:
+        """Regions which overlap the rect"""
+
+        return {region for region in self.index.query(x, y, width, height)
+                if region.overlaps(x, y, width, height)}
+
+    def update(self, entities) -> None:
+        """Check entities and emit their events. Entities which are not given
+        anymore are forgotten without events"""
+
+        inside = {}
+        for entity in entities:
+            width, height = entity.get_size()
+            current = self.get_regions(entity.x, entity.y, width, height)
+            previous = self.inside.get(entity.id, set())
+            inside[entity.id] = current
+            for region in previous - current:
+                self.emit(EXIT, entity, region)
+            for region in current:
+                self.emit(STAY if region in previous else ENTER, entity, region)
+        self.inside = inside
@@ -1,6 +1,6 @@
 import pygame
-from modules import entities
-from modules.parameters.options import images_path
+from modules import projectiles
+from modules.assets import images
 
 
 class ColdWeapon:
@@ -32,8 +32,7 @@ class ShootingWeapon:
         self.__time_passed_since_shot = shot_delay
 
         if sprite_path is not None:
-            self.sprite = pygame.image.load(
-                images_path+"tools/"+sprite_path)
+            self.sprite = images.load("tools/"+sprite_path)
         else:
             self.sprite = pygame.Surface((30, 30))
             self.sprite.fill((255, 0, 255))
@@ -42,14 +41,22 @@ class ShootingWeapon:
               angle: float) -> None:
         if self.__time_passed_since_shot >= self.__shot_delay:
             self.__time_passed_since_shot = 0
-            entities.bullets.append(
-                entities.Bullet(coords=coords,
-                                speed=self.__bullet_speed,
-                                weight=self.__caliber*0.01,
-                                angle=angle,
-                                sprite_path="weapons/bullet.png",
-                                size=(self.__caliber, self.__caliber)))
+            projectiles.bullets.spawn(coords=coords,
+                                      speed=self.__bullet_speed,
+                                      angle=angle,
+                                      weight=self.__caliber*0.01,
+                                      size=self.__caliber)
+
+    def draw(self, x, y, surface: pygame.Surface) -> None:
+        surface.blit(self.sprite, (x, y))
+
+    def get_state(self) -> float:
+        """Time since the last shot"""
+        return self.__time_passed_since_shot
+
+    def set_state(self, time_passed_since_shot: float) -> None:
+        self.__time_passed_since_shot = time_passed_since_shot
 
     def update(self, x, y, dt: int, surface: pygame.Surface) -> None:
         self.__time_passed_since_shot += dt
-        surface.blit(self.sprite, (x, y))
+        self.draw(x, y, surface)
@@ -0,0 +1,263 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import asyncio
+import pygame
+import numpy as np
+from argparse import ArgumentParser
+from collections import deque
+from time import perf_counter
+from modules import entities, net
+from modules.session import Session, control
+from modules.timestep import FixedTimestep
+from modules.parameters.options import level_when_game_started
+
+
+TIMEOUT = 5  # Seconds without packets before a client is dropped
+MAX_QUEUED_INPUTS = 8  # Inputs which came early wait for their ticks
+HISTORY = 64  # States sent to a client which it can acknowledge
+MAX_PLAYERS = 32  # Players of a session, more are refused
+
+
+class Client:
+    """Player of a remote client and what was sent to it"""
+
+    def __init__(self, address: tuple, player: entities.Player,
+                 now: float) -> None:
+        self.address = address
+        self.player = player
+        self.inputs = deque(maxlen=MAX_QUEUED_INPUTS)
+        self.input = set(), set(), (0, 0)  # Keys, buttons and aim of a tick
+        self.input_number = 0  # Last applied input
+        self.acked_tick = 0
+        self.sent: dict[int, dict] = {}  # States by tick
+        self.last_seen = now
+
+
+class ServerSession(Session):
+    """Authoritative game of a server: a session with players of clients.
+    Every session has a state of its own, so a process can host several"""
+
+    def __init__(self, level_name: str, max_players: int = MAX_PLAYERS) -> None:
+        pygame.init()
+        super().__init__(level_name)
+        self.clients: dict[tuple, Client] = {}
+        self.max_players = max_players
+        self.tick = 0
+
+    def join(self, address: tuple, now: float) -> Client:
+        """Client of the address, a new one has a player on the spawn. None
+        when the session is full"""
+
+        client = self.clients.get(address)
+        if client is None:
+            if len(self.clients) >= self.max_players:
+                return None
+            client = self.clients[address] = Client(address, self.add_player(), now)
+        client.last_seen = now
+        return client
+
+    def leave(self, address: tuple) -> None:
+        client = self.clients.pop(address, None)
+        if client is not None:
+            self.remove_player(client.player)
+
+    def drop_idle(self, now: float) -> None:
+        for address, client in list(self.clients.items()):
+            if now - client.last_seen > TIMEOUT:
+                self.leave(address)
+
+    def receive(self, data: bytes, address: tuple, now: float) -> bytes:
+        """Handle a packet of a client, returns a reply if there is one"""
+
+        if not data:
+            return None
+        # Players are read through the registry of the current state
+        self.state.activate()
+        match data[0]:
+            case net.JOIN:
+                client = self.join(address, now)
+                if client is None:
+                    return bytes((net.FULL,))
+                return net.encode_welcome(
+                    client.player.id, self.tick, self.levels,
+                    (client.player.x, client.player.y),
+                    self.world.path.removeprefix("maps/"))
+            case net.INPUT if address in self.clients\
+                    and len(data) == net.input_struct.size:
+                client = self.clients[address]
+                client.last_seen = now
+                number, acked_tick, *player_input = net.decode_input(data)
+                client.acked_tick = max(client.acked_tick, acked_tick)
+                last = client.inputs[-1][0] if client.inputs else client.input_number
+                if number > last:
+                    client.inputs.append((number, *player_input))
+            case net.LEAVE:
+                self.leave(address)
+        return None
+
+    def step(self, dt: float) -> None:
+        """Tick of the world with an input of every client. The level
+        changes when a player enters a level change trigger, clients see it
+        in the level number of states and join again"""
+
+        if not self.clients:
+            return
+        self.begin_tick(None, dt)
+        for client in self.clients.values():
+            if client.inputs:
+                client.input_number, *player_input = client.inputs.popleft()
+                client.input = tuple(player_input)
+            keyboard_keys, mouse_buttons, aim = client.input
+            eyes = client.player.eyes
+            control(client.player, keyboard_keys, mouse_buttons,
+                    (eyes[0] + aim[0], eyes[1] + aim[1]), dt)
+        self.end_tick(dt)
+        registry = self.state.registry
+        for player in self.players:
+            if player.get_health() <= 0:
+                registry.health[player.index] = player.max_health
+                registry.alive[player.index] = True
+                player.x, player.y = self.world.spawn
+                player.snap()
+        self.tick += 1
+
+    def get_states(self) -> list[tuple[bytes, tuple]]:
+        """Packets of the world state for every client, with entities and
+        bullets near its player only"""
+
+        self.state.activate()
+        registry = self.state.registry
+        used = registry.used
+        indices = np.flatnonzero((registry.kind[:used] != 0) & registry.alive[:used])
+        indices = np.concatenate((indices, np.array(
+            [client.player.index for client in self.clients.values()], dtype=np.int64)))
+        ids = registry.generation[indices] << registry.index_bits | indices
+        kinds = registry.kind[indices]
+        x, y = registry.x[indices], registry.y[indices]
+        health = registry.health[indices]
+        bullets = self.state.bullets
+        bullets_x, bullets_y = bullets.x[:bullets.count], bullets.y[:bullets.count]
+
+        packets = []
+        for client in self.clients.values():
+            player = client.player
+            eyes = player.eyes
+            near = net.get_interest(x, y, eyes)
+            near = near[ids[near] != player.id]
+            current = net.quantize(ids[near].tolist(), kinds[near], x[near],
+                                   y[near], health[near])
+            base_tick = client.acked_tick if client.acked_tick in client.sent else 0
+            near_bullets = net.get_interest(bullets_x, bullets_y, eyes, net.MAX_BULLETS)
+            packets.append((net.encode_state(
+                self.tick, base_tick, client.input_number, self.levels,
+                (player.x, player.y, float(registry.speed_x[player.index]),
+                 float(registry.speed_y[player.index]), player.get_health()),
+                current, client.sent.get(base_tick, {}),
+                list(zip((bullets_x[near_bullets] - eyes[0]).astype(int).tolist(),
+                         (bullets_y[near_bullets] - eyes[1]).astype(int).tolist()))),
+                client.address))
+            client.sent[self.tick] = current
+            for tick in [tick for tick in client.sent
+                         if tick < client.acked_tick or tick <= self.tick - HISTORY]:
+                del client.sent[tick]
+        return packets
+
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, session: ServerSession) -> None:
+        self.session = session
+        self.transport: asyncio.DatagramTransport = None
+        self.bytes_in = 0
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, address: tuple) -> None:
+        self.bytes_in += len(data)
+        reply = self.session.receive(data, address,
+                                     asyncio.get_running_loop().time())
+        if reply is not None:
+            self.transport.sendto(reply, address)
+
+
+async def serve(host: str, port: int, level_name: str, send_interval: int,
+                seconds: float = None, stats_interval: float = 5,
+                sessions: int = 1, max_players: int = MAX_PLAYERS) -> dict:
+    """Run sessions at the tick rate, states are sent every `send_interval`
+    ticks. Session `i` listens on `port + i`. Runs forever unless `seconds`
+    are given"""
+
+    loop = asyncio.get_running_loop()
+    hosted = []  # Sessions with their transports and protocols
+    for index in range(sessions):
+        session = ServerSession(level_name, max_players)
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda session=session: ServerProtocol(session),
+            local_addr=(host, port + index))
+        hosted.append((session, transport, protocol))
+    timestep = FixedTimestep()
+    start = last = last_stats = loop.time()
+    stats = {"ticks": 0, "tick_time": 0.0, "bytes_out": 0, "packets": 0,
+             "max_players": 0}
+    try:
+        while seconds is None or loop.time() - start < seconds:
+            now = loop.time()
+            for tick in range(timestep.advance((now - last) * 1000)):
+                tick_start = perf_counter()
+                for session, transport, protocol in hosted:
+                    session.step(timestep.step)
+                    if session.tick % send_interval == 0:
+                        for packet, address in session.get_states():
+                            transport.sendto(packet, address)
+                            stats["bytes_out"] += len(packet)
+                            stats["packets"] += 1
+                stats["tick_time"] += perf_counter() - tick_start
+                stats["ticks"] += 1
+            last = now
+            for session, transport, protocol in hosted:
+                session.drop_idle(now)
+            players = sum(len(session.clients) for session, *_ in hosted)
+            stats["max_players"] = max(stats["max_players"], players)
+            if now - last_stats >= stats_interval:
+                elapsed = now - last_stats
+                bytes_in = sum(protocol.bytes_in for *_, protocol in hosted)
+                print(f"{players} players in {len(hosted)} sessions, "
+                      f"{stats['tick_time'] / max(stats['ticks'], 1) * 1000:.2f} ms/tick, "
+                      f"{stats['bytes_out'] / elapsed / 1024:.1f} KB/s out, "
+                      f"{bytes_in / elapsed / 1024:.1f} KB/s in", flush=True)
+                last_stats = now
+                stats.update(ticks=0, tick_time=0.0, bytes_out=0, packets=0)
+                for *_, protocol in hosted:
+                    protocol.bytes_in = 0
+            await asyncio.sleep(max(timestep.step - timestep.accumulator, 0) / 1000)
+    finally:
+        for session, transport, protocol in hosted:
+            transport.close()
+            session.close()
+    return stats
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Authoritative game server over UDP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--level", default=level_when_game_started)
+    parser.add_argument("--send-interval", type=int, default=3,
+                        help="ticks between states sent to clients")
+    parser.add_argument("--seconds", type=float, help="stop after this time")
+    parser.add_argument("--sessions", type=int, default=1,
+                        help="sessions to host, on ports from --port up")
+    parser.add_argument("--max-players", type=int, default=MAX_PLAYERS,
+                        help="players of a session")
+    arguments = parser.parse_args()
+
+    asyncio.run(serve(arguments.host, arguments.port, arguments.level,
+                      arguments.send_interval, arguments.seconds,
+                      sessions=arguments.sessions,
+                      max_players=arguments.max_players))
+
+
+if __name__ == "__main__":
+    main()
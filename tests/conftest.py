@@ -0,0 +1,44 @@
+import os
+import random
+import sys
+import pytest
+
+# Settings and assets are read from paths relative to the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from modules.chunks import ChunkedGrid, TextMapSource
+from modules.tiles import TileGrid
+
+
+WIDTH, HEIGHT = 70, 45
+
+
+def make_rows(seed: int = 0) -> list[list[str]]:
+    rng = random.Random(seed)
+    return [[rng.choice(("gr", "pu", "ye")) if rng.random() < 0.15 else "0"
+             for col in range(WIDTH)] for row in range(HEIGHT)]
+
+
+def make_chunked(rows: list[list[str]], folder) -> ChunkedGrid:
+    """Streamed grid with small chunks, codes are found as chunks are parsed"""
+
+    path = folder / "terrain.map"
+    path.write_text("\n".join(" ".join(row) for row in rows))
+    return ChunkedGrid(TextMapSource(str(path), chunk_size=8), chunk_size=8)
+
+
+@pytest.fixture(params=["tile", "chunked"])
+def grid(request, tmp_path):
+    """Random terrain as a `TileGrid` and as a streamed `ChunkedGrid`"""
+
+    rows = make_rows()
+    if request.param == "tile":
+        yield TileGrid.from_rows(rows)
+        return
+    grid = make_chunked(rows, tmp_path)
+    yield grid
+    grid.source.close()
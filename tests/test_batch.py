@@ -0,0 +1,18 @@
+import numpy as np
+from batch import ACTION_SIZE, MOVE, SLOT, VectorRunner
+
+
+def run(workers: int) -> dict[str, np.ndarray]:
+    with VectorRunner(3, workers=workers) as runner:
+        runner.reset()
+        actions = np.zeros((3, ACTION_SIZE))
+        actions[:, SLOT] = -1
+        actions[:, MOVE] = -1, 0, 1
+        return runner.step(actions, 60)
+
+
+def test_workers_step_several_envs():
+    shared, alone = run(1), run(3)
+    for field in shared:
+        assert np.array_equal(shared[field], alone[field]), field
+    assert len(set(map(tuple, shared["positions"].tolist()))) == 3
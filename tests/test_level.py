@@ -0,0 +1,70 @@
+import os
+import json
+import pygame
+import pytest
+from modules import level
+from modules.chunks import TextMapSource
+from modules.parameters.options import CHUNK_SIZE
+from modules.state import State
+
+
+SIZE = CHUNK_SIZE * 20  # Tiles on a side of the streamed map
+
+
+@pytest.fixture
+def streamed_level(tmp_path, monkeypatch):
+    """Big level of text maps which are streamed, with a trigger far from
+    the spawn. Returns its name and chunk parses by layer"""
+
+    rows = [["0"] * SIZE for row in range(SIZE)]
+    for col in range(SIZE):
+        rows[SIZE - 1][col] = "gr"
+    layers = {"terrain": rows, "entities": [row[:] for row in rows],
+              "triggers": [["0"] * SIZE for row in range(SIZE)]}
+    layers["entities"][SIZE - 3][2] = "SP"
+    layers["triggers"][SIZE - 3][SIZE - 3] = "CL"
+    for name, layer in layers.items():
+        (tmp_path / (name + ".map")).write_text(
+            "\n".join(" ".join(row) for row in layer))
+    (tmp_path / "info.json").write_text(json.dumps({"prev": "", "next": ""}))
+
+    parses = {}
+    read_chunk = TextMapSource.read_chunk
+
+    def counted(source, chunk_col, chunk_row, get_id):
+        name = os.path.basename(source.path).removesuffix(".map")
+        parses[name] = parses.get(name, 0) + 1
+        return read_chunk(source, chunk_col, chunk_row, get_id)
+
+    monkeypatch.setattr(TextMapSource, "read_chunk", counted)
+    monkeypatch.setattr(level, "STREAMING_THRESHOLD", 0)
+    pygame.init()
+    return os.path.relpath(tmp_path, "maps"), parses
+
+
+def test_streamed_minimap(streamed_level):
+    name, parses = streamed_level
+    world = level.World(name)
+    chunks = (-(-SIZE // world.matrix_terrain.chunk_size)) ** 2
+    assert world.mini_map.streamed
+    assert parses["terrain"] < chunks // 4
+
+    world.start(State())
+    world.stream_area(0, SIZE - CHUNK_SIZE, CHUNK_SIZE, SIZE)
+    x, y = world.mini_map.tile_size * 2, world.mini_map.tile_size * (SIZE - 0.5)
+    assert world.mini_map.surface.get_at((int(x), int(y)))[:3] != (0, 0, 0)
+    assert world.mini_map.surface.get_at(
+        (int(x), int(world.mini_map.tile_size * 2)))[:3] == (0, 0, 0)
+
+
+def test_streamed_triggers(streamed_level):
+    name, parses = streamed_level
+    world = level.World(name)
+    assert parses.get("triggers", 0) == 0 and world.triggers.regions == []
+
+    world.start(State())
+    world.stream_area(SIZE - CHUNK_SIZE, SIZE - CHUNK_SIZE, SIZE, SIZE)
+    region, = world.triggers.regions
+    assert region.code == "CL"
+    assert world.triggers.get_regions(region.x, region.y, 1, 1) == {region}
+    assert parses["triggers"] < (SIZE // CHUNK_SIZE) ** 2 // 4
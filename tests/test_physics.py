@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from conftest import HEIGHT, WIDTH, make_chunked, make_rows
+from modules.physics import ray_cast, sweep, sweep_many
+from modules.tiles import TileGrid
+from modules.parameters.options import TILESIZE
+
+
+def make_boxes(count: int, seed: int = 1) -> tuple[np.ndarray, ...]:
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-TILESIZE, (WIDTH + 1) * TILESIZE, count)
+    y = rng.uniform(-TILESIZE, (HEIGHT + 1) * TILESIZE, count)
+    width = rng.uniform(0, TILESIZE * 2, count)
+    height = rng.uniform(0, TILESIZE * 3, count)
+    dx = rng.uniform(-TILESIZE * 6, TILESIZE * 6, count)
+    dy = rng.uniform(-TILESIZE * 6, TILESIZE * 6, count)
+    dx[::7] = 0
+    dy[::5] = 0
+    return x, y, width, height, dx, dy
+
+
+def test_sweep_many_matches_sweep(grid):
+    boxes = make_boxes(300)
+    batched = np.stack(sweep_many(*boxes, grid), axis=1)
+    for index, box in enumerate(zip(*boxes)):
+        single = sweep(*map(float, box), grid)
+        assert batched[index] == pytest.approx(single)
+
+
+def test_ray_cast_on_chunked_grid(tmp_path):
+    rows = make_rows(2)
+    chunked = make_chunked(rows, tmp_path)
+    x, y, width, height, dx, dy = make_boxes(500, 3)
+    expected = ray_cast(x, y, dx, dy, TileGrid.from_rows(rows))
+    for array, expected_array in zip(ray_cast(x, y, dx, dy, chunked), expected):
+        np.testing.assert_allclose(array, expected_array)
+    chunked.source.close()
+
+
+def test_lookup_keeps_shape(grid):
+    cols = np.arange(-2, 22).reshape(4, 6)
+    rows = cols.T[:4, :4].repeat(2, axis=1).reshape(4, 8)[:, :6]
+    tiles = grid.lookup(cols, rows)
+    assert tiles.shape == (4, 6)
+    assert tiles.tolist() == [[grid.get(col, row) for col, row in zip(*pair)]
+                              for pair in zip(cols.tolist(), rows.tolist())]
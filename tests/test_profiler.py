@@ -0,0 +1,23 @@
+import pygame
+from modules.profiler import Profiler, profiler
+from modules.session import Session
+from modules.parameters.options import level_when_game_started
+
+
+def test_sessions_leave_no_events():
+    pygame.init()
+    session = Session(level_when_game_started)
+    session.add_player()
+    for tick in range(100):
+        session.tick([(set(), set(), (0, 0))], 1000 / 60)
+    assert not profiler.enabled and profiler.events == []
+
+
+def test_frames_are_buffered():
+    frames = Profiler(frames=3, enabled=True)
+    for frame in range(5):
+        with frames.zone("tick"):
+            pass
+        frames.next_frame()
+    assert len(frames.frames) == 3 and frames.events == []
+    assert list(frames.get_stats()) == ["tick"]
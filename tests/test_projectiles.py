@@ -0,0 +1,35 @@
+import numpy as np
+from modules.physics import SpatialHash
+from modules.projectiles import BULLET_SPRITE, BulletPool
+
+
+class Target:
+    """Entity of a registry slot, as seen by bullets"""
+
+    def __init__(self, index: int, x: float, y: float) -> None:
+        self.index = index
+        self.x, self.y = x, y
+        self.damage = 0
+
+    def get_size(self) -> tuple[int, int]:
+        return 64, 64
+
+    def take_damage(self, damage: int) -> None:
+        self.damage += damage
+
+
+def test_hits_follow_registry_order():
+    """A bullet touching several entities hits the one of the lowest index,
+    in whatever order the facades were made and inserted"""
+
+    for seed in range(8):
+        indices = np.random.default_rng(seed).permutation(16).tolist()
+        targets = [Target(index, 100 + index, 100) for index in indices]
+        spatial_hash = SpatialHash()
+        for target in targets:
+            spatial_hash.insert(target)
+        pool = BulletPool(BULLET_SPRITE)
+        pool.spawn((150, 120), 1, 0, 0.1, 10)
+        used = pool.hit_entities(spatial_hash, np.ones(1, dtype=bool))
+        assert used.all()
+        assert [target.index for target in targets if target.damage] == [0]
@@ -0,0 +1,45 @@
+import random
+import pygame
+import headless
+from modules import game
+from modules.replay import Recording
+from modules.parameters.options import level_when_game_started
+
+
+def play(frames: int, seed: int = 0, quicksave: int = None,
+         quickload: int = None) -> None:
+    """Random input through the fixed-tick loop, recorded like in game"""
+
+    rng = random.Random(seed)
+    keys, buttons, mouse_pos = set(), set(), (640, 360)
+    for frame in range(frames):
+        if frame == quicksave:
+            game.quicksave()
+        if frame == quickload:
+            game.quickload()
+        if rng.random() < 0.05:
+            keys = set(rng.sample((pygame.K_a, pygame.K_d, pygame.K_w), rng.randint(0, 2)))
+        if rng.random() < 0.03:
+            buttons = set() if buttons else {pygame.BUTTON_LEFT}
+        dt = rng.choice((16, 17, 33))
+        game.advance(keys, buttons, mouse_pos, dt)
+        game.recorder.record(keys, buttons, mouse_pos, dt)
+
+
+def test_replay_matches():
+    pygame.init()
+    game.start_level(level_when_game_started)
+    play(600)
+    stats = headless.replay(Recording(game.recorder.get_bytes()))
+    assert stats["checks"] == 10 and stats["mismatch"] is None
+
+
+def test_replay_after_quickload():
+    pygame.init()
+    game.start_level(level_when_game_started)
+    play(600, 1, quicksave=100, quickload=300)
+    recording = Recording(game.recorder.get_bytes())
+    assert recording.snapshot
+    stats = headless.replay(recording)
+    assert stats["frames"] == 300
+    assert stats["checks"] == 5 and stats["mismatch"] is None
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from client import BotClient
+from modules import net
+from modules.parameters.options import TILESIZE, level_when_game_started
+from server import ServerSession
+
+
+DT = 1000 / 60
+
+
+def join(session: ServerSession, port: int) -> bytes:
+    return session.receive(bytes((net.JOIN,)), ("127.0.0.1", port), 0)
+
+
+def test_sessions_are_independent():
+    first = ServerSession(level_when_game_started)
+    second = ServerSession(level_when_game_started)
+    join(first, 1)
+    join(second, 1)
+    used = second.state.registry.used
+    for tick in range(30):
+        first.step(DT)
+    assert first.state.registry is not second.state.registry
+    assert second.state.registry.used == used
+    assert second.tick == 0 and first.tick == 30
+
+
+def test_join_cap():
+    session = ServerSession(level_when_game_started, max_players=2)
+    assert join(session, 1)[0] == net.WELCOME
+    assert join(session, 2)[0] == net.WELCOME
+    assert join(session, 1)[0] == net.WELCOME  # Joined already
+    assert join(session, 3) == bytes((net.FULL,))
+    session.receive(bytes((net.LEAVE,)), ("127.0.0.1", 2), 0)
+    assert join(session, 3)[0] == net.WELCOME
+
+
+def test_level_change():
+    session = ServerSession(level_when_game_started)
+    join(session, 1)
+    player = session.clients["127.0.0.1", 1].player
+    next_level = session.world.info["next"]
+    region = next(region for region in session.world.triggers.regions
+                  if region.code == "CL")
+    player.x, player.y = region.x, region.y
+    player.snap()
+    session.step(DT)
+    session.step(DT)
+    assert session.levels == 1
+    assert session.world.path == "maps/" + next_level
+    assert (player.x, player.y) == pytest.approx(session.world.spawn, abs=TILESIZE)
+    (packet, address), = session.get_states()
+    assert net.decode_state(packet, {})[3] == 1
+    player_id, tick, level, spawn, level_name = net.decode_welcome(join(session, 1))
+    assert level == 1 and level_name == next_level
+
+
+def test_client_ignores_broken_datagrams():
+    client = BotClient(None, np.random.default_rng(0))
+    for data in (b"", bytes((net.WELCOME, 1)), bytes((net.STATE,))):
+        client.datagram_received(data, ("127.0.0.1", 7777))
+    assert client.player is None
+
+
+def test_join_again_in_other_session():
+    first = ServerSession(level_when_game_started)
+    second = ServerSession(level_when_game_started)
+    join(first, 1)
+    player = first.clients["127.0.0.1", 1].player
+    player.x, player.y = 500, 100
+    join(second, 1)  # Makes its state current
+    player_id, tick, level, coords, level_name = net.decode_welcome(join(first, 1))
+    assert player_id == player.id and coords == (500, 100)
+
+    join(first, 2)  # States are sent from the other session now
+    (packet, address), = second.get_states()
+    index = second.players[0].index
+    assert net.decode_state(packet, {})[4][:2] == (
+        second.state.registry.x[index], second.state.registry.y[index]) != (500, 100)
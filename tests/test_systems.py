@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from conftest import HEIGHT, WIDTH
+from modules import systems
+from modules.physics import SpatialHash
+from modules.registry import AI, POSITION, VELOCITY, Registry
+from modules.parameters.options import TILESIZE
+
+
+MOVED = ("x", "y", "speed_x", "speed_y", "on_ground", "collided_x",
+         "collided_y", "eyes_x", "eyes_y")
+
+
+def make_registry(count: int, seed: int = 0) -> Registry:
+    """Boxes falling and running over the terrain"""
+
+    rng = np.random.default_rng(seed)
+    registry = Registry()
+    for entity in range(count):
+        registry.create(None, POSITION | VELOCITY)
+    registry.x[:count] = rng.uniform(0, WIDTH * TILESIZE, count)
+    registry.y[:count] = rng.uniform(0, HEIGHT * TILESIZE, count)
+    registry.width[:count] = rng.integers(4, TILESIZE * 2, count)
+    registry.height[:count] = rng.integers(4, TILESIZE * 3, count)
+    registry.speed_x[:count] = rng.uniform(-1, 1, count)
+    registry.speed_y[:count] = rng.uniform(-1.5, 1, count)
+    registry.weight[:count] = rng.uniform(0.5, 2, count)
+    return registry
+
+
+@pytest.mark.parametrize("count", [systems.SMALL_BATCH, 50])
+def test_batch_matches_single(grid, count):
+    batched, single = make_registry(count), make_registry(count)
+    indices = np.arange(count)
+    for tick in range(120):
+        systems.move(batched, indices, grid, 1000 / 60)
+        for index in indices.tolist():
+            systems.move_one(single, index, grid, 1000 / 60)
+    for name in MOVED:
+        np.testing.assert_allclose(getattr(batched, name)[:count],
+                                   getattr(single, name)[:count], err_msg=name)
+
+
+class Enemy:
+    """Player as seen by fighters"""
+
+    def __init__(self, index: int, x: float, y: float) -> None:
+        self.index = index
+        self.x, self.y = x, y
+        self.eyes = x + 16, y + 16
+        self.damage = 0
+
+    def get_size(self) -> tuple[int, int]:
+        return 32, 32
+
+    def take_damage(self, damage: int) -> None:
+        self.damage += damage
+
+
+def test_fighters_look_around_themselves():
+    registry = Registry()
+    # Pairs of a fighter next to an enemy, far apart on a big map
+    corners = [(0, 0), (TILESIZE * 500, 0), (0, TILESIZE * 500),
+               (TILESIZE * 500, TILESIZE * 500)]
+    enemies = SpatialHash()
+    players = []
+    for number, (x, y) in enumerate(corners):
+        index = registry.create(None, POSITION | VELOCITY | AI)
+        registry.x[index], registry.y[index] = x, y
+        registry.eyes_x[index], registry.eyes_y[index] = x + 16, y + 16
+        registry.vision_range[index] = TILESIZE * 10
+        registry.attack_range[index] = TILESIZE * 2
+        registry.attack_damage[index] = 10
+        registry.attack_delay[index] = 0
+        registry.max_speed[index], registry.acceleration[index] = 0.7, 0.01
+        players.append(Enemy(100 + number, x + TILESIZE * 1.5 * (number % 2),
+                             y + TILESIZE * 5 * (1 - number % 2)))
+        enemies.insert(players[-1])
+    # Its attack range is longer than its vision, it reaches the first
+    # enemy, which is out of its own box but in a box around all fighters
+    index = registry.create(None, POSITION | VELOCITY | AI)
+    registry.y[index] = registry.eyes_y[index] = TILESIZE * 12
+    registry.vision_range[index] = TILESIZE
+    registry.attack_range[index] = TILESIZE * 20
+    registry.attack_damage[index] = 10
+    indices = np.arange(len(corners) + 1)
+    systems.interact(registry, indices, enemies, 16)
+
+    # Near ones are attacked once, far ones are chased by their fighter only
+    assert [player.damage for player in players] == [0, 10, 0, 10]
+    assert (registry.speed_x[indices] != 0).tolist() == [True, False, True, False, False]
@@ -0,0 +1,30 @@
+from modules.chunks import ChunkedGrid, TextMapSource
+from modules.tiles import TileGrid
+
+
+def test_tables_grow_in_place(tmp_path):
+    rows = [["0"] * 20 for row in range(20)]
+    rows[0][0] = "gr"
+    rows[19][19] = "ye"  # Only in the last chunk
+    path = tmp_path / "terrain.map"
+    path.write_text("\n".join(" ".join(row) for row in rows))
+    grid = ChunkedGrid(TextMapSource(str(path), chunk_size=8), chunk_size=8)
+    solid, friction, trigger = grid.solid, grid.friction, grid.trigger
+
+    assert grid.get_code(0, 0) == "gr"
+    tile = grid.get(19, 19)
+    assert grid.palette[tile] == "ye"
+    assert grid.solid is solid and grid.friction is friction\
+        and grid.trigger is trigger
+    assert len(solid) == len(friction) == len(trigger) == len(grid.palette)
+    assert solid[tile] and trigger[tile] == "ye"
+    grid.source.close()
+
+
+def test_tables_follow_palette():
+    grid = TileGrid.from_rows([["0", "gr"], ["pu", "0"]])
+    solid = grid.solid
+    grid.set(0, 0, "wh")
+    assert grid.solid is solid
+    assert list(solid) == [0, 1, 1, 1]
+    assert grid.trigger == [None, "gr", "pu", "wh"]